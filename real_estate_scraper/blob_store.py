@@ -0,0 +1,148 @@
+import hashlib
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional, Union, Iterable
+
+import pandas as pd
+
+# rows of the listings hold the hash of the text instead of the text
+HASH_PREFIX = "blob:"
+
+
+def text_hash(text: str) -> str:
+    return HASH_PREFIX + hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+class BlobStore:
+    """A content-addressed store of long texts, like the descriptions of listings.
+
+    Each text is compressed and stored once, under the hash of its content: the
+    same description scraped every day is written only the first time, and the
+    listings only carry its hash. Texts are read back only when asked for, see
+    `load`.
+
+    Args:
+        path (str, Path): Path of the SQLite file, created if it does not exist.
+        compression_level (int, optional): The zlib compression level. Defaults
+        to 6.
+
+    Attributes:
+        blobs_written (int): Number of new texts stored.
+        bytes_written (int): Compressed size of the new texts.
+        blobs_reused (int): Number of texts already in the store.
+    """
+
+    def __init__(self, path: Union[str, Path], compression_level: int = 6):
+        self.path = Path(path)
+        self.compression_level = compression_level
+        self.blobs_written = 0
+        self.bytes_written = 0
+        self.blobs_reused = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS blobs ("
+                               "hash TEXT PRIMARY KEY, data BLOB)")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def put_many(self, texts: Iterable[Optional[str]]) -> list[Optional[str]]:
+        """Store texts, skipping those already stored.
+
+        Returns:
+            list[Optional[str]]: The hash of every text, None for missing texts.
+        """
+        texts = list(texts)
+        hashes = [text_hash(text) if isinstance(text, str) else None
+                  for text in texts]
+        new = {digest: text for digest, text in zip(hashes, texts) if digest}
+        known = self._known(new.keys())
+        self.blobs_reused += len(known)
+        rows = [(digest, zlib.compress(text.encode(), self.compression_level))
+                for digest, text in new.items() if digest not in known]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?)", rows)
+        self.blobs_written += len(rows)
+        self.bytes_written += sum(len(data) for _, data in rows)
+        return hashes
+
+    def get_many(self, hashes: Iterable[Optional[str]]) -> dict[str, str]:
+        """The texts stored under the given hashes."""
+        texts = {}
+        for chunk in _chunks([digest for digest in set(hashes) if digest]):
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT hash, data FROM blobs "
+                    f"WHERE hash IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            texts.update((digest, zlib.decompress(data).decode())
+                         for digest, data in rows)
+        return texts
+
+    def get(self, digest: str) -> Optional[str]:
+        return self.get_many([digest]).get(digest)
+
+    def store(self, df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+        """Store the texts of the given columns, replacing them with their hash.
+
+        Returns:
+            pd.DataFrame: A copy of df.
+        """
+        df = df.copy()
+        for column in columns:
+            if column in df.columns:
+                texts = df[column].astype(object).where(df[column].notna(), None)
+                df[column] = pd.Series(self.put_many(texts), index=df.index,
+                                       dtype=object)
+        return df
+
+    def load(self, df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+        """Replace the hashes of the given columns with their texts.
+
+        Values that are not hashes of this store are left unchanged.
+
+        Returns:
+            pd.DataFrame: A copy of df.
+        """
+        df = df.copy()
+        for column in columns:
+            if column in df.columns:
+                values = df[column].astype(object)
+                texts = self.get_many(value for value in values
+                                      if isinstance(value, str)
+                                      and value.startswith(HASH_PREFIX))
+                df[column] = pd.Series([texts.get(value, value)
+                                        if isinstance(value, str) else value
+                                        for value in values],
+                                       index=df.index, dtype=object)
+        return df
+
+    def stats_message(self) -> str:
+        return (f"Blob store: {self.blobs_written} texts stored "
+                f"({self.bytes_written / 1024:.0f} KiB compressed), "
+                f"{self.blobs_reused} already stored")
+
+    def _known(self, hashes: Iterable[str]) -> set[str]:
+        known = set()
+        for chunk in _chunks(list(hashes)):
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT hash FROM blobs "
+                    f"WHERE hash IN ({', '.join('?' * len(chunk))})", chunk)
+                known.update(digest for digest, in rows)
+        return known
+
+
+def _chunks(values: list, size: int = 500) -> Iterable[list]:
+    # below the maximum number of parameters of a statement
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
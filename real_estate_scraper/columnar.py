@@ -0,0 +1,131 @@
+from typing import Optional, Iterable
+
+import numpy as np
+import pandas as pd
+
+from real_estate_scraper.configuration import House
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class RecordColumns:
+    """Accumulates scraped listings column by column instead of as a list of dicts.
+
+    Each listing is split into its columns as soon as it is appended, so a batch
+    holds one list per column and no dict per listing. With pyarrow installed, a
+    batch is sealed into an Arrow table, where the columns in dictionary_columns
+    (repeated strings like City or EnergyLabel) are dictionary encoded: every
+    distinct value is stored once.
+
+    Args:
+        columns (list[str], optional): The columns, in order. Columns of the
+        listings not in the list are added as they show up. Defaults to None.
+        dictionary_columns (Iterable[str], optional): The columns to dictionary
+        encode. Defaults to None.
+        schema (pa.Schema, optional): The types of the columns of the Arrow
+        tables, so that the tables of all the batches can be concatenated
+        whatever the values found in each of them. Columns not in the schema are
+        stored as text. Defaults to None (types inferred from the values).
+    """
+
+    def __init__(self, columns: Optional[list[str]] = None,
+                 dictionary_columns: Optional[Iterable[str]] = None,
+                 schema: Optional["pa.Schema"] = None):
+        self.columns: dict[str, list] = {column: [] for column in columns or []}
+        self.dictionary_columns = set(dictionary_columns or [])
+        self.schema = schema
+        self._length = 0
+
+    def append(self, record: House):
+        for column, values in self.columns.items():
+            values.append(record.get(column))
+        for column in record.keys() - self.columns.keys():
+            self.columns[column] = [None] * self._length + [record[column]]
+        self._length += 1
+
+    def extend(self, records: Iterable[House]):
+        for record in records:
+            self.append(record)
+
+    def column(self, name: str) -> list:
+        return self.columns.get(name, [None] * self._length)
+
+    def record(self, index: int) -> House:
+        """The listing at index, without the columns it has no value for."""
+        return {column: values[index] for column, values in self.columns.items()
+                if values[index] is not None}
+
+    def __len__(self):
+        return self._length
+
+    def retrieval_statistics(self, items_list: list[str]) -> tuple[float, int, int]:
+        """Like `parsing.get_retrieval_statistics`, computed on the columns."""
+        nan_count = np.zeros(self._length, dtype=int)
+        for item in items_list:
+            nan_count += pd.isna(np.array(self.column(item), dtype=object))
+        num_items = len(items_list)
+        success_rate = ((num_items - nan_count) / num_items).mean().round(2) * 100
+        return success_rate, num_items - nan_count.min(), num_items - nan_count.max()
+
+    def to_arrow(self) -> "pa.Table":
+        """The listings as an Arrow table. Requires pyarrow."""
+        if pa is None:
+            raise ImportError("Arrow tables require the pyarrow package: "
+                              "pip install pyarrow")
+        arrays = {}
+        for column, values in self.columns.items():
+            array = _to_arrow_array(values, self._arrow_type(column))
+            if column in self.dictionary_columns and pa.types.is_string(array.type):
+                array = array.dictionary_encode()
+            arrays[column] = array
+        return pa.table(arrays)
+
+    def _arrow_type(self, column: str) -> Optional["pa.DataType"]:
+        if self.schema is None:
+            return None
+        if column in self.schema.names:
+            return self.schema.field(column).type
+        return pa.string()
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """The listings as a dataframe, dictionary encoded columns as categories."""
+        if pa is not None:
+            return arrow_to_dataframe(self.to_arrow())
+        df = pd.DataFrame(self.columns)
+        for column in self.dictionary_columns & self.columns.keys():
+            df[column] = df[column].astype("category")
+        return df
+
+
+def _to_arrow_array(values: list, arrow_type: Optional["pa.DataType"] = None) \
+        -> "pa.Array":
+    try:
+        return pa.array(values, arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed types, e.g. numbers and text: keep the text
+        array = pa.array([None if value is None else str(value) for value in values],
+                         pa.string())
+        return array if arrow_type is None else array.cast(arrow_type)
+
+
+def concat_tables(tables: list["pa.Table"]) -> "pa.Table":
+    """Concatenate the tables of the batches without copying their data.
+
+    The chunks of the tables become the chunks of the result. Columns whose type
+    differs across batches, e.g. null in a batch where an item was never found, are
+    promoted to a common type.
+    """
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def arrow_to_dataframe(table: "pa.Table") -> pd.DataFrame:
+    """Convert to pandas, with dictionary encoded columns as categories.
+
+    The Arrow buffers are released while the columns are converted, so the table
+    must not be used afterwards.
+    """
+    return table.unify_dictionaries().to_pandas(self_destruct=True)
+
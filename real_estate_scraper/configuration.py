@@ -1,10 +1,11 @@
 import json
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Union, Optional, TypedDict, Protocol, runtime_checkable, Dict
 
-from bs4 import BeautifulSoup
+from real_estate_scraper.matchers import Matcher
+from real_estate_scraper.parsers import Node, PARSERS, DEFAULT_PARSER
 
 House = Dict[str, str]
 
@@ -12,14 +13,30 @@ House = Dict[str, str]
 class ItemContent(TypedDict):
     type: str
     text_in_website: Optional[str]
+    selector: Optional[dict]
 
 
 @runtime_checkable
 class RetrieveItemFn(Protocol):
-    def __call__(self, soup: BeautifulSoup) -> Union[str, int]:
+    def __call__(self, soup: Node) -> Union[str, int]:
         pass
 
 
+def retrieve_items(retrieve_functions: Iterable[tuple[str, RetrieveItemFn]],
+                   soup: Node) -> House:
+    """Retrieve the named items from a node, as None for those that fail."""
+    house = {}
+    for name, retrieve in retrieve_functions:
+        try:
+            retrieved_item = retrieve(soup)
+        except Exception as e:
+            msg = f"{name} was not retrieved because {e}"
+            print(msg)
+            retrieved_item = None
+        house[name] = retrieved_item
+    return house
+
+
 @dataclass
 class ConfigObject:
     """A base class for objects representing configuration data."""
@@ -46,24 +63,32 @@ class Item(ConfigObject):
 
     Args:
         name (str): The name of the item.
-        type (str, optional): The type of the item. Can be either 'text' or
-        'numeric'. Defaults to 'text'.
+        type (str, optional): The type of the item. Can be 'text', 'numeric',
+        'integer' or 'category', see `normalization.normalize_dataframe`, or
+        'blob' for long texts, like descriptions, that the files and databases
+        written by the scraper hold as hashes when it has a
+        `blob_store.BlobStore`. Defaults to 'text'.
         text_in_website (str, optional): A string used to search for the item in the
         website's HTML. Defaults to None.
         retrieve (Callable, optional): A function used to retrieve the item from the
         website's HTML. Defaults to None.
+        selector (dict, optional): A declarative selector of the item, compiled into
+        its retrieve function, see `matchers.Matcher`. Defaults to None.
 
     """
 
-    _FIELD_TYPES = ["text", "numeric"]
+    _FIELD_TYPES = ["text", "numeric", "integer", "category", "blob"]
     name: str
     type: str = field(default="text")
     text_in_website: Optional[str] = field(default=None, repr=False)
     retrieve: Optional[RetrieveItemFn] = field(default=None, repr=False)
+    selector: Optional[dict] = field(default=None, repr=False)
 
     def __post_init__(self):
         super(Item, self).__post_init__()
         self.validate_type()
+        if self.selector is not None and self.retrieve is None:
+            self.retrieve = Matcher.compile(self.selector, self.text_in_website)
 
     def validate_type(self):
         if self.type not in self._FIELD_TYPES:
@@ -88,6 +113,16 @@ class WebsiteConfig(ConfigObject):
         requests to the website. Defaults to None.
         parse_only (list, optional): A list of strings representing the HTML tags to
         parse when scraping the website. Defaults to None.
+        parser (str, optional): The HTML parser backend, one of
+        `parsers.PARSERS`. Defaults to "beautifulsoup".
+        decimal_delimiter (str, optional): The decimal delimiter of the numbers
+        of the website. Defaults to ".".
+        thousands_delimiter (str, optional): The thousands' delimiter of the
+        numbers of the website. Defaults to ",".
+        stream_until (str, optional): CSS selector of an element of the listing
+        pages after which there are no deep items, where streamed pages are
+        closed. Items selecting the last elements of the page (negative index)
+        take the last ones before it. Defaults to None.
     """
 
     name: str
@@ -96,6 +131,29 @@ class WebsiteConfig(ConfigObject):
     default_city: str
     header: Optional[dict] = None
     parse_only: Optional[list] = None
+    parser: str = DEFAULT_PARSER
+    decimal_delimiter: str = "."
+    thousands_delimiter: str = ","
+    stream_until: Optional[str] = None
+
+    def __post_init__(self):
+        super(WebsiteConfig, self).__post_init__()
+        self.validate_parser()
+        self.validate_delimiters()
+
+    def validate_delimiters(self):
+        if self.decimal_delimiter == self.thousands_delimiter:
+            raise TypeError(
+                f"The decimal and thousands' delimiters cannot be the same, "
+                f"but both are {self.decimal_delimiter!r}"
+            )
+
+    def validate_parser(self):
+        if self.parser not in PARSERS:
+            raise TypeError(
+                f"{self.parser} is not a valid parser. "
+                f"Allowed parsers: {list(PARSERS)}"
+            )
 
 
 class NamedHouseItems:
@@ -138,17 +196,8 @@ class NamedHouseItems:
         self._names.remove(item_name)
         delattr(self, item_name)
 
-    def retrieve_all(self, soup: BeautifulSoup) -> House:
-        house = {}
-        for item in self:
-            try:
-                retrieved_item = item.retrieve(soup)
-            except Exception as e:
-                msg = f"{item.name} was not retrieved because {e}"
-                print(msg)
-                retrieved_item = None
-            house[item.name] = retrieved_item
-        return house
+    def retrieve_all(self, soup: Node) -> House:
+        return retrieve_items(((item.name, item.retrieve) for item in self), soup)
 
     @property
     def names(self):
@@ -220,6 +269,32 @@ def config_factory(
     return config_type_map[config_type](**config_dict)
 
 
+@dataclass(slots=True)
+class JsonExtraction(ConfigObject):
+    """Functions retrieving items from the structured data embedded in raw pages.
+
+    They receive the raw bytes of a page, so that the pages carrying the data do not
+    need to be parsed as HTML. When they return None (e.g. the data is missing), the
+    items are retrieved from the HTML instead.
+
+    Args:
+        listings (Callable, optional): Returns the shallow items of the listings of a
+        results page. Defaults to None.
+        house_deep (Callable, optional): Returns a dict with the deep items it
+        finds in a listing page, the others are retrieved from the HTML. Defaults
+        to None.
+
+    A listing page is parsed as HTML as soon as house_deep leaves out one of the
+    deep items, so it only saves the parse if it returns all of them. For
+    instance, the immobiliare extractor returns the features of the listing (e.g.
+    Stato or Riscaldamento) along with its location only when the page has their
+    data, otherwise they are read from the HTML.
+    """
+
+    listings: Optional[Callable] = None
+    house_deep: Optional[Callable] = None
+
+
 @dataclass(slots=True)
 class ScraperConfig(ConfigObject):
     """Object containing the configuration for the scraper."""
@@ -228,6 +303,21 @@ class ScraperConfig(ConfigObject):
     search_results_items: SearchResultsHouseItems
     house_items_shallow: HouseHouseItemsShallow
     house_items_deep: Optional[NamedHouseItems]
+    json_extraction: Optional[JsonExtraction] = None
+
+    def __post_init__(self):
+        super(ScraperConfig, self).__post_init__()
+        self.validate_selectors()
+
+    def validate_selectors(self):
+        if self.website_settings.parser == "lxml":
+            return
+        for items in (self.search_results_items, self.house_items_shallow,
+                      self.house_items_deep or []):
+            for item in items:
+                if isinstance(item.retrieve, Matcher) and item.retrieve.xpath:
+                    raise TypeError(f"The XPath selector of {item.name} requires "
+                                    f"the lxml parser")
 
     @classmethod
     def from_json(cls, json_path: Union[Path, str]):
@@ -0,0 +1,129 @@
+import re
+from typing import Optional, Union, Any
+
+from real_estate_scraper.configuration import House
+from real_estate_scraper.parsing import json_loads
+
+NEXT_DATA_PATTERN = re.compile(rb'<script[^>]*\bid="__NEXT_DATA__"[^>]*>(.*?)</script>',
+                               re.DOTALL)
+
+LOCATION_KEYS = {"Latitude": "latitude",
+                 "Longitude": "longitude",
+                 "City": "city",
+                 "Province": "province",
+                 "Region": "region",
+                 "Microzone": "microzone",
+                 "Macrozone": "macrozone",
+                 "StreetNumber": "streetNumber",
+                 "AddressDeep": "address"}
+
+
+def read_next_data(body: Union[bytes, str]) -> Optional[dict]:
+    """The __NEXT_DATA__ JSON of a raw page, found without parsing its HTML."""
+    if isinstance(body, str):
+        body = body.encode()
+    match = NEXT_DATA_PATTERN.search(body)
+    if match is None:
+        return None
+    try:
+        return json_loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def get_path(data: Any, *keys: Union[str, int]) -> Any:
+    """The value at a path of keys and indices in a JSON document, or None."""
+    for key in keys:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def _text(value: Any) -> Optional[str]:
+    # The HTML path retrieves text, keep the same types
+    return None if value is None else str(value)
+
+
+def listing_from_result(result: dict) -> House:
+    real_estate = result.get("realEstate") or {}
+    properties = real_estate.get("properties") or [{}]
+    main = properties[0]
+    number_of_apartments = None
+    if real_estate.get("isProjectLike") or len(properties) > 1:
+        number_of_apartments = len(properties)
+    return {"Address": _text(real_estate.get("title")),
+            "LivingArea": _text(main.get("surface")),
+            "Price": _text(get_path(real_estate, "price", "formattedValue")),
+            "Rooms": _text(main.get("rooms")),
+            "Floor": _text(get_path(main, "floor", "abbreviation")),
+            "Bathrooms": _text(main.get("bathrooms")),
+            "NumberOfApartments": _text(number_of_apartments),
+            "href": _text(get_path(result, "seo", "url"))}
+
+
+def listings_from_next_data(body: Union[bytes, str]) -> Optional[list[House]]:
+    """The shallow items of the listings of a raw results page, read from its JSON.
+
+    Returns:
+        list[House]: The listings, or None if the page has no results data.
+    """
+    queries = get_path(read_next_data(body), "props", "pageProps", "dehydratedState",
+                       "queries")
+    for query in queries or []:
+        results = get_path(query, "state", "data", "results")
+        if isinstance(results, list):
+            return [listing_from_result(result) for result in results]
+    return None
+
+
+def feature_rows(listing: dict) -> Optional[list[tuple[str, Any]]]:
+    """The (lowercase label, value) rows of the features of a listing, in the order
+    of the dt and dd the page renders from them, or None if it has no features."""
+    sections = listing.get("mainData")
+    if not isinstance(sections, list):
+        return None
+    return [(str(row.get("label", "")).lower(), row.get("value"))
+            for section in sections if isinstance(section, dict)
+            for row in section.get("rows") or [] if isinstance(row, dict)]
+
+
+def feature_value(rows: list[tuple[str, Any]], label: str,
+                  separator: str) -> Optional[str]:
+    # The value of the first row whose label contains the dt text, as the dd of
+    # the first dt containing it, see `matchers.DtDdIndex`
+    label = label.lower()
+    for row_label, value in rows:
+        if label in row_label:
+            if isinstance(value, list):
+                return separator.join(str(part) for part in value) if value else None
+            return _text(value)
+    return None
+
+
+def house_deep_from_next_data(body: Union[bytes, str],
+                              features: Optional[dict[str, tuple[str, str]]] = None
+                              ) -> Optional[House]:
+    """The deep items of a raw listing page, read from its JSON.
+
+    Args:
+        body (Union[bytes, str]): The raw page.
+        features (dict, optional): The (dt text, separator) of the items read from
+        the dt of the page, by name. Defaults to None.
+
+    Returns:
+        House: The location items, with the features if the page has their data,
+        or None if the page has no location data.
+    """
+    listing = get_path(read_next_data(body), "props", "pageProps", "detailData",
+                       "realEstate", "properties", 0)
+    location = get_path(listing, "location")
+    if not isinstance(location, dict):
+        return None
+    house = {name: location.get(key) for name, key in LOCATION_KEYS.items()}
+    rows = feature_rows(listing)
+    if rows is not None:
+        house.update({name: feature_value(rows, label, separator)
+                      for name, (label, separator) in (features or {}).items()})
+    return house
@@ -1 +1,7 @@
-from .funda_scraper import get_funda_scraper
+def __getattr__(name):
+    # imported lazily, so that importing the extractors of funda (e.g. in parse
+    # workers) does not build the scraper configuration
+    if name == "get_funda_scraper":
+        from .funda_scraper import get_funda_scraper
+        return get_funda_scraper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
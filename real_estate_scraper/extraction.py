@@ -0,0 +1,282 @@
+import asyncio
+import importlib
+import pickle
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional, Callable, TypeVar, Any, Union
+
+from bs4.element import SoupStrainer
+
+from real_estate_scraper.configuration import ScraperConfig, House, NamedHouseItems, \
+    RetrieveItemFn, JsonExtraction, retrieve_items
+from real_estate_scraper.parsers import parse_html, Node, DEFAULT_PARSER
+from real_estate_scraper.parsing import str_from_tag, json_loads
+
+EXECUTOR_KINDS = ("thread", "process")
+
+T = TypeVar("T")
+ExtractFn = Callable[[bytes, "ExtractionPlan"], T]
+
+
+@lru_cache(maxsize=None)
+def import_function(path: str) -> Callable:
+    """Import a function from its "module:qualified.name" path."""
+    module_name, _, qualname = path.partition(":")
+    obj = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+@dataclass(frozen=True)
+class Extractor:
+    """A picklable retrieve function: a named, importable function and its parameters.
+
+    Calling the extractor on a node calls the function with the parameters and
+    returns the text of the result if it is a node. Lambdas and closures cannot be
+    pickled, so the site configurations build their retrieve functions with `of`:
+
+        >>> Extractor.of(select_one, css="h2")
+
+    Args:
+        function (str): The "module:qualified.name" path of the function.
+        params (dict, optional): The keyword arguments of the function.
+    """
+
+    function: str
+    params: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, func: Callable, **params) -> "Extractor":
+        path = f"{func.__module__}:{func.__qualname__}"
+        try:
+            importable = import_function(path) is func
+        except (ImportError, AttributeError):
+            importable = False
+        if not importable:
+            raise ValueError(f"{path} cannot be imported by name, extractors must be "
+                             f"module-level functions")
+        return cls(path, params)
+
+    def __call__(self, soup: Node):
+        return str_from_tag(import_function(self.function)(soup, **self.params))
+
+
+def select_one(soup: Node, css: str) -> Optional[Node]:
+    return soup.select_one(css)
+
+
+def select_all(soup: Node, css: str) -> list[Node]:
+    return soup.select(css)
+
+
+def select_attr(soup: Node, css: str, attr: str) -> Optional[str]:
+    return soup.select_one(css).attr(attr)
+
+
+def find_once(soup: Node, css: str) -> Optional[Node]:
+    """Like `select_one`, but located once per node and shared by all its items."""
+    return soup.memo(("find_once", css), lambda node: node.select_one(css))
+
+
+def script_json(soup: Node, css: str, index: int = 0) -> Any:
+    """The JSON content of a script element of the page, decoded once per page.
+
+    Args:
+        soup (Node): The page, or the part of it the items are retrieved from.
+        css (str): CSS selector of the script elements.
+        index (int, optional): Index of the script among those matching css.
+        Defaults to 0.
+
+    Returns:
+        The decoded JSON, or None if the script is empty.
+    """
+
+    def decode(node: Node) -> Any:
+        text = node.select(css)[index].text(strip=False)
+        return json_loads(text) if text.strip() else None
+
+    return soup.memo(("script_json", css, index), decode)
+
+
+@lru_cache(maxsize=None)
+def _strainer(parse_only: Optional[tuple[str, ...]]) -> Optional[SoupStrainer]:
+    return SoupStrainer(list(parse_only)) if parse_only else None
+
+
+def _retrieve_functions(items: Optional[NamedHouseItems]) -> dict[str, RetrieveItemFn]:
+    if items is None:
+        return {}
+    return {item.name: item.retrieve for item in items}
+
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    """The extraction part of a `ScraperConfig`, compiled to plain data.
+
+    The plan holds the parser settings and the retrieve function of every item. When
+    all of them are `Extractor`s the plan can be pickled, so it can be sent once to
+    the workers of a process pool, which keep it for their whole life instead of
+    importing and building the site configuration.
+
+    Args:
+        parser (str): The parser backend.
+        parse_only (tuple[str], optional): The tags parsed by BeautifulSoup.
+        search_results_items (dict): Retrieve function of each search results item.
+        house_items_shallow (dict): Retrieve function of each shallow item.
+        house_items_deep (dict): Retrieve function of each deep item.
+        json_listings (Callable, optional): Retrieves the listings of a raw results
+        page from its embedded data, see `JsonExtraction`.
+        json_house_deep (Callable, optional): Retrieves deep items of a raw listing
+        page from its embedded data, see `JsonExtraction`.
+    """
+
+    parser: str = DEFAULT_PARSER
+    parse_only: Optional[tuple[str, ...]] = None
+    search_results_items: dict[str, RetrieveItemFn] = field(default_factory=dict)
+    house_items_shallow: dict[str, RetrieveItemFn] = field(default_factory=dict)
+    house_items_deep: dict[str, RetrieveItemFn] = field(default_factory=dict)
+    json_listings: Optional[Callable] = None
+    json_house_deep: Optional[Callable] = None
+
+    @classmethod
+    def compile(cls, config: ScraperConfig) -> "ExtractionPlan":
+        settings = config.website_settings
+        json_extraction = config.json_extraction or JsonExtraction()
+        return cls(parser=settings.parser,
+                   parse_only=tuple(settings.parse_only) if settings.parse_only
+                   else None,
+                   search_results_items=_retrieve_functions(config.search_results_items),
+                   house_items_shallow=_retrieve_functions(config.house_items_shallow),
+                   house_items_deep=_retrieve_functions(config.house_items_deep),
+                   json_listings=json_extraction.listings,
+                   json_house_deep=json_extraction.house_deep)
+
+    @property
+    def picklable(self) -> bool:
+        try:
+            pickle.dumps(self)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return False
+        return True
+
+    def parse(self, body: Union[bytes, str]) -> Node:
+        return parse_html(body, parser=self.parser,
+                          parse_only=_strainer(self.parse_only))
+
+    @staticmethod
+    def retrieve_all(retrieve_functions: dict[str, RetrieveItemFn], soup: Node) -> House:
+        """Like `NamedHouseItems.retrieve_all`."""
+        return retrieve_items(retrieve_functions.items(), soup)
+
+
+def extract_listings(body: bytes, plan: ExtractionPlan) -> list[House]:
+    """Retrieve the shallow items of the listings of a results page.
+
+    The listings are read from the data embedded in the page if the plan has a JSON
+    retrieve function and the page has the data, else from its HTML.
+    """
+    if plan.json_listings is not None:
+        houses = plan.json_listings(body)
+        if houses is not None:
+            return [{name: house.get(name) for name in plan.house_items_shallow}
+                    for house in houses]
+
+    listings = plan.search_results_items["listings"](plan.parse(body))
+    return [plan.retrieve_all(plan.house_items_shallow, listing)
+            for listing in listings]
+
+
+def extract_house_deep(body: bytes, plan: ExtractionPlan) -> House:
+    """Retrieve the deep items of a listing page.
+
+    The items found in the data embedded in the page are not retrieved from its
+    HTML, which is only parsed if some items are left.
+    """
+    json_items = {}
+    if plan.json_house_deep is not None:
+        json_items = plan.json_house_deep(body) or {}
+
+    html_items = {name: retrieve for name, retrieve in plan.house_items_deep.items()
+                  if name not in json_items}
+    house = plan.retrieve_all(html_items, plan.parse(body)) if html_items else {}
+    return {name: json_items[name] if name in json_items else house[name]
+            for name in plan.house_items_deep}
+
+
+_worker_plan: Optional[ExtractionPlan] = None
+
+
+def _init_worker(plan: ExtractionPlan):
+    global _worker_plan
+    _worker_plan = plan
+
+
+def _extract_in_worker(func: ExtractFn, body: bytes):
+    return func(body, _worker_plan)
+
+
+class ExtractionExecutor:
+    """Parses pages and retrieves their items outside the event loop.
+
+    The crawl coroutines hand the raw response bytes to the executor and await the
+    House dicts, so network I/O keeps flowing while pages are parsed, and with a
+    process pool parsing runs on as many cores as there are workers.
+
+    Args:
+        plan (ExtractionPlan): The plan of the items to retrieve. A process pool
+        requires a picklable plan, see `Extractor`.
+        workers (int, optional): Number of workers. If 0, pages are parsed on the
+        event loop itself. Defaults to 0.
+        kind (str, optional): "process" for a process pool, or "thread" for a
+        thread pool, which only runs in parallel the parts of parsing that release
+        the GIL (lxml and selectolax tree building). Defaults to "process".
+    """
+
+    def __init__(self, plan: ExtractionPlan, workers: int = 0, kind: str = "process"):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"{kind} is not a valid executor. "
+                             f"Allowed executors: {list(EXECUTOR_KINDS)}")
+        if workers and kind == "process" and not plan.picklable:
+            raise TypeError("A process pool requires a picklable extraction plan: "
+                            "build the retrieve functions with Extractor.of")
+        self.plan = plan
+        self.workers = workers
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+
+    async def run(self, func: ExtractFn, body: bytes) -> T:
+        """Run an extraction function on a page body."""
+        if not self.workers:
+            return func(body, self.plan)
+
+        loop = asyncio.get_running_loop()
+        if self.kind == "thread":
+            return await loop.run_in_executor(self._get_executor(), func, body,
+                                              self.plan)
+        return await loop.run_in_executor(self._get_executor(), _extract_in_worker,
+                                          func, body)
+
+    async def listings(self, body: bytes) -> list[House]:
+        return await self.run(extract_listings, body)
+
+    async def house_deep(self, body: bytes) -> House:
+        return await self.run(extract_house_deep, body)
+
+    def close(self):
+        """Shut the workers down. They are started again if the executor is used."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="extraction")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=_init_worker,
+                                                     initargs=(self.plan,))
+        return self._executor
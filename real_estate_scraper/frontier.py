@@ -0,0 +1,177 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Union, Iterable
+
+from real_estate_scraper.configuration import House
+from real_estate_scraper.pipeline import ShallowPage
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class CrawlFrontier:
+    """The state of a crawl persisted to a SQLite file, to resume it if it stops.
+
+    The frontier records the number of pages of every city, the status of every
+    shallow page, and every listing discovered on them together with its shallow
+    items, so that a resumed crawl only fetches the work still outstanding:
+    shallow pages already parsed are not requested again, and listings already
+    delivered to the sink are skipped. Listings are identified by their href, or by
+    their items if they have none, see `listing_key`. Failed pages and listings
+    are retried on resume until they reach `max_retries` failures.
+
+    Args:
+        path (str, Path): Path of the SQLite file, created if it does not exist.
+        max_retries (int, optional): Failures after which a page or a listing is
+        given up. Defaults to 3.
+    """
+
+    def __init__(self, path: Union[str, Path], max_retries: int = 3):
+        self.path = Path(path)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cities ("
+                               "city TEXT PRIMARY KEY, num_pages INTEGER)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS shallow_pages ("
+                               "city TEXT, page INTEGER, status TEXT, "
+                               "retries INTEGER DEFAULT 0, PRIMARY KEY (city, page))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS listings ("
+                               "href TEXT PRIMARY KEY, city TEXT, page INTEGER, "
+                               "house TEXT, status TEXT, retries INTEGER DEFAULT 0)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS listings_page "
+                               "ON listings (city, page)")
+
+    def close(self):
+        self._conn.close()
+
+    def get_num_pages(self, city: Optional[str]) -> Optional[int]:
+        rows = self._fetch("SELECT num_pages FROM cities WHERE city = ?",
+                           (city or "",))
+        return rows[0][0] if rows else None
+
+    def set_num_pages(self, city: Optional[str], num_pages: int):
+        self._write("INSERT OR REPLACE INTO cities VALUES (?, ?)",
+                    (city or "", num_pages))
+
+    def page_status(self, page: ShallowPage) -> tuple[str, int]:
+        """Status and number of failures of a shallow page."""
+        rows = self._fetch("SELECT status, retries FROM shallow_pages "
+                           "WHERE city = ? AND page = ?",
+                           (page.city or "", page.page))
+        return rows[0] if rows else (PENDING, 0)
+
+    def page_given_up(self, page: ShallowPage) -> bool:
+        status, retries = self.page_status(page)
+        return status == FAILED and retries >= self.max_retries
+
+    def add_page_listings(self, page: ShallowPage, houses: list[House]) -> list[House]:
+        """Mark the page as parsed and store its listings as pending.
+
+        Returns:
+            list[House]: The listings still to be delivered, skipping those already
+            done (or given up) in a previous run.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO shallow_pages (city, page, status) "
+                               "VALUES (?, ?, ?) ON CONFLICT (city, page) "
+                               "DO UPDATE SET status = excluded.status",
+                               (page.city or "", page.page, DONE))
+            self._conn.executemany("INSERT OR IGNORE INTO listings "
+                                   "(href, city, page, house, status) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   [(listing_key(house), page.city or "", page.page,
+                                     json.dumps(house), PENDING)
+                                    for house in houses])
+        houses = [house for house in houses if not self._listing_closed(house)]
+        self._retry_failed_listings(page)
+        return houses
+
+    def pending_listings(self, page: ShallowPage) -> list[House]:
+        """Listings of an already parsed page that are still to be delivered."""
+        rows = self._fetch("SELECT house FROM listings WHERE city = ? AND page = ? "
+                           "AND (status = ? OR (status = ? AND retries < ?))",
+                           (page.city or "", page.page, PENDING, FAILED,
+                            self.max_retries))
+        self._retry_failed_listings(page)
+        return [json.loads(house) for house, in rows]
+
+    def _retry_failed_listings(self, page: ShallowPage):
+        # the failed listings of the page are retried: back to pending, so that
+        # they are marked as done once delivered
+        self._write("UPDATE listings SET status = ? WHERE city = ? AND page = ? "
+                    "AND status = ? AND retries < ?",
+                    (PENDING, page.city or "", page.page, FAILED, self.max_retries))
+
+    def page_failed(self, page: ShallowPage):
+        self._write("INSERT INTO shallow_pages (city, page, status, retries) "
+                    "VALUES (?, ?, ?, 1) ON CONFLICT (city, page) "
+                    "DO UPDATE SET status = excluded.status, retries = retries + 1",
+                    (page.city or "", page.page, FAILED))
+
+    def listing_failed(self, house: House) -> bool:
+        """Record a failure of the deep page of a listing.
+
+        Returns:
+            bool: Whether the listing is given up. If not, it is retried on resume.
+        """
+        key = listing_key(house)
+        self._write("UPDATE listings SET status = ?, retries = retries + 1 "
+                    "WHERE href = ?", (FAILED, key))
+        rows = self._fetch("SELECT retries FROM listings WHERE href = ?", (key,))
+        return not rows or rows[0][0] >= self.max_retries
+
+    def mark_done(self, houses: Iterable[House]):
+        """Mark listings as delivered to the sink.
+
+        Listings whose deep page failed stay failed, so that they are retried on
+        resume.
+        """
+        self.mark_hrefs_done(listing_key(house) for house in houses)
+
+    def mark_hrefs_done(self, hrefs: Iterable[Optional[str]]):
+        """Like `mark_done`, for the hrefs of the listings (their `listing_key`)."""
+        parameters = [(DONE, href, PENDING) for href in hrefs if href]
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE listings SET status = ? "
+                                   "WHERE href = ? AND status = ?", parameters)
+
+    @property
+    def stats(self) -> dict[str, dict[str, int]]:
+        stats = {}
+        for table in ("shallow_pages", "listings"):
+            rows = self._fetch(f"SELECT status, COUNT(*) FROM {table} "
+                               f"GROUP BY status")
+            stats[table] = dict(rows)
+        return stats
+
+    def _listing_closed(self, house: House) -> bool:
+        rows = self._fetch("SELECT status, retries FROM listings WHERE href = ?",
+                           (listing_key(house),))
+        if not rows:
+            return False
+        status, retries = rows[0]
+        return status == DONE or (status == FAILED and retries >= self.max_retries)
+
+    def _fetch(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, parameters).fetchall()
+
+    def _write(self, sql: str, parameters: tuple = ()):
+        with self._lock, self._conn:
+            self._conn.execute(sql, parameters)
+
+
+def listing_key(house: House) -> str:
+    """The href of a listing, or a hash of its items if it has none."""
+    if house.get("href"):
+        return house["href"]
+    items = {name: value for name, value in house.items() if value is not None}
+    content = json.dumps(items, sort_keys=True).encode()
+    return "#" + hashlib.blake2b(content, digest_size=16).hexdigest()
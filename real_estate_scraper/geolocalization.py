@@ -1,15 +1,18 @@
 import asyncio
 import logging
 from asyncio import Semaphore
-from typing import Tuple
+from functools import partial
+from typing import Tuple, Optional
 
+import aiohttp
 import geopy
 from aiolimiter import AsyncLimiter
 from geopy import GoogleV3
 from geopy.adapters import AioHTTPAdapter
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
-from real_estate_scraper.html_handling import add_limiter, add_semaphore
+from real_estate_scraper.html_handling import add_limiter, add_semaphore, \
+    create_session
 
 
 def get_coordinates(country: str,
@@ -34,22 +37,55 @@ def get_coordinates(country: str,
         return None, None
 
 
+class SharedSessionAdapter(AioHTTPAdapter):
+    """An AioHTTPAdapter that uses an externally owned, pooled session.
+
+    The session is not closed when the geocoder exits its async context, it is up
+    to its owner to close it.
+    """
+
+    def __init__(self, *, proxies, ssl_context, session: aiohttp.ClientSession):
+        super(SharedSessionAdapter, self).__init__(proxies=proxies,
+                                                   ssl_context=ssl_context)
+        self._shared_session = session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self._shared_session
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
 class GoogleGeolocator:
     def __init__(self,
                  api_key: str,
                  max_active_requests: int = 25,
-                 requests_per_sec: int = 25):
+                 requests_per_sec: int = 25,
+                 session: Optional[aiohttp.ClientSession] = None):
         self.api_key = api_key
         self.max_active_requests = max_active_requests
         self.requests_per_sec = requests_per_sec
         self.semaphore = Semaphore(value=max_active_requests)
         self.limiter = AsyncLimiter(1, round(1 / requests_per_sec, 3))
+        self.session = session
         self.adapter_factory = AioHTTPAdapter
         self.geolocator = GoogleV3(api_key=api_key, adapter_factory=AioHTTPAdapter)
 
-    async def get_coordinates_async(self, query: str) -> dict:
-        async with GoogleV3(api_key=self.api_key,
-                            adapter_factory=self.adapter_factory) as geolocator:
+    def _create_geolocator(self, session: aiohttp.ClientSession) -> GoogleV3:
+        return GoogleV3(api_key=self.api_key,
+                        adapter_factory=partial(SharedSessionAdapter, session=session))
+
+    async def get_coordinates_async(self,
+                                    query: str,
+                                    geolocator: Optional[GoogleV3] = None) -> dict:
+        if geolocator is None:
+            async with create_session() as session:
+                return await self.get_coordinates_async(
+                    query, geolocator=self._create_geolocator(session)
+                )
+
+        async with geolocator:
             try:
                 result = await geolocator.geocode(query)
                 if result:
@@ -64,19 +100,34 @@ class GoogleGeolocator:
             except GeocoderTimedOut as e:
                 # If the geocoder times out, try again
                 logging.warning(f"Timeout error: {e}")
-                return await self.get_coordinates_async(query)
+                return await self.get_coordinates_async(query, geolocator=geolocator)
 
-    def retrieve_coordinates_from_queries(self, queries: list[str]):
+    async def retrieve_coordinates_async(self, queries: list[str]) -> list[dict]:
+        """Geocode all the queries, sharing one pooled session among them.
+
+        The session given at construction is used if any, otherwise a session is
+        created for the duration of the call.
+        """
         self.semaphore = Semaphore(value=self.max_active_requests)
 
         @add_semaphore(semaphore=self.semaphore)
         @add_limiter(limiter=self.limiter)
-        async def limited_get_coordinates(*args):
-            return await self.get_coordinates_async(*args)
+        async def limited_get_coordinates(*args, **kwargs):
+            return await self.get_coordinates_async(*args, **kwargs)
 
-        async def fetch_all(queries_list):
-            results = await asyncio.gather(*(limited_get_coordinates(query)
+        async def fetch_all(queries_list, session):
+            geolocator = self._create_geolocator(session)
+            results = await asyncio.gather(*(limited_get_coordinates(query,
+                                                                     geolocator)
                                              for query in queries_list))
             return results
 
-        return asyncio.run(fetch_all(queries))
+        if self.session is not None:
+            return await fetch_all(queries, self.session)
+
+        async with create_session(max_connections_per_host=self.max_active_requests) \
+                as session:
+            return await fetch_all(queries, session)
+
+    def retrieve_coordinates_from_queries(self, queries: list[str]):
+        return asyncio.run(self.retrieve_coordinates_async(queries))
@@ -1,13 +1,61 @@
 import asyncio
 import logging
 from asyncio import Semaphore
+from contextlib import asynccontextmanager
 from functools import wraps
-from typing import Union, Optional
+from time import perf_counter
+from typing import Union, Optional, AsyncIterator, Callable, Awaitable, Any
 
 import aiohttp
 from aiohttp import ClientResponseError
 from aiolimiter import AsyncLimiter
 from bs4 import BeautifulSoup
+from bs4.element import SoupStrainer
+
+from real_estate_scraper.http_cache import ResponseCache
+from real_estate_scraper.parsers import Node, parse_html, DEFAULT_PARSER
+from real_estate_scraper.parsing import json_loads
+from real_estate_scraper.retrying import RetryScheduler, default_retry_policies
+from real_estate_scraper.throttling import Throttle
+
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 10
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+
+ReadBodyFn = Callable[[aiohttp.ClientResponse], Awaitable[Any]]
+
+
+def create_session(header: Optional[dict] = None,
+                   max_connections: int = MAX_CONNECTIONS,
+                   max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+                   dns_cache_ttl: int = DNS_CACHE_TTL,
+                   keepalive_timeout: int = KEEPALIVE_TIMEOUT) -> aiohttp.ClientSession:
+    """Create a pooled session meant to be shared by many requests.
+
+    Connections are kept alive and reused across requests to the same host, and
+    DNS lookups are cached, so that only the first request to a host pays for the
+    TCP/TLS handshake. Must be called from within a running event loop, and the
+    session must be closed by the caller.
+    """
+    connector = aiohttp.TCPConnector(limit=max_connections,
+                                     limit_per_host=max_connections_per_host,
+                                     use_dns_cache=True,
+                                     ttl_dns_cache=dns_cache_ttl,
+                                     keepalive_timeout=keepalive_timeout)
+    return aiohttp.ClientSession(connector=connector, headers=header)
+
+
+@asynccontextmanager
+async def session_scope(session: Optional[aiohttp.ClientSession] = None) \
+        -> AsyncIterator[aiohttp.ClientSession]:
+    """Yield the given session, or a temporary one closed on exit if None."""
+    if session is not None:
+        yield session
+        return
+
+    async with aiohttp.ClientSession() as temporary_session:
+        yield temporary_session
 
 
 async def get_response(url_str: str,
@@ -15,49 +63,205 @@ async def get_response(url_str: str,
                        read_format: str = "text",
                        max_retries: int = 5,
                        timeout: int = 10,
-                       logger: Optional[logging.Logger] = None) -> Union[str, dict, list]:
-    retries = 0
-    while retries < max_retries:
+                       logger: Optional[logging.Logger] = None,
+                       session: Optional[aiohttp.ClientSession] = None,
+                       cache: Optional[ResponseCache] = None,
+                       throttle: Optional[Throttle] = None,
+                       retry_scheduler: Optional[RetryScheduler] = None,
+                       read_body: Optional[ReadBodyFn] = None) \
+        -> Union[str, dict, list]:
+    """Request a URL, retrying on failures according to the retry scheduler.
+
+    If no retry scheduler is given, one using `default_retry_policies(max_retries)`
+    is created for the request. If read_body is given, it reads the response in
+    place of read_format, e.g. a `streaming.StreamingReader`.
+    """
+    async with session_scope(session) as active_session:
+        return await _get_response_with_retries(active_session,
+                                                url_str,
+                                                header=header,
+                                                read_format=read_format,
+                                                max_retries=max_retries,
+                                                timeout=timeout,
+                                                logger=logger,
+                                                cache=cache,
+                                                throttle=throttle,
+                                                retry_scheduler=retry_scheduler,
+                                                read_body=read_body)
+
+
+async def fetch(session: aiohttp.ClientSession,
+                url_str: str,
+                header: Optional[dict] = None,
+                read_format: str = "text",
+                timeout: int = 10,
+                cache: Optional[ResponseCache] = None,
+                read_body: Optional[ReadBodyFn] = None) -> Union[bytes, dict, list]:
+    """Perform a single request, going through the cache if one is given.
+
+    Fresh cached bodies are returned without contacting the server, stale ones
+    are revalidated with a conditional request and reused on a 304 response.
+    Responses read by read_body may be partial, so they bypass the cache.
+    """
+    header = header or {}
+    if cache is None or read_body is not None:
+        async with session.get(url_str,
+                               headers=header,
+                               timeout=aiohttp.ClientTimeout(total=timeout)) \
+                as response:
+            response.raise_for_status()
+            if read_body is not None:
+                return await read_body(response)
+            return await process_response(response, read_format=read_format)
+
+    key = cache.key(url_str, header=header, read_format=read_format)
+    entry = cache.lookup(key)
+    if entry and entry.is_fresh(cache.ttl):
+        body = cache.read(entry)
+        if body is not None:
+            return decode_body(body, read_format=read_format)
+        entry = None
+
+    conditional_header = {**header, **entry.conditional_headers} if entry else header
+    async with session.get(url_str,
+                           headers=conditional_header,
+                           timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if entry and response.status == 304:
+            body = cache.read(entry,
+                              revalidated=True,
+                              etag=response.headers.get("ETag"),
+                              last_modified=response.headers.get("Last-Modified"))
+            if body is not None:
+                return decode_body(body, read_format=read_format)
+        else:
+            response.raise_for_status()
+            body = await response.read()
+
+    if body is None:
+        # the body was evicted while it was revalidated: download it again
+        async with session.get(url_str,
+                               headers=header,
+                               timeout=aiohttp.ClientTimeout(total=timeout)) \
+                as response:
+            response.raise_for_status()
+            body = await response.read()
+
+    cache.store(key,
+                url_str,
+                body,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"))
+    return decode_body(body, read_format=read_format)
+
+
+def read_fresh_from_cache(cache: Optional[ResponseCache],
+                          url_str: str,
+                          header: Optional[dict] = None,
+                          read_format: str = "text") -> Union[None, bytes, dict, list]:
+    """Return the cached body of the URL if fresh, without any request."""
+    if cache is None:
+        return None
+    entry = cache.lookup(cache.key(url_str, header=header, read_format=read_format))
+    if entry and entry.is_fresh(cache.ttl):
+        body = cache.read(entry)
+        if body is not None:
+            return decode_body(body, read_format=read_format)
+    return None
+
+
+async def throttled_fetch(throttle: Throttle,
+                          session: aiohttp.ClientSession,
+                          url_str: str,
+                          header: Optional[dict] = None,
+                          read_format: str = "text",
+                          timeout: int = 10,
+                          cache: Optional[ResponseCache] = None,
+                          read_body: Optional[ReadBodyFn] = None) \
+        -> Union[bytes, dict, list]:
+    """Perform a single request within a slot of the throttle, and report to the
+    throttle its status and latency."""
+    if read_body is None:
+        cached = read_fresh_from_cache(cache, url_str, header=header,
+                                       read_format=read_format)
+        if cached is not None:
+            return cached
+
+    async with throttle.slot(url_str):
+        t0 = perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url_str,
-                                       headers=header,
-                                       timeout=timeout) as response:
-                    response.raise_for_status()
-                    return await process_response(response, read_format=read_format)
-        except (asyncio.TimeoutError, ClientResponseError) as e:
-            if isinstance(e, ClientResponseError) and e.status == 404:
-                msg = f"Error {e}"
-                if logger:
-                    logger.warning(msg)
-                else:
-                    print(msg)
-                raise e
-                return None
-            retries += 1
-            sleep_time = 12*retries
-            if retries == max_retries:
-                raise e
-            msg = f"Retrying request to {url_str} (attempt {retries}/{max_retries}) sleeping for {sleep_time} s" 
-            if logger:
-                logger.warning(msg)
-            else:
-                print(msg)
-            await asyncio.sleep(sleep_time)
-        except Exception as e:
-            msg = f"Could not request {url_str} because of {e}"
-            if logger:
-                logger.warning(msg)
-            else:
-                print(msg)
+            result = await fetch(session,
+                                 url_str,
+                                 header=header,
+                                 read_format=read_format,
+                                 timeout=timeout,
+                                 cache=cache,
+                                 read_body=read_body)
+        except ClientResponseError as e:
+            retry_after = e.headers.get("Retry-After") if e.headers else None
+            throttle.record(url_str, e.status, perf_counter() - t0,
+                            retry_after=retry_after)
             raise e
+        except asyncio.TimeoutError as e:
+            throttle.record(url_str, None, perf_counter() - t0)
+            raise e
+        throttle.record(url_str, 200, perf_counter() - t0)
+        return result
 
 
-async def process_response(response: aiohttp.ClientResponse, read_format: str = "text") \
+async def _get_response_with_retries(session: aiohttp.ClientSession,
+                                     url_str: str,
+                                     header: dict,
+                                     read_format: str = "text",
+                                     max_retries: int = 5,
+                                     timeout: int = 10,
+                                     logger: Optional[logging.Logger] = None,
+                                     cache: Optional[ResponseCache] = None,
+                                     throttle: Optional[Throttle] = None,
+                                     retry_scheduler: Optional[RetryScheduler] = None,
+                                     read_body: Optional[ReadBodyFn] = None) \
         -> Union[str, dict, list]:
-    method_factory = {"text": lambda x: x.content.read(),
-                      "json": lambda x: x.content.json()}
-    return await method_factory[read_format](response)
+    if retry_scheduler is None:
+        retry_scheduler = RetryScheduler(policies=default_retry_policies(max_retries),
+                                         logger=logger)
+
+    async def attempt():
+        if throttle is not None:
+            return await throttled_fetch(throttle,
+                                         session,
+                                         url_str,
+                                         header=header,
+                                         read_format=read_format,
+                                         timeout=timeout,
+                                         cache=cache,
+                                         read_body=read_body)
+        return await fetch(session,
+                           url_str,
+                           header=header,
+                           read_format=read_format,
+                           timeout=timeout,
+                           cache=cache,
+                           read_body=read_body)
+
+    try:
+        return await retry_scheduler.run(url_str, attempt)
+    except Exception as e:
+        msg = f"Could not request {url_str} because of {e}"
+        if logger:
+            logger.warning(msg)
+        else:
+            print(msg)
+        raise e
+
+
+async def process_response(response: aiohttp.ClientResponse, read_format: str = "text") \
+        -> Union[bytes, dict, list]:
+    return decode_body(await response.read(), read_format=read_format)
+
+
+def decode_body(body: bytes, read_format: str = "text") -> Union[bytes, dict, list]:
+    method_factory = {"text": lambda x: x,
+                      "json": json_loads}
+    return method_factory[read_format](body)
 
 
 def add_limiter(limiter: AsyncLimiter):
@@ -87,16 +291,42 @@ def add_semaphore(semaphore: Semaphore):
 async def get_soup(url: str,
                    header: Optional[dict[str]] = None,
                    parse_only: Optional[list[str]] = None,
-                   logger: Optional[logging.Logger] = None) -> BeautifulSoup:
-    response = await get_response(url, header=header, logger=logger)
+                   logger: Optional[logging.Logger] = None,
+                   session: Optional[aiohttp.ClientSession] = None,
+                   cache: Optional[ResponseCache] = None,
+                   throttle: Optional[Throttle] = None,
+                   retry_scheduler: Optional[RetryScheduler] = None) -> BeautifulSoup:
+    response = await get_response(url, header=header, logger=logger, session=session,
+                                  cache=cache, throttle=throttle,
+                                  retry_scheduler=retry_scheduler)
     if response:
         return BeautifulSoup(response, "lxml", parse_only=parse_only)
 
 
+async def get_document(url: str,
+                       header: Optional[dict[str]] = None,
+                       parser: str = DEFAULT_PARSER,
+                       parse_only: Optional[SoupStrainer] = None,
+                       logger: Optional[logging.Logger] = None,
+                       session: Optional[aiohttp.ClientSession] = None,
+                       cache: Optional[ResponseCache] = None,
+                       throttle: Optional[Throttle] = None,
+                       retry_scheduler: Optional[RetryScheduler] = None) -> Node:
+    """Like `get_soup`, but parsed with one of the backends in `parsers.PARSERS`."""
+    response = await get_response(url, header=header, logger=logger, session=session,
+                                  cache=cache, throttle=throttle,
+                                  retry_scheduler=retry_scheduler)
+    if response:
+        return parse_html(response, parser=parser, parse_only=parse_only)
+
+
 async def get_json(url: str,
                    header: Optional[dict[str]] = None,
-                   logger: Optional[logging.Logger] = None) -> BeautifulSoup:
-    return await get_response(url, header=header, logger=logger, read_format='json')
+                   logger: Optional[logging.Logger] = None,
+                   session: Optional[aiohttp.ClientSession] = None,
+                   cache: Optional[ResponseCache] = None) -> BeautifulSoup:
+    return await get_response(url, header=header, logger=logger, read_format='json',
+                              session=session, cache=cache)
 
 
 # def get_response_synch(url_str: str, header: dict) -> requests.Response:
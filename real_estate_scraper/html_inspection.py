@@ -7,7 +7,10 @@ from bs4 import BeautifulSoup
 from pipe import traverse
 
 from real_estate_scraper.configuration import ItemContent
-from real_estate_scraper.html_handling import get_soup, add_limiter, add_semaphore
+from real_estate_scraper.html_handling import get_soup, add_limiter, add_semaphore, \
+    create_session
+from real_estate_scraper.matchers import find_dd_after_dt
+from real_estate_scraper.parsers import Node, as_node
 from real_estate_scraper.parsing import str_from_tag
 from real_estate_scraper.utils import camelcase
 
@@ -20,8 +23,8 @@ semaphore = Semaphore(value=MAX_ACTIVE_REQUESTS)
 
 @add_limiter(limiter)
 @add_semaphore(semaphore)
-async def fetch_soup(url, header):
-    return await get_soup(url, header=header)
+async def fetch_soup(url, header, session=None):
+    return await get_soup(url, header=header, session=session)
 
 
 def get_soups(urls: Union[str, list[str]],
@@ -30,29 +33,32 @@ def get_soups(urls: Union[str, list[str]],
         urls = [urls]
 
     async def fetch_all():
-        return await asyncio.gather(*(fetch_soup(url, header=header) for url in urls))
+        async with create_session(max_connections_per_host=MAX_ACTIVE_REQUESTS) \
+                as session:
+            return await asyncio.gather(*(fetch_soup(url, header=header,
+                                                     session=session)
+                                          for url in urls))
 
     return asyncio.run(fetch_all())
 
 
 def get_dd_text_from_dt_name(soup, text_in_website):
-    dt = soup.find(
-        lambda tag: tag.name == "dt" and text_in_website.lower() in tag.text.lower()
-    )
-    if dt:
-        return ','.join(list(dt.find_next("dd").stripped_strings))
+    dd = find_dd_after_dt(soup, text_in_website)
+    if dd:
+        return ','.join(dd.strings())
     else:
         return None
 
 
-def extract_all_dt(soup: BeautifulSoup) -> Optional[list[dict[str, str]]]:
-    dt_list = soup.find_all("dt")
+def extract_all_dt(soup: Union[Node, BeautifulSoup]) -> Optional[list[dict[str, str]]]:
+    dt_list = as_node(soup).select("dt")
     if dt_list:
         return [str_from_tag(dt) for dt in dt_list]
     return None
 
 
-def extract_all_dd_text(soup: BeautifulSoup, dt_names: list[str]):
+def extract_all_dd_text(soup: Union[Node, BeautifulSoup], dt_names: list[str]):
+    soup = as_node(soup)
     items = {}
     for dt_name in dt_names:
         items[dt_name] = get_dd_text_from_dt_name(soup, dt_name)
@@ -0,0 +1,243 @@
+import hashlib
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+# relative to the working directory when the cache is created
+DEFAULT_CACHE_FOLDER = "http_cache"
+INDEX_FILENAME = "index.db"
+BODIES_FOLDER = "bodies"
+
+# headers that change the representation returned by the server
+KEY_HEADERS = ("accept", "accept-language", "x-requested-with")
+# seconds between two evictions of the expired entries
+EXPIRY_CHECK_INTERVAL = 600
+# access times kept in memory before they are written to the index
+ACCESS_FLUSH_SIZE = 100
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """Metadata of a response stored in the cache."""
+
+    key: str
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    size: int
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    @property
+    def conditional_headers(self) -> dict[str, str]:
+        """Headers turning a request into a conditional one for this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """A persistent on-disk cache of HTTP response bodies.
+
+    Bodies are stored as files named after the hash of the URL and of the headers
+    affecting the response, while their metadata is kept in a SQLite index.
+    Entries younger than `ttl` are served without contacting the server; older
+    ones are revalidated with a conditional request using their ETag and
+    Last-Modified validators. Entries not stored or revalidated for `max_age`
+    seconds are evicted, at most every EXPIRY_CHECK_INTERVAL seconds, as are the
+    least recently used ones as soon as the cache grows beyond `max_size` bytes.
+    The access times of the entries read are written to the index in batches of
+    ACCESS_FLUSH_SIZE, before any eviction and when the cache is closed.
+
+    Args:
+        folder (str, Path, optional): Folder storing the cache. Defaults to
+        DEFAULT_CACHE_FOLDER in the working directory.
+        ttl (float, optional): Seconds an entry is served without revalidation.
+        Defaults to one day.
+        max_age (float, optional): Seconds after which an entry is evicted.
+        Defaults to 30 days.
+        max_size (int, optional): Maximum size of the stored bodies in bytes.
+        Defaults to 2 GB.
+    """
+
+    def __init__(self,
+                 folder: Union[str, Path, None] = None,
+                 ttl: float = 24 * 3600,
+                 max_age: float = 30 * 24 * 3600,
+                 max_size: int = 2 * 1024 ** 3):
+        self.folder = Path(folder) if folder is not None \
+            else Path.cwd() / DEFAULT_CACHE_FOLDER
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_size = max_size
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._next_expiry_check = 0.0
+        self._accessed: dict[str, float] = {}
+
+        (self.folder / BODIES_FOLDER).mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.folder / INDEX_FILENAME)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                           "key TEXT PRIMARY KEY, "
+                           "url TEXT, "
+                           "etag TEXT, "
+                           "last_modified TEXT, "
+                           "stored_at REAL, "
+                           "accessed_at REAL, "
+                           "size INTEGER)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at "
+                           "ON entries (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_stored_at "
+                           "ON entries (stored_at)")
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def close(self):
+        self._flush_accessed()
+        self._conn.commit()
+        self._conn.close()
+
+    @staticmethod
+    def key(url: str, header: Optional[dict] = None, read_format: str = "text") -> str:
+        header = {name.lower(): value for name, value in (header or {}).items()}
+        parts = [url, read_format] + [f"{name}:{header.get(name, '')}" for name in
+                                      KEY_HEADERS]
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        row = self._conn.execute("SELECT key, url, etag, last_modified, stored_at, "
+                                 "size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(*row)
+        if not self._body_path(key).is_file():
+            self._delete(key, entry.size)
+            self._conn.commit()
+            return None
+        return entry
+
+    def read(self,
+             entry: CacheEntry,
+             revalidated: bool = False,
+             etag: Optional[str] = None,
+             last_modified: Optional[str] = None) -> Optional[bytes]:
+        """Read the body of an entry, counting it as a cache hit.
+
+        If the entry was revalidated, the validators sent with the 304 response
+        replace the stored ones.
+
+        Returns:
+            Optional[bytes]: The body, or None if its file was deleted since the
+            entry was looked up, in which case the entry is dropped.
+        """
+        try:
+            body = self._body_path(entry.key).read_bytes()
+        except FileNotFoundError:
+            self._delete(entry.key, entry.size)
+            self._conn.commit()
+            return None
+
+        now = time.time()
+        if revalidated:
+            self.revalidated += 1
+            self._conn.execute("UPDATE entries SET stored_at = ?, accessed_at = ?, "
+                               "etag = COALESCE(?, etag), "
+                               "last_modified = COALESCE(?, last_modified) "
+                               "WHERE key = ?",
+                               (now, now, etag, last_modified, entry.key))
+            self._conn.commit()
+        else:
+            self._accessed[entry.key] = now
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                self._flush_accessed()
+                self._conn.commit()
+        self.hits += 1
+        return body
+
+    def store(self,
+              key: str,
+              url: str,
+              body: bytes,
+              etag: Optional[str] = None,
+              last_modified: Optional[str] = None):
+        """Store a freshly downloaded body, counting it as a cache miss."""
+        self.misses += 1
+        previous = self._conn.execute("SELECT size FROM entries WHERE key = ?",
+                                      (key,)).fetchone()
+        if previous:
+            self._size -= previous[0]
+
+        path = self._body_path(key)
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(body)
+
+        now = time.time()
+        self._accessed.pop(key, None)
+        self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (key, url, etag, last_modified, now, now, len(body)))
+        self._size += len(body)
+        if self._size > self.max_size or now >= self._next_expiry_check:
+            self.evict()
+        else:
+            self._conn.commit()
+
+    def evict(self):
+        """Evict expired entries, then least recently used ones above max_size."""
+        self._flush_accessed()
+        now = time.time()
+        self._next_expiry_check = now + EXPIRY_CHECK_INTERVAL
+        expired = self._conn.execute("SELECT key, size FROM entries "
+                                     "WHERE stored_at < ?",
+                                     (now - self.max_age,)).fetchall()
+        for key, size in expired:
+            self._delete(key, size)
+
+        if self._size > self.max_size:
+            lru = self._conn.execute("SELECT key, size FROM entries "
+                                     "ORDER BY accessed_at")
+            for key, size in lru.fetchall():
+                if self._size <= self.max_size:
+                    break
+                self._delete(key, size)
+        self._conn.commit()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "revalidated": self.revalidated,
+                "misses": self.misses}
+
+    def stats_message(self) -> str:
+        requests = self.hits + self.misses
+        hit_rate = round(100 * self.hits / requests, 1) if requests else 0.0
+        return (f"HTTP cache: {self.hits} hits ({self.revalidated} revalidated), "
+                f"{self.misses} misses, hit rate {hit_rate}%")
+
+    def _flush_accessed(self):
+        self._conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?",
+                               [(accessed_at, key) for key, accessed_at in
+                                self._accessed.items()])
+        self._accessed.clear()
+
+    def _delete(self, key: str, size: int):
+        self._body_path(key).unlink(missing_ok=True)
+        self._accessed.pop(key, None)
+        self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._size -= size
+
+    def _body_path(self, key: str) -> Path:
+        return self.folder / BODIES_FOLDER / key[:2] / key
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Union, Iterable, AsyncIterator
+
+from real_estate_scraper.configuration import House
+from real_estate_scraper.pipeline import ShallowPage
+from real_estate_scraper.save import SEARCH_CITY_COLUMN
+from real_estate_scraper.utils import get_timestamp
+
+
+# columns describing where the listing was found rather than the listing: a
+# listing moving to another results page is unchanged
+CRAWL_COLUMNS = ("url_shallow", SEARCH_CITY_COLUMN)
+
+
+def fingerprint(house: House, items: Optional[Iterable[str]] = None) -> str:
+    """Hash of the values of the given items of a listing.
+
+    If items is None, all the items of the listing except the timestamps and the
+    CRAWL_COLUMNS are used.
+    """
+    if items is None:
+        items = sorted(item for item in house if not item.startswith("TimeStamp")
+                       and item not in CRAWL_COLUMNS)
+    values = json.dumps([house.get(item) for item in items], default=str)
+    return hashlib.sha1(values.encode()).hexdigest()
+
+
+class ListingStateStore:
+    """The last known state of every listing, to re-crawl only what changed.
+
+    For every listing scraped deep, the store keeps the fingerprint of its shallow
+    items and its deep items. When a listing shows up again on a results page with
+    the same fingerprint, its deep items are carried forward from the store instead
+    of requesting its deep page again. The listings found on the results pages of
+    any crawl, shallow or deep, are recorded as known, see `KnownPagesStop`.
+
+    Args:
+        path (str, Path): Path of the SQLite file, created if it does not exist.
+        fingerprint_items (list[str], optional): The shallow items whose change
+        triggers a new deep request, for example HouseId, href, Price and
+        LivingArea. If None, all the shallow items, but not the results page
+        the listing was found on. Defaults to None.
+    """
+
+    def __init__(self, path: Union[str, Path],
+                 fingerprint_items: Optional[list[str]] = None):
+        self.path = Path(path)
+        self.fingerprint_items = fingerprint_items
+        self.unchanged = 0
+        self.changed = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS listing_state ("
+                               "href TEXT PRIMARY KEY, fingerprint TEXT, "
+                               "deep TEXT, last_seen TEXT)")
+
+    def close(self):
+        self._conn.close()
+
+    def carry_forward(self, house: House) -> Optional[House]:
+        """Deep items of the listing if its shallow items are unchanged, else None."""
+        with self._lock:
+            row = self._conn.execute("SELECT fingerprint, deep FROM listing_state "
+                                     "WHERE href = ?", (house.get("href"),)).fetchone()
+        if row is None or row[0] != fingerprint(house, self.fingerprint_items):
+            self.changed += 1
+            return None
+
+        self.unchanged += 1
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE listing_state SET last_seen = ? WHERE href = ?",
+                               (get_timestamp(), house.get("href")))
+        return json.loads(row[1])
+
+    def record_seen(self, houses: Iterable[House]):
+        """Record the listings found on a results page as known.
+
+        The listings that are new to the store have no fingerprint until they are
+        scraped deep, so their deep items are not carried forward.
+        """
+        timestamp = get_timestamp()
+        rows = [(house["href"], timestamp) for house in houses if house.get("href")]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO listing_state "
+                                   "(href, last_seen) VALUES (?, ?)", rows)
+            self._conn.executemany("UPDATE listing_state SET last_seen = ? "
+                                   "WHERE href = ?",
+                                   [(timestamp, href) for href, _ in rows])
+
+    def known_hrefs(self) -> set[str]:
+        """The hrefs of all the listings in the store."""
+        with self._lock:
+            rows = self._conn.execute("SELECT href FROM listing_state").fetchall()
+        return {href for href, in rows}
+
+    def update(self, house: House, house_deep: House):
+        """Store the state of a listing just scraped deep."""
+        if not house.get("href"):
+            return
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO listing_state VALUES (?, ?, ?, ?)",
+                               (house["href"],
+                                fingerprint(house, self.fingerprint_items),
+                                json.dumps(house_deep),
+                                get_timestamp()))
+
+    def stats_message(self) -> str:
+        return (f"Incremental crawl: {self.unchanged} unchanged listings carried "
+                f"forward, {self.changed} new or changed listings scraped deep")
+
+
+class KnownPagesStop:
+    """Stops the pagination of a city once its results pages show only known listings.
+
+    With results sorted by date, the newest listings come first: once a run of
+    consecutive pages of a city contains only listings seen in a previous crawl,
+    the following pages contain only older listings, which are skipped.
+
+    The pages of a city are requested at most pages_in_flight at a time, see
+    `in_flight`, so that only a few pages past the stop are requested whatever
+    the number of workers of the crawl.
+
+    Args:
+        seen (set[str]): The hrefs of the listings seen in a previous crawl.
+        consecutive_pages (int, optional): Number of consecutive pages with only
+        known listings after which the pagination of a city stops. Defaults to 1.
+        pages_in_flight (int, optional): Maximum number of pages of a city
+        requested at the same time. Defaults to PAGES_IN_FLIGHT.
+    """
+
+    PAGES_IN_FLIGHT = 4
+
+    def __init__(self, seen: set[str], consecutive_pages: int = 1,
+                 pages_in_flight: int = PAGES_IN_FLIGHT):
+        self.seen = seen
+        self.consecutive_pages = consecutive_pages
+        self.pages_in_flight = pages_in_flight
+        self.pages_skipped = 0
+        self._known_pages: dict[Optional[str], set[int]] = defaultdict(set)
+        self._last_page: dict[Optional[str], int] = {}
+        self._city_slots: dict[Optional[str], asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def in_flight(self, page: ShallowPage) -> AsyncIterator[None]:
+        """Wait until the page can be requested, among the pages of its city."""
+        slots = self._city_slots.get(page.city)
+        if slots is None:
+            slots = self._city_slots[page.city] = asyncio.Semaphore(
+                self.pages_in_flight)
+        async with slots:
+            yield
+
+    def is_exhausted(self, page: ShallowPage) -> bool:
+        """True if the page comes after a run of pages with only known listings."""
+        last_page = self._last_page.get(page.city)
+        if last_page is not None and page.page > last_page:
+            self.pages_skipped += 1
+            return True
+        return False
+
+    def record(self, page: ShallowPage, houses: list[House]) -> bool:
+        """Record the listings of a page.
+
+        Returns:
+            bool: True if the pagination of the city stops because of this page.
+        """
+        if not houses or any(house.get("href") not in self.seen for house in houses):
+            return False
+
+        known_pages = self._known_pages[page.city]
+        known_pages.add(page.page)
+        first = page.page
+        while first - 1 in known_pages:
+            first -= 1
+        last = page.page
+        while last + 1 in known_pages:
+            last += 1
+        if last - first + 1 < self.consecutive_pages:
+            return False
+
+        last_page = first + self.consecutive_pages - 1
+        previous = self._last_page.get(page.city)
+        self._last_page[page.city] = last_page if previous is None \
+            else min(previous, last_page)
+        return previous is None
@@ -0,0 +1,218 @@
+import re
+from dataclasses import dataclass, field
+from typing import Optional, Union, Any
+
+from bs4 import BeautifulSoup
+
+from real_estate_scraper.parsers import Node, as_node
+from real_estate_scraper.parsing import extract_numeric_value, json_loads
+
+TEXT_MODES = ("all", "first")
+
+
+class DtDdIndex:
+    """The dd following each dt of a page, by lowercase dt text, built in one pass.
+
+    Looking up a text returns the dd of the first dt containing it, as a search of
+    the dt over the whole page would, but without scanning the page again for every
+    item.
+    """
+
+    def __init__(self, soup: Node):
+        self.entries: list[tuple[str, Node]] = []
+        pending_labels = []
+        for tag in soup.select("dt, dd"):
+            if tag.name == "dt":
+                pending_labels.append(tag.text(strip=False).lower())
+            elif pending_labels:
+                self.entries.extend((label, tag) for label in pending_labels)
+                pending_labels = []
+
+    def lookup(self, text_in_website: str) -> Optional[Node]:
+        text_in_website = text_in_website.lower()
+        for label, dd in self.entries:
+            if text_in_website in label:
+                return dd
+        return None
+
+
+def find_dd_after_dt(soup: Union[Node, BeautifulSoup],
+                     text_in_website: str) -> Optional[Node]:
+    """The first dd following the first dt whose text contains text_in_website."""
+    return as_node(soup).memo(DtDdIndex, DtDdIndex).lookup(text_in_website)
+
+
+def prefix(value: str, text: str) -> str:
+    return text + value
+
+
+def number(value: str, decimal_delimiter: str = ".",
+           thousands_delimiter: str = ",") -> Optional[float]:
+    return extract_numeric_value(value, decimal_delimiter=decimal_delimiter,
+                                 thousands_delimiter=thousands_delimiter)
+
+
+def max_int(value: str) -> Optional[int]:
+    numbers = [int(match) for match in re.findall(r"\d+", value.replace(",", ""))]
+    return max(numbers) if numbers else None
+
+
+def regex(value: str, pattern: str) -> Optional[str]:
+    match = re.search(pattern, value)
+    if match is None:
+        return None
+    return match.group(1) if match.groups() else match.group()
+
+
+POST_PROCESSORS = {
+    "int": int,
+    "float": float,
+    "strip": str.strip,
+    "prefix": prefix,
+    "number": number,
+    "max_int": max_int,
+    "regex": regex,
+}
+
+
+def _parse_json_path(json_path: str) -> tuple[Union[str, int], ...]:
+    return tuple(int(key) if re.fullmatch(r"-?\d+", key) else key
+                 for key in json_path.split("."))
+
+
+def _parse_post(post: list) -> tuple[tuple[str, tuple], ...]:
+    steps = []
+    for step in post:
+        name, *args = [step] if isinstance(step, str) else step
+        steps.append((name, tuple(args)))
+    return tuple(steps)
+
+
+@dataclass(frozen=True)
+class Matcher:
+    """A retrieve function compiled from a declarative selector of a JSON config.
+
+    The selector locates an element of the page, picks a value from it and passes
+    the value through post-processors, e.g. in the "selector" of an item:
+
+        {"css": "a.result", "attr": "href", "post": [["prefix", "https://a.nl"]]}
+
+    Selectors are compiled once when the configuration is loaded, and the matchers
+    only use the `Node` interface, so they run on any parser backend (XPath requires
+    lxml). They are plain data, so they can be pickled like an `Extractor`.
+
+    Args:
+        css (str, optional): CSS selector of the element.
+        xpath (str, optional): XPath expression of the element, alternative to css.
+        dt (str, optional): Text of the dt whose dd is the element, alternative to
+        css. True stands for the text_in_website of the item.
+        all (bool, optional): Return all the matching elements, e.g. the listings of
+        a results page. Defaults to False.
+        index (int, optional): Index of the element among the matching ones.
+        Defaults to 0.
+        attr (str, optional): Return the value of this attribute of the element.
+        json_path (str, optional): Decode the text of the element as JSON, once per
+        page, and return the value at this dot-separated path, e.g.
+        "props.items.0.price".
+        text (str, optional): "all" for the whole text of the element, "first" for
+        its first string. Defaults to "all".
+        separator (str, optional): Separator of the strings of the text. Defaults
+        to "".
+        post (list, optional): Post-processors applied in order, names of
+        `POST_PROCESSORS` or lists of a name and its extra arguments.
+        default (optional): Value returned if nothing is found. Defaults to None.
+    """
+
+    css: Optional[str] = None
+    xpath: Optional[str] = None
+    dt: Optional[str] = None
+    all: bool = False
+    index: int = 0
+    attr: Optional[str] = None
+    json_path: Optional[tuple[Union[str, int], ...]] = None
+    text: str = "all"
+    separator: str = ""
+    post: tuple[tuple[str, tuple], ...] = field(default_factory=tuple)
+    default: Any = None
+
+    def __post_init__(self):
+        self.validate()
+
+    @classmethod
+    def compile(cls, selector: dict, text_in_website: Optional[str] = None) \
+            -> "Matcher":
+        """Compile the selector of an item of a JSON config."""
+        unknown = set(selector) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise TypeError(f"{sorted(unknown)} are not valid selector keys. "
+                            f"Allowed keys: {list(cls.__dataclass_fields__)}")
+        selector = dict(selector)
+        if selector.get("dt") is True:
+            selector["dt"] = text_in_website
+        if selector.get("json_path") is not None:
+            selector["json_path"] = _parse_json_path(selector["json_path"])
+        selector["post"] = _parse_post(selector.get("post", []))
+        return cls(**selector)
+
+    def validate(self):
+        locators = [key for key in ("css", "xpath", "dt") if getattr(self, key)]
+        if len(locators) > 1:
+            raise TypeError(f"A selector has one of css, xpath and dt, not {locators}")
+        if self.json_path is not None and not locators:
+            raise TypeError("A json_path requires the css or xpath of its element")
+        if self.text not in TEXT_MODES:
+            raise TypeError(f"{self.text} is not a valid text. "
+                            f"Allowed texts: {list(TEXT_MODES)}")
+        for name, _ in self.post:
+            if name not in POST_PROCESSORS:
+                raise TypeError(f"{name} is not a valid post-processor. "
+                                f"Allowed post-processors: {list(POST_PROCESSORS)}")
+
+    def __call__(self, soup: Node):
+        soup = as_node(soup)
+        if self.dt:
+            dd = find_dd_after_dt(soup, self.dt)
+            elements = [dd] if dd is not None else []
+        elif self.css:
+            elements = soup.select(self.css)
+        elif self.xpath:
+            elements = soup.xpath(self.xpath)
+        else:
+            elements = [soup]
+        if self.all:
+            return elements
+
+        try:
+            element = elements[self.index]
+        except IndexError:
+            return self.default
+        value = self._value(soup, element)
+        for name, args in self.post:
+            if value is None:
+                break
+            value = POST_PROCESSORS[name](value, *args)
+        return self.default if value is None else value
+
+    def _value(self, soup: Node, element: Union[Node, str]) -> Any:
+        if isinstance(element, str):
+            return element
+        if self.attr:
+            return element.attr(self.attr)
+        if self.json_path is not None:
+            data = soup.memo(("json", self.css or self.xpath, self.index),
+                             lambda _: self._decode(element))
+            for key in self.json_path:
+                try:
+                    data = data[key]
+                except (KeyError, IndexError, TypeError):
+                    return None
+            return data
+        if self.text == "first":
+            strings = element.strings()
+            return strings[0] if strings else None
+        return element.text(separator=self.separator)
+
+    @staticmethod
+    def _decode(element: Node) -> Any:
+        text = element.text(strip=False)
+        return json_loads(text) if text.strip() else None
@@ -0,0 +1,144 @@
+from typing import Iterable
+
+import pandas as pd
+
+from real_estate_scraper.configuration import ScraperConfig, NamedHouseItems, Item
+
+# The same patterns as the per-string functions of parsing.py
+NUMBER_PATTERN = r"(?<![^\s])(\d+(?:\.\d+)?)(?![^\s])"
+ROOMS_PATTERN = r"(\d+) room[s]?(?: \((\d+) bedroom[s]?\))?"
+DUTCH_POSTCODE_PATTERN = r"(\d\d\d\d)(?:\s([A-Z]{2}))?\s([^\d]{2,})"
+
+
+def _as_text(series: pd.Series) -> pd.Series:
+    return series.astype("string")
+
+
+def numeric_series(series: pd.Series,
+                   decimal_delimiter: str = ".",
+                   thousands_delimiter: str = ",") -> pd.Series:
+    """Vectorized `parsing.extract_numeric_value` over a column, as float64.
+
+    Columns that are already numeric, like coordinates read from JSON, are only
+    cast.
+    """
+    if decimal_delimiter == thousands_delimiter:
+        raise ValueError("Decimal and group delimiters cannot be the same")
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype("float64")
+
+    text = (_as_text(series)
+            .str.replace(thousands_delimiter, "", regex=False)
+            .str.replace(decimal_delimiter, ".", regex=False))
+    number = text.str.extract(NUMBER_PATTERN, expand=False)
+    return pd.to_numeric(number, errors="coerce").astype("float64")
+
+
+def integer_series(series: pd.Series,
+                   decimal_delimiter: str = ".",
+                   thousands_delimiter: str = ",") -> pd.Series:
+    """Like `numeric_series`, as nullable Int64. Non-integral values become NA."""
+    values = numeric_series(series, decimal_delimiter, thousands_delimiter)
+    return values.where(values % 1 == 0).astype("Int64")
+
+
+def category_series(series: pd.Series) -> pd.Series:
+    """Stripped text as a category, for items with few distinct values."""
+    text = _as_text(series).str.strip()
+    return text.where(text != "").astype("category")
+
+
+def rooms_and_bedrooms(series: pd.Series) -> pd.DataFrame:
+    """Vectorized `parsing.extract_rooms_and_bedrooms` over a column.
+
+    Returns:
+        pd.DataFrame: The float64 columns Rooms and Bedrooms.
+    """
+    extracted = _as_text(series).str.extract(ROOMS_PATTERN)
+    extracted.columns = ["Rooms", "Bedrooms"]
+    return extracted.apply(pd.to_numeric, errors="coerce").astype("float64")
+
+
+def dutch_postcode_and_city(series: pd.Series) -> pd.DataFrame:
+    """Vectorized `parsing.extract_dutch_postcode_and_city` over a column.
+
+    Returns:
+        pd.DataFrame: The columns PostCodeDigits, PostCodeLetters and City.
+    """
+    extracted = _as_text(series).str.extract(DUTCH_POSTCODE_PATTERN)
+    extracted.columns = ["PostCodeDigits", "PostCodeLetters", "City"]
+    return extracted
+
+
+# Text items holding several values: the function splitting them and the type of
+# each of the columns it adds, as the type of an item
+SPLIT_ITEMS = {
+    "RoomsDeep": (rooms_and_bedrooms, {"Bedrooms": "integer"}),
+    "PostCode": (dutch_postcode_and_city, {"PostCodeDigits": "text",
+                                           "PostCodeLetters": "text",
+                                           "City": "category"}),
+}
+
+
+def config_items(config: ScraperConfig) -> Iterable[Item]:
+    """The shallow and deep items of a configuration."""
+    for items in (config.house_items_shallow, config.house_items_deep):
+        if isinstance(items, NamedHouseItems):
+            yield from items
+
+
+def split_columns(config: ScraperConfig) -> dict[str, str]:
+    """The columns split from the text items of a configuration, with their types.
+
+    The columns named as an item of the configuration are not split, the item is
+    kept.
+    """
+    items = {item.name: item.type for item in config_items(config)}
+    columns = {}
+    for name, (_, types) in SPLIT_ITEMS.items():
+        if items.get(name) == "text":
+            columns.update({column: column_type for column, column_type in types.items()
+                            if column not in items})
+    return columns
+
+
+def normalize_dataframe(df: pd.DataFrame, config: ScraperConfig) -> pd.DataFrame:
+    """Convert the scraped columns to the types of their items.
+
+    Every column is converted at once with pandas string operations: "numeric"
+    items become float64, "integer" items Int64 and "category" items category,
+    parsing numbers with the delimiters of the website. "text" items and the
+    columns that are not items, e.g. the timestamps, are left unchanged. The text
+    items of `SPLIT_ITEMS` are also split into typed columns, e.g. RoomsDeep into
+    Bedrooms and PostCode into PostCodeDigits, PostCodeLetters and City, see
+    `split_columns`.
+
+    Args:
+        df (pd.DataFrame): A batch of scraped listings.
+        config (ScraperConfig): The configuration the listings were scraped with.
+
+    Returns:
+        pd.DataFrame: A copy of df with typed columns.
+    """
+    settings = config.website_settings
+    delimiters = {"decimal_delimiter": settings.decimal_delimiter,
+                  "thousands_delimiter": settings.thousands_delimiter}
+    converters = {
+        "numeric": lambda series: numeric_series(series, **delimiters),
+        "integer": lambda series: integer_series(series, **delimiters),
+        "category": category_series,
+    }
+
+    df = df.copy()
+    columns = split_columns(config)
+    for name, (split, types) in SPLIT_ITEMS.items():
+        added = [column for column in types if column in columns]
+        if name in df.columns and added:
+            parts = split(df[name])
+            for column in added:
+                df[column] = parts[column]
+    types = {item.name: item.type for item in config_items(config)} | columns
+    for name, item_type in types.items():
+        if name in df.columns and item_type in converters:
+            df[name] = converters[item_type](df[name])
+    return df
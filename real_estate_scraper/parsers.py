@@ -0,0 +1,255 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Optional, Union, Callable, Hashable, TypeVar
+
+import lxml.etree
+import lxml.html
+from bs4 import BeautifulSoup
+from bs4.element import Tag, SoupStrainer
+from lxml.cssselect import CSSSelector
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+DEFAULT_PARSER = "beautifulsoup"
+SKIPPED_TEXT_TAGS = ("script", "style", "template")
+
+T = TypeVar("T")
+
+
+class Node(ABC):
+    """An element of a parsed HTML page, independent of the parser backend.
+
+    The extractors of the website configurations only use this interface, so that
+    the same `Item.retrieve` functions run on any backend in `PARSERS`. Text follows
+    BeautifulSoup's conventions: the text of script and style elements is only
+    returned when they are the node itself, and comments are ignored.
+
+    Attributes:
+        native: The element of the backend, e.g. a `bs4.Tag` or an lxml element.
+    """
+
+    __slots__ = ("native", "_memo")
+
+    def __init__(self, native):
+        self.native = native
+        self._memo = None
+
+    def memo(self, key: Hashable, compute: Callable[["Node"], T]) -> T:
+        """Compute a value derived from the node only once, e.g. an index of a page.
+
+        All the items of a page are retrieved from the same node, so they share the
+        values memoized on it.
+        """
+        if self._memo is None:
+            self._memo = {}
+        if key not in self._memo:
+            self._memo[key] = compute(self)
+        return self._memo[key]
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """The tag name of the element."""
+
+    @abstractmethod
+    def select(self, css: str) -> list["Node"]:
+        """The descendants matching a CSS selector, in document order."""
+
+    def select_one(self, css: str) -> Optional["Node"]:
+        """The first descendant matching a CSS selector, if any."""
+        nodes = self.select(css)
+        return nodes[0] if nodes else None
+
+    def xpath(self, expression: str) -> list[Union["Node", str]]:
+        """The result of an XPath expression: nodes, or strings for text and
+        attribute values. Only supported by the lxml backend."""
+        raise NotImplementedError(f"{type(self).__name__} does not support XPath, "
+                                  f"use the lxml parser")
+
+    @abstractmethod
+    def strings(self, strip: bool = True) -> list[str]:
+        """The text fragments of the element. Empty fragments are dropped if strip."""
+
+    def text(self, separator: str = "", strip: bool = True) -> str:
+        """The text of the element, like `bs4.Tag.get_text`."""
+        return separator.join(self.strings(strip=strip))
+
+    @abstractmethod
+    def attr(self, name: str) -> Optional[str]:
+        """The value of an attribute of the element, if it is set."""
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+def _clean_strings(strings, strip: bool) -> list[str]:
+    if not strip:
+        return [string for string in strings if string]
+    return [string for string in (string.strip() for string in strings) if string]
+
+
+class SoupNode(Node):
+    """A `Node` backed by BeautifulSoup."""
+
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self.native.name
+
+    def select(self, css: str) -> list[Node]:
+        return [SoupNode(tag) for tag in self.native.select(css)]
+
+    def select_one(self, css: str) -> Optional[Node]:
+        tag = self.native.select_one(css)
+        return SoupNode(tag) if tag is not None else None
+
+    def strings(self, strip: bool = True) -> list[str]:
+        return _clean_strings(self.native.strings, strip)
+
+    def attr(self, name: str) -> Optional[str]:
+        value = self.native.get(name)
+        if isinstance(value, list):
+            return " ".join(value)
+        return value
+
+
+@lru_cache(maxsize=None)
+def _compile_css(css: str) -> CSSSelector:
+    return CSSSelector(css, translator="html")
+
+
+@lru_cache(maxsize=None)
+def _compile_xpath(expression: str) -> lxml.etree.XPath:
+    return lxml.etree.XPath(expression)
+
+
+class LxmlNode(Node):
+    """A `Node` backed by lxml, with CSS selectors compiled once by cssselect."""
+
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self.native.tag
+
+    def select(self, css: str) -> list[Node]:
+        return [LxmlNode(element) for element in _compile_css(css)(self.native)
+                if element is not self.native]
+
+    def xpath(self, expression: str) -> list[Union[Node, str]]:
+        result = _compile_xpath(expression)(self.native)
+        if not isinstance(result, list):
+            result = [result]
+        return [LxmlNode(value) if isinstance(value, lxml.etree._Element)
+                else str(value) for value in result]
+
+    def strings(self, strip: bool = True) -> list[str]:
+        root = self.native
+        strings = []
+
+        def visit(element):
+            if element is root or (isinstance(element.tag, str)
+                                   and element.tag not in SKIPPED_TEXT_TAGS):
+                if element.text:
+                    strings.append(element.text)
+                for child in element:
+                    visit(child)
+                    if child.tail:
+                        strings.append(child.tail)
+
+        visit(root)
+        return _clean_strings(strings, strip)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.native.get(name)
+
+
+class SelectolaxNode(Node):
+    """A `Node` backed by selectolax (lexbor engine)."""
+
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self.native.tag
+
+    def select(self, css: str) -> list[Node]:
+        # selectolax matches the node itself too, unlike the other backends
+        return [SelectolaxNode(node) for node in self.native.css(css)
+                if node.mem_id != self.native.mem_id]
+
+    def strings(self, strip: bool = True) -> list[str]:
+        root = self.native
+        if root.tag in SKIPPED_TEXT_TAGS:
+            return _clean_strings([root.text(deep=True)], strip)
+        strings = [node.text_content for node in root.traverse(include_text=True)
+                   if node.tag == "-text"
+                   and node.parent.tag not in SKIPPED_TEXT_TAGS]
+        return _clean_strings(strings, strip)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.native.attributes.get(name)
+
+
+def _decode(body: Union[bytes, str]) -> Union[bytes, str]:
+    if isinstance(body, bytes):
+        try:
+            return body.decode("utf-8")
+        except UnicodeDecodeError:
+            return body
+    return body
+
+
+def parse_with_beautifulsoup(body: Union[bytes, str],
+                             parse_only: Optional[SoupStrainer] = None) -> Node:
+    return SoupNode(BeautifulSoup(body, "lxml", parse_only=parse_only))
+
+
+def parse_with_lxml(body: Union[bytes, str],
+                    parse_only: Optional[SoupStrainer] = None) -> Node:
+    return LxmlNode(lxml.html.document_fromstring(_decode(body)))
+
+
+def parse_with_selectolax(body: Union[bytes, str],
+                          parse_only: Optional[SoupStrainer] = None) -> Node:
+    if LexborHTMLParser is None:
+        raise ImportError("The selectolax parser requires the selectolax package: "
+                          "pip install selectolax")
+    return SelectolaxNode(LexborHTMLParser(_decode(body)).root)
+
+
+ParseFn = Callable[[Union[bytes, str], Optional[SoupStrainer]], Node]
+
+PARSERS: dict[str, ParseFn] = {
+    "beautifulsoup": parse_with_beautifulsoup,
+    "lxml": parse_with_lxml,
+    "selectolax": parse_with_selectolax,
+}
+
+
+def parse_html(body: Union[bytes, str],
+               parser: str = DEFAULT_PARSER,
+               parse_only: Optional[SoupStrainer] = None) -> Node:
+    """Parse an HTML page with one of the backends in `PARSERS`.
+
+    Args:
+        body (bytes, str): The HTML page.
+        parser (str, optional): The name of the backend. Defaults to "beautifulsoup".
+        parse_only (SoupStrainer, optional): Parts of the page to parse. Only used
+        by BeautifulSoup, the other backends are fast enough to parse the whole page.
+
+    Returns:
+        Node: The root of the page.
+    """
+    return PARSERS[parser](body, parse_only)
+
+
+def as_node(document: Union[Node, Tag]) -> Node:
+    """Wrap a BeautifulSoup document in a `Node`, leave nodes unchanged."""
+    if isinstance(document, Node):
+        return document
+    return SoupNode(document)
@@ -1,13 +1,23 @@
+import json
 import re
-from typing import Union, Optional, Tuple
+from typing import Union, Optional, Tuple, Any
 
 import pandas as pd
 from bs4.element import Tag
 from unidecode import unidecode
 
+from real_estate_scraper.parsers import Node
 
-def str_from_tag(tag: Tag, strip=True, **kwargs) -> Union[None, str]:
-    """Get the text of a BeautifulSoup tag"""
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def str_from_tag(tag: Union[Node, Tag], strip=True, **kwargs) -> Union[None, str]:
+    """Get the text of a parsed node or of a BeautifulSoup tag"""
+    if isinstance(tag, Node):
+        return tag.text(strip=strip, **kwargs)
     if not isinstance(tag, Tag):
         return tag
 
@@ -18,6 +28,13 @@ def str_from_tag(tag: Tag, strip=True, **kwargs) -> Union[None, str]:
         print(e)
 
 
+def json_loads(text: Union[str, bytes]) -> Any:
+    """Decode JSON with orjson if it is installed, else with the standard library"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
 def extract_numeric_value(string: str,
                           decimal_delimiter: str = ".",
                           thousands_delimiter: str = ",") -> Optional[float]:
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterable, Iterable
+from dataclasses import dataclass
+from typing import Optional, Callable, Awaitable, AsyncIterator, Union
+
+from real_estate_scraper.configuration import House
+
+_DONE = object()
+
+
+@dataclass(frozen=True, slots=True)
+class ShallowPage:
+    """A results page of the search for listings in a city."""
+
+    city: Optional[str]
+    page: int
+
+
+ScrapeShallowFn = Callable[[ShallowPage], Awaitable[list[House]]]
+ScrapeDeepFn = Callable[[House], Awaitable[Optional[House]]]
+
+
+class CrawlPipeline:
+    """A shallow -> deep crawl streamed through bounded queues on one event loop.
+
+    Shallow workers take pages from the frontier and push each parsed listing to
+    the deep queue as soon as its page is parsed, deep workers complete the
+    listings and push the records to the output queue, which `run` yields from.
+    All queues are bounded: a slow consumer blocks the deep workers, which in turn
+    block the shallow workers, so memory stays bounded whatever the crawl size.
+
+    Args:
+        scrape_shallow (Callable): Coroutine function returning the listings
+        found on a shallow page.
+        scrape_deep (Callable, optional): Coroutine function completing a listing
+        with its deep page, or returning None to drop it. If None, the shallow
+        listings are the records.
+        workers (int, optional): Number of shallow and of deep workers. The actual
+        number of active requests is bounded by the scraper throttle, so it
+        should be larger than the throttle concurrency: a worker waiting for the
+        retry of its request holds no throttle slot, but takes no other item
+        either. Defaults to 10.
+        queue_size (int, optional): Maximum number of listings waiting in each
+        queue. Defaults to 100.
+        logger (logging.Logger, optional): A logger for failed pages.
+
+    Attributes:
+        pages_queued (int): Number of shallow pages taken from the frontier so far.
+        pages_done (int): Number of shallow pages whose records were all yielded.
+        records_done (int): Number of records yielded.
+        failed_pages (int): Number of shallow pages that could not be scraped.
+        failed_listings (int): Number of listings whose deep page could not be
+        scraped. They are yielded with their shallow items only.
+    """
+
+    def __init__(self,
+                 scrape_shallow: ScrapeShallowFn,
+                 scrape_deep: Optional[ScrapeDeepFn] = None,
+                 workers: int = 10,
+                 queue_size: int = 100,
+                 logger: Optional[logging.Logger] = None):
+        self.scrape_shallow = scrape_shallow
+        self.scrape_deep = scrape_deep
+        self.workers = workers
+        self.queue_size = queue_size
+        self.logger = logger
+        self.pages_queued = 0
+        self.pages_done = 0
+        self.records_done = 0
+        self.failed_pages = 0
+        self.failed_listings = 0
+
+    async def run(self, pages: Union[Iterable[ShallowPage], AsyncIterable[ShallowPage]]) \
+            -> AsyncIterator[House]:
+        """Yield the records of the pages as soon as each one is completed."""
+        shallow_queue = asyncio.Queue(maxsize=self.workers)
+        deep_queue = asyncio.Queue(maxsize=self.queue_size)
+        output_queue = asyncio.Queue(maxsize=self.queue_size)
+        # records still to be yielded per dispatched page, keyed by dispatch as
+        # the same page may be queued twice, e.g. for a city listed twice
+        remaining: dict[object, int] = {}
+
+        async def feed():
+            if isinstance(pages, AsyncIterable):
+                async for page in pages:
+                    self.pages_queued += 1
+                    await shallow_queue.put(page)
+            else:
+                for page in pages:
+                    self.pages_queued += 1
+                    await shallow_queue.put(page)
+            for _ in range(self.workers):
+                await shallow_queue.put(None)
+
+        async def shallow_worker():
+            while (page := await shallow_queue.get()) is not None:
+                try:
+                    houses = await self.scrape_shallow(page)
+                except Exception as e:
+                    self.failed_pages += 1
+                    self._log(f"Could not scrape {page} because of {e}")
+                    houses = []
+
+                dispatch = object()
+                remaining[dispatch] = len(houses)
+                if not houses:
+                    await output_queue.put((None, dispatch))
+                for house in houses:
+                    if self.scrape_deep is None:
+                        await output_queue.put((house, dispatch))
+                    else:
+                        await deep_queue.put((house, dispatch))
+
+        async def deep_worker():
+            while (item := await deep_queue.get()) is not None:
+                house, dispatch = item
+                try:
+                    record = await self.scrape_deep(house)
+                except Exception as e:
+                    self.failed_listings += 1
+                    self._log(f"Could not scrape deep {house.get('href')} "
+                              f"because of {e}")
+                    record = house
+                await output_queue.put((record, dispatch))
+
+        async def supervise():
+            try:
+                await asyncio.gather(feed(),
+                                     *(shallow_worker() for _ in range(self.workers)))
+                for _ in deep_workers:
+                    await deep_queue.put(None)
+                await asyncio.gather(*deep_workers)
+                await output_queue.put(_DONE)
+            except Exception as e:
+                await output_queue.put(e)
+                raise
+
+        deep_workers = []
+        if self.scrape_deep is not None:
+            deep_workers = [asyncio.create_task(deep_worker())
+                            for _ in range(self.workers)]
+        supervisor = asyncio.create_task(supervise())
+
+        try:
+            while (item := await output_queue.get()) is not _DONE:
+                if isinstance(item, Exception):
+                    raise item
+                record, dispatch = item
+                # (None, dispatch) stands for an empty page or a dropped listing
+                remaining[dispatch] -= 1
+                if record is not None:
+                    self.records_done += 1
+                    yield record
+                if remaining[dispatch] <= 0:
+                    del remaining[dispatch]
+                    self.pages_done += 1
+        finally:
+            tasks = [supervisor, *deep_workers]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _log(self, msg: str):
+        if self.logger:
+            self.logger.warning(msg)
+        else:
+            print(msg)
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Optional, Callable, Awaitable, TypeVar
+
+from aiohttp import ClientResponseError, ClientConnectionError, ClientPayloadError
+
+from real_estate_scraper.throttling import parse_retry_after
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter.
+
+    Args:
+        max_retries (int, optional): Maximum number of retries. Defaults to 5.
+        base_delay (float, optional): Upper bound in seconds of the delay before
+        the first retry, doubled at every retry. Defaults to 2.
+        max_delay (float, optional): Cap of the delay upper bound. Defaults to 120.
+    """
+
+    max_retries: int = 5
+    base_delay: float = 2.0
+    max_delay: float = 120.0
+
+    def delay(self, retry: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before the given retry (starting from 1).
+
+        A delay requested by the server through Retry-After is always honored.
+        """
+        upper_bound = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        delay = random.uniform(0, upper_bound)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def default_retry_policies(max_retries: int = 5) -> dict[str, Optional[RetryPolicy]]:
+    """Retry policy for each error class, None meaning fail immediately."""
+    return {
+        "not_found": None,
+        "client_error": None,
+        "throttled": RetryPolicy(max_retries=max_retries, base_delay=5,
+                                 max_delay=300),
+        "server_error": RetryPolicy(max_retries=max_retries, base_delay=2,
+                                    max_delay=120),
+        "timeout": RetryPolicy(max_retries=max_retries, base_delay=2, max_delay=60),
+        "connection": RetryPolicy(max_retries=max_retries, base_delay=1,
+                                  max_delay=30),
+        "other": None,
+    }
+
+
+def classify_error(error: BaseException) -> str:
+    """Map an exception raised by a request to its error class."""
+    if isinstance(error, ClientResponseError):
+        if error.status in (404, 410):
+            return "not_found"
+        if error.status == 429:
+            return "throttled"
+        if error.status == 408 or error.status >= 500:
+            return "server_error"
+        return "client_error"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (ClientConnectionError, ClientPayloadError)):
+        return "connection"
+    return "other"
+
+
+class RetryScheduler:
+    """Reschedules failed requests after a backoff chosen by their error class.
+
+    A request waiting for its retry is parked on the event loop timers without
+    holding any throttle slot, so that a few flaky URLs cannot stall the requests
+    that are still healthy.
+
+    Args:
+        policies (dict, optional): Retry policy for each error class returned by
+        `classify_error`. Classes mapped to None (or missing) fail immediately.
+        Defaults to `default_retry_policies()`.
+        logger (logging.Logger, optional): A logger for the retry messages.
+    """
+
+    def __init__(self,
+                 policies: Optional[dict[str, Optional[RetryPolicy]]] = None,
+                 logger: Optional[logging.Logger] = None):
+        self.policies = default_retry_policies() if policies is None else policies
+        self.logger = logger
+        self.retries = 0
+        self.failures = 0
+        self.waiting = 0
+
+    async def run(self, key: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Run the attempt until it succeeds or its retry policy gives up.
+
+        Args:
+            key (str): A name for the request (usually its URL) used in logs.
+            attempt (Callable): Coroutine function performing a single attempt.
+        """
+        retry = 0
+        while True:
+            try:
+                return await attempt()
+            except Exception as e:
+                error_class = classify_error(e)
+                policy = self.policies.get(error_class)
+                if policy is None or retry >= policy.max_retries:
+                    self.failures += 1
+                    raise e
+
+                retry += 1
+                delay = policy.delay(retry, retry_after=self._retry_after(e))
+                self._log(f"Retrying request to {key} after {error_class} error "
+                          f"(attempt {retry}/{policy.max_retries}) in {delay:.1f} s")
+                await self._wait(delay)
+
+    async def _wait(self, delay: float):
+        self.retries += 1
+        self.waiting += 1
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+    @staticmethod
+    def _retry_after(error: BaseException) -> Optional[float]:
+        if isinstance(error, ClientResponseError) and error.headers:
+            return parse_retry_after(error.headers.get("Retry-After"))
+        return None
+
+    def _log(self, msg: str):
+        if self.logger:
+            self.logger.warning(msg)
+        else:
+            print(msg)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"retries": self.retries, "failures": self.failures,
+                "waiting": self.waiting}
@@ -1,23 +1,44 @@
-import asyncio
+import logging
+import queue
 import sqlite3
+import threading
+import uuid
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union, Callable, Any
 
 import pandas as pd
 
+from real_estate_scraper.configuration import ScraperConfig
+from real_estate_scraper.normalization import config_items, split_columns
 from real_estate_scraper.utils import get_timestamp
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
 DOWNLOAD_FOLDER = Path.cwd() / "downloads"
-FILE_EXTENSIONS = [".csv"]
+FILE_EXTENSIONS = [".csv", ".parquet"]
+
+# The columns the scraper adds to the items of the configuration
+RECORD_COLUMNS = ["href", "url_shallow", "TimeStampShallow", "TimeStampDeep"]
+SEARCH_CITY_COLUMN = "SearchCity"
+
+_NOT_LOGGED = object()
 
 
 def generate_name_string(pages: Optional[list] = None,
-                         city: Optional[str] = None,
+                         city: Union[None, str, list[str]] = None,
                          deep: bool = False) -> str:
     """Generate a name string for the scraping results"""
     if isinstance(pages, int):
         pages = [pages]
 
+    if isinstance(city, list):
+        city = city[0] if len(city) == 1 else f"{len(city)}-cities"
+
     deep_str = "deep" if deep else "shallow"
     pages_str = "_".join(map(str, pages)) if pages else "all"
     city_str = city if city else "all"
@@ -27,7 +48,7 @@ def generate_name_string(pages: Optional[list] = None,
 
 
 def generate_filename(pages: Optional[list] = None,
-                      city: Optional[str] = None,
+                      city: Union[None, str, list[str]] = None,
                       deep: bool = False,
                       extension: str = ".csv") -> str:
     """Generate a filename for the scraping results"""
@@ -41,7 +62,7 @@ def generate_filename(pages: Optional[list] = None,
 
 
 def generate_table_name(pages: Optional[list] = None,
-                        city: Optional[str] = None,
+                        city: Union[None, str, list[str]] = None,
                         deep: bool = False,
                         schema: str = 'raw') -> str:
     """Generate a table name for the scraping results"""
@@ -79,17 +100,484 @@ def to_csv(
     )
 
 
-async def df_to_file_async(
-        df: pd.DataFrame, filepath, file_format: str = "csv", **kwargs
-):
-    FORMAT_MAP = {"csv": to_csv}
-    return await asyncio.to_thread(FORMAT_MAP[file_format], df, filepath, **kwargs)
+class SQLiteSink:
+    """Upserts batches of listings into a SQLite table over a single connection.
+
+    The connection is opened once, in WAL mode, and every batch is inserted with
+    one `executemany` in one transaction. Listings are keyed by the key column:
+    a listing scraped again updates its row instead of adding a duplicate. On
+    update, the items that were not retrieved this time (e.g. the deep items of a
+    shallow re-crawl, or of a listing whose deep page failed) keep their previous
+    value. Columns that show up in a later batch, like new deep items, are added
+    to the table. The key, the searched city and the shallow timestamp are indexed.
+
+    The table holds the current state of the listings. The history of the
+    history_items (e.g. Price or Status) is kept in a change log, the
+    `<table_name>_history` table (slowly changing dimension of type 2): a row per
+    listing, item and value, valid from the shallow timestamp of the crawl that
+    first saw the value until that of the crawl that saw it change (NULL while
+    current). Unchanged values add no row, so daily crawls of the same listings
+    only store what changed. An item that disappears from a listing is logged as
+    a NULL value (a tombstone) closing the interval of its last value: a shallow
+    item as soon as the listing is seen without it, a deep item only if the deep
+    page of the listing was scraped (it has a TimeStampDeep), as otherwise the item
+    was merely not retrieved. See `as_of` for the state at a past time.
+
+    Args:
+        path (str, Path): Path of the SQLite file, created if it does not exist.
+        table_name (str, optional): Name of the table. Defaults to "listings".
+        key (str, optional): The column identifying a listing, e.g. href or
+        HouseId. Defaults to "href".
+        history_items (list[str], optional): The items whose changes are logged.
+        Defaults to None.
+        shallow_items (list[str], optional): The items of the results pages, which
+        are retrieved whenever a listing is seen. Defaults to None.
+        logger (logging.Logger, optional): A logger for the skipped listings.
+
+    Attributes:
+        rows_written (int): Number of listings inserted or updated so far.
+        changes_logged (int): Number of values added to the change log so far.
+    """
+
+    INDEXED_COLUMNS = [SEARCH_CITY_COLUMN, "TimeStampShallow"]
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 table_name: str = "listings",
+                 key: str = "href",
+                 history_items: Optional[list[str]] = None,
+                 shallow_items: Optional[list[str]] = None,
+                 logger: Optional[logging.Logger] = None):
+        self.path = Path(path)
+        self.table_name = table_name
+        self.key = key
+        self.history_items = list(history_items or [])
+        self.shallow_items = set(shallow_items or [])
+        self.history_table = f"{table_name}_history"
+        self.logger = logger
+        self.rows_written = 0
+        self.changes_logged = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table_name)} "
+                               f"({_quote(key)} TEXT PRIMARY KEY)")
+            if self.history_items:
+                self._create_history_table()
+        self._columns = self._table_columns()
+        with self._conn:
+            self._create_indexes()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, df: pd.DataFrame):
+        """Upsert a batch of listings."""
+        if self.key not in df.columns:
+            raise ValueError(f"The listings have no {self.key} column to key them by")
+        missing_key = df[self.key].isna()
+        if missing_key.any():
+            self._warn(f"{missing_key.sum()} listings without {self.key} "
+                       f"are not written to {self.table_name}")
+            df = df[~missing_key]
+        if df.empty:
+            return
+
+        columns = list(df.columns)
+        rows = df.astype(object).where(df.notna(), None) \
+            .itertuples(index=False, name=None)
+        with self._conn:
+            self._add_columns(df)
+            self._conn.executemany(self._upsert_statement(columns), rows)
+            if self.history_items:
+                self._log_changes(df)
+        self.rows_written += len(df)
+
+    def as_of(self, timestamp: str, columns: Optional[list[str]] = None) \
+            -> pd.DataFrame:
+        """The history items of the listings as they were at a given time.
+
+        Args:
+            timestamp (str): ISO 8601 timestamp, or date for the state at the start
+            of the day, e.g. "2023-01-31".
+            columns (list[str], optional): Columns of the current state to add, e.g.
+            Address. Defaults to None.
+
+        Returns:
+            pd.DataFrame: A row per listing seen by then, with the key and the
+            history items.
+        """
+        rows = self._conn.execute(
+            f"SELECT {_quote(self.key)}, item, value FROM "
+            f"{_quote(self.history_table)} WHERE valid_from <= ? "
+            f"AND (valid_to IS NULL OR valid_to > ?)", (timestamp, timestamp))
+        history = pd.DataFrame(rows.fetchall(), columns=[self.key, "item", "value"])
+        df = (history.pivot(index=self.key, columns="item", values="value")
+              .reindex(columns=self.history_items)
+              .rename_axis(columns=None)
+              .reset_index())
+        if columns:
+            names = ", ".join(map(_quote, [self.key] + columns))
+            current = pd.read_sql_query(
+                f"SELECT {names} FROM {_quote(self.table_name)}", self._conn)
+            df = df.merge(current, on=self.key, how="left")
+        return df
+
+    def _create_history_table(self):
+        history, key = _quote(self.history_table), _quote(self.key)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {history} ("
+                           f"{key} TEXT, item TEXT, value, "
+                           f"valid_from TEXT, valid_to TEXT)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS "
+                           f"{_quote(self.history_table + '_key')} "
+                           f"ON {history} ({key}, item, valid_to)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS "
+                           f"{_quote(self.history_table + '_valid')} "
+                           f"ON {history} (valid_from, valid_to)")
+
+    def _log_changes(self, df: pd.DataFrame):
+        items = [item for item in self.history_items if item in df.columns]
+        if not items:
+            return
+        now = get_timestamp()
+        if "TimeStampShallow" in df.columns:
+            timestamps = df["TimeStampShallow"].astype(object) \
+                .where(df["TimeStampShallow"].notna(), now)
+        else:
+            timestamps = [now] * len(df)
+        keys = [str(key) for key in df[self.key]]
+        values = df[items].astype(object).where(df[items].notna(), None)
+        current = self._current_values(set(keys), items)
+        if "TimeStampDeep" in df.columns:
+            scraped_deep = df["TimeStampDeep"].notna().tolist()
+        else:
+            scraped_deep = [False] * len(df)
+
+        closed, opened, opened_index = [], [], {}
+        for key, timestamp, deep, row in zip(keys, timestamps, scraped_deep,
+                                             values.itertuples(index=False,
+                                                               name=None)):
+            for item, value in zip(items, row):
+                previous = current.get((key, item), _NOT_LOGGED)
+                # values not retrieved are not changes, as in the upsert, while
+                # values retrieved as missing are removals
+                removed = deep or item in self.shallow_items
+                if value is None and (previous is _NOT_LOGGED or not removed):
+                    continue
+                if value == previous:
+                    continue
+                if (key, item) in opened_index:
+                    # changed twice in the same batch
+                    opened[opened_index[key, item]][4] = timestamp
+                elif previous is not _NOT_LOGGED:
+                    closed.append((timestamp, key, item))
+                opened_index[key, item] = len(opened)
+                opened.append([key, item, value, timestamp, None])
+                current[key, item] = value
+
+        history, key = _quote(self.history_table), _quote(self.key)
+        self._conn.executemany(f"UPDATE {history} SET valid_to = ? WHERE {key} = ? "
+                               f"AND item = ? AND valid_to IS NULL", closed)
+        self._conn.executemany(f"INSERT INTO {history} VALUES (?, ?, ?, ?, ?)",
+                               opened)
+        self.changes_logged += len(opened)
+
+    def _current_values(self, keys: set[str], items: list[str]) -> dict:
+        history, key = _quote(self.history_table), _quote(self.key)
+        current, keys = {}, list(keys)
+        # in chunks, below the maximum number of parameters of a statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT {key}, item, value FROM {history} WHERE valid_to IS NULL "
+                f"AND {key} IN ({', '.join('?' * len(chunk))})", chunk)
+            current.update(((row_key, item), value) for row_key, item, value in rows
+                           if item in items)
+        return current
+
+    def _upsert_statement(self, columns: list[str]) -> str:
+        names = ", ".join(map(_quote, columns))
+        placeholders = ", ".join("?" * len(columns))
+        updates = ", ".join(f"{_quote(column)} = COALESCE(excluded.{_quote(column)}, "
+                            f"{_quote(column)})"
+                            for column in columns if column != self.key)
+        on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        return (f"INSERT INTO {_quote(self.table_name)} ({names}) "
+                f"VALUES ({placeholders}) "
+                f"ON CONFLICT ({_quote(self.key)}) {on_conflict}")
+
+    def _add_columns(self, df: pd.DataFrame):
+        new_columns = [column for column in df.columns if column not in self._columns]
+        for column in new_columns:
+            self._conn.execute(f"ALTER TABLE {_quote(self.table_name)} ADD COLUMN "
+                               f"{_quote(column)} {_sql_type(df[column])}")
+            self._columns.add(column)
+        if set(new_columns) & set(self.INDEXED_COLUMNS):
+            self._create_indexes()
+
+    def _create_indexes(self):
+        for column in self.INDEXED_COLUMNS:
+            if column in self._columns:
+                index = _quote(f"{self.table_name}_{column}")
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON "
+                                   f"{_quote(self.table_name)} ({_quote(column)})")
+
+    def _table_columns(self) -> set[str]:
+        rows = self._conn.execute(f"PRAGMA table_info({_quote(self.table_name)})")
+        return {row[1] for row in rows}
+
+    def _warn(self, msg: str):
+        if self.logger:
+            self.logger.warning(msg)
+        else:
+            print(msg)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _sql_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+class BackgroundWriter:
+    """Writes batches in a thread of its own, so that scraping goes on meanwhile.
+
+    `put` hands a batch over to the writer thread through a bounded queue and
+    returns at once, unless max_queued batches are already waiting, in which case
+    it blocks until one is written: memory stays bounded when writing is slower
+    than scraping. `close` waits until all the queued batches are written.
+
+    If a write fails, the following batches are discarded and the error is raised
+    by the next call to `put` or `close`.
+
+    Args:
+        write (Callable): Writes a batch, e.g. `ParquetSink.write`.
+        max_queued (int, optional): Number of batches waiting to be written after
+        which `put` blocks. Defaults to 2.
+        logger (logging.Logger, optional): A logger for the errors raised while an
+        exception is already propagating.
+
+    Attributes:
+        batches_written (int): Number of batches written so far.
+    """
+
+    _STOP = object()
+
+    def __init__(self,
+                 write: Callable[[Any], None],
+                 max_queued: int = 2,
+                 logger: Optional[logging.Logger] = None):
+        self.write = write
+        self.logger = logger
+        self.batches_written = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._error: Optional[BaseException] = None
+        self._error_raised = False
+        self._thread = threading.Thread(target=self._run, name="BackgroundWriter",
+                                        daemon=True)
+        self._thread.start()
+
+    def put(self, batch: Any, on_written: Optional[Callable[[], None]] = None):
+        """Queue a batch to be written.
+
+        Args:
+            batch: The batch, passed to write.
+            on_written (Callable, optional): Called in the writer thread once the
+            batch is written, e.g. to mark its listings as done. Defaults to None.
+        """
+        self._raise_error()
+        if not self._thread.is_alive():
+            raise RuntimeError("The writer is closed")
+        self._queue.put((batch, on_written))
+
+    def close(self):
+        """Wait until all the queued batches are written, and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+            return
+        # flush what was scraped before the error, without hiding the error
+        try:
+            self.close()
+        except Exception as e:
+            msg = f"Writing a batch failed because of {e!r}"
+            if self.logger:
+                self.logger.warning(msg)
+            else:
+                print(msg)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            if self._error is not None:
+                continue
+            batch, on_written = item
+            try:
+                self.write(batch)
+                if on_written is not None:
+                    on_written()
+                self.batches_written += 1
+            except BaseException as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None and not self._error_raised:
+            self._error_raised = True
+            raise self._error
+
+
+def parquet_schema(config: ScraperConfig, normalized: bool = True) -> "pa.Schema":
+    """The schema of the listings scraped with a configuration.
+
+    Normalized items, and the columns split from them, are stored with their type
+    (see `normalization.normalize_dataframe`), all the other columns as text.
+    """
+    types = {"numeric": pa.float64(),
+             "integer": pa.int64(),
+             "category": pa.dictionary(pa.int32(), pa.string())}
+    fields = {}
+    for item in config_items(config):
+        fields[item.name] = types.get(item.type, pa.string()) if normalized \
+            else pa.string()
+    if normalized:
+        for column, column_type in split_columns(config).items():
+            fields[column] = types.get(column_type, pa.string())
+    for column in RECORD_COLUMNS:
+        fields.setdefault(column, pa.string())
+    return pa.schema(list(fields.items()))
+
+
+class ParquetSink:
+    """Appends batches of listings to a Parquet dataset.
+
+    The dataset is partitioned as `site=<website>/date=<scrape date>/city=<city>`,
+    so that readers (e.g. `pyarrow.dataset` or `pandas.read_parquet` with filters)
+    only open the partitions and columns they need. Every batch is written as one
+    zstd-compressed file, with a single row group, in each of the partitions its
+    listings belong to. All files have the schema of the configuration, whatever
+    the columns found in a batch, so they can be read together.
+
+    Args:
+        root (str): The folder of the dataset, created if it does not exist.
+        config (ScraperConfig): The configuration the listings are scraped with.
+        normalized (bool, optional): Whether the batches have the columns typed by
+        `normalization.normalize_dataframe`. Defaults to True.
+        compression (str, optional): The Parquet compression codec. Defaults to
+        "zstd".
+        logger (logging.Logger, optional): A logger for the dropped columns.
+
+    Attributes:
+        batches_written (int): Number of batches written so far.
+        rows_written (int): Number of listings written so far.
+    """
+
+    PARTITION_COLUMNS = ["site", "date", "city"]
+
+    def __init__(self,
+                 root: Union[str, Path],
+                 config: ScraperConfig,
+                 normalized: bool = True,
+                 compression: str = "zstd",
+                 logger: Optional[logging.Logger] = None):
+        if pa is None:
+            raise ImportError("Writing Parquet files requires the pyarrow package: "
+                              "pip install pyarrow")
+        self.root = Path(root)
+        self.site = config.website_settings.name
+        self.schema = parquet_schema(config, normalized)
+        self.logger = logger
+        self.batches_written = 0
+        self.rows_written = 0
+        self._partitioning = ds.partitioning(
+            pa.schema([(column, pa.string()) for column in self.PARTITION_COLUMNS]),
+            flavor="hive")
+        self._file_options = ds.ParquetFileFormat().make_write_options(
+            compression=compression)
+        self._run_id = uuid.uuid4().hex[:8]
+        self._dropped_columns = set()
+
+    def write(self, df: pd.DataFrame):
+        """Write a batch of listings."""
+        if df.empty:
+            return
+        ds.write_dataset(
+            self._to_table(df),
+            self.root,
+            format="parquet",
+            partitioning=self._partitioning,
+            file_options=self._file_options,
+            basename_template=f"part-{self._run_id}-{self.batches_written:05d}"
+                              f"-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_group=max(len(df), 1),
+        )
+        self.batches_written += 1
+        self.rows_written += len(df)
+
+    def _to_table(self, df: pd.DataFrame) -> "pa.Table":
+        dropped = set(df.columns) - set(self.schema.names) - {SEARCH_CITY_COLUMN}
+        if dropped - self._dropped_columns:
+            self._warn(f"Columns {sorted(dropped - self._dropped_columns)} are not in "
+                       f"the configuration and are not written to Parquet")
+            self._dropped_columns |= dropped
+
+        arrays = [_to_arrow(df[field.name], field.type) if field.name in df.columns
+                  else pa.nulls(len(df), field.type) for field in self.schema]
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        return (table
+                .append_column("site", pa.array([self.site] * len(df), pa.string()))
+                .append_column("date", self._dates(df))
+                .append_column("city", self._cities(df)))
+
+    @staticmethod
+    def _dates(df: pd.DataFrame) -> "pa.Array":
+        today = pa.scalar(get_timestamp(date_only=True))
+        if "TimeStampShallow" not in df.columns:
+            return pa.array([today.as_py()] * len(df), pa.string())
+        timestamps = _to_arrow(df["TimeStampShallow"], pa.string())
+        return pc.fill_null(pc.utf8_slice_codeunits(timestamps, 0, 10), today)
 
+    @staticmethod
+    def _cities(df: pd.DataFrame) -> "pa.Array":
+        if SEARCH_CITY_COLUMN not in df.columns:
+            return pa.array(["all"] * len(df), pa.string())
+        return pc.fill_null(_to_arrow(df[SEARCH_CITY_COLUMN], pa.string()), "all")
 
-def write_to_sqlite(df: pd.DataFrame, table_name: str, database_name: str):
-    with sqlite3.connect(database_name) as conn:
-        df.to_sql(table_name, conn, if_exists="append", index=False)
+    def _warn(self, msg: str):
+        if self.logger:
+            self.logger.warning(msg)
+        else:
+            print(msg)
 
 
-async def write_to_sqlite_async(df: pd.DataFrame, table_name: str, database_name: str):
-    return await asyncio.to_thread(write_to_sqlite, df, table_name, database_name)
+def _to_arrow(series: pd.Series, arrow_type: "pa.DataType") -> "pa.Array":
+    try:
+        array = pa.Array.from_pandas(series)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed types, e.g. numbers and text: keep the text
+        array = pa.array([None if pd.isna(value) else str(value) for value in series],
+                         pa.string())
+    return array.cast(arrow_type)
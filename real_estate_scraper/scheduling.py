@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Optional, Callable, Awaitable, AsyncIterator, Union, Iterator
+
+from real_estate_scraper.pipeline import ShallowPage
+
+GetPagesFn = Callable[[Optional[str], Union[None, int, list[int]]], Awaitable[list[int]]]
+
+
+class CityScheduler:
+    """An async iterable of the shallow pages of many cities.
+
+    The number of pages of the cities is discovered concurrently, and the pages of
+    all the discovered cities are handed out in round-robin order. Iterating over
+    it lazily, as the crawl pipeline does, therefore interleaves the shallow (and
+    deep) work of many cities within the rate budget of a single scraper instead
+    of walking the cities one at a time.
+
+    Args:
+        get_pages (Callable): Coroutine function returning the pages to scrape
+        for a city, typically `Scraper._get_pages`.
+        cities (list[str]): The cities to crawl.
+        pages (Optional[int, list[int]]): The pages to scrape for every city. If
+        None, all pages. Defaults to None.
+        concurrency (int, optional): Maximum number of cities whose number of pages
+        is discovered at the same time. Defaults to 10.
+        logger (logging.Logger, optional): A logger for the failed discoveries.
+
+    Attributes:
+        cities_discovered (int): Number of cities whose pages are known.
+        cities_failed (int): Number of cities whose pages could not be discovered.
+    """
+
+    def __init__(self,
+                 get_pages: GetPagesFn,
+                 cities: list[str],
+                 pages: Union[None, int, list[int]] = None,
+                 concurrency: int = 10,
+                 logger: Optional[logging.Logger] = None):
+        self.get_pages = get_pages
+        self.cities = cities
+        self.pages = pages
+        self.concurrency = concurrency
+        self.logger = logger
+        self.cities_discovered = 0
+        self.cities_failed = 0
+
+    async def __aiter__(self) -> AsyncIterator[ShallowPage]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        discovered = asyncio.Queue()
+
+        async def discover(city: str):
+            async with semaphore:
+                try:
+                    city_pages = await self.get_pages(city, self.pages)
+                    self.cities_discovered += 1
+                except Exception as e:
+                    self.cities_failed += 1
+                    self._log(f"Could not get the pages of {city} because of {e}")
+                    city_pages = []
+            await discovered.put((city, iter(city_pages)))
+
+        tasks = [asyncio.create_task(discover(city)) for city in self.cities]
+        undiscovered = len(tasks)
+        active: deque[tuple[str, Iterator[int]]] = deque()
+        try:
+            while undiscovered or active:
+                while undiscovered and (not active or not discovered.empty()):
+                    active.append(await discovered.get())
+                    undiscovered -= 1
+
+                city, city_pages = active.popleft()
+                page = next(city_pages, None)
+                if page is None:
+                    continue
+                active.append((city, city_pages))
+                yield ShallowPage(city=city, page=page)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _log(self, msg: str):
+        if self.logger:
+            self.logger.warning(msg)
+        else:
+            print(msg)
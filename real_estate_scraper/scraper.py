@@ -1,26 +1,41 @@
 import asyncio
 import logging
-from asyncio import Semaphore
-from itertools import chain
-from typing import Union, Optional, Tuple
+from contextlib import contextmanager
+from functools import partial
+from typing import Union, Optional, Tuple, Iterator, AsyncIterator, Callable
 
 import pandas as pd
-from aiohttp import ClientResponseError
-from aiolimiter import AsyncLimiter
-from bs4 import BeautifulSoup
+from aiohttp import ClientResponseError, ClientSession
 from bs4.element import SoupStrainer
 from tqdm import tqdm
 
+from real_estate_scraper.blob_store import BlobStore
+from real_estate_scraper.columnar import RecordColumns, concat_tables, \
+    arrow_to_dataframe, pa
 from real_estate_scraper.configuration import ScraperConfig, House
-from real_estate_scraper.html_handling import get_soup, add_semaphore, \
-    add_limiter
+from real_estate_scraper.frontier import CrawlFrontier, DONE
+from real_estate_scraper.http_cache import ResponseCache
+from real_estate_scraper.incremental import ListingStateStore, KnownPagesStop
+from real_estate_scraper.extraction import ExtractionExecutor, ExtractionPlan
+from real_estate_scraper.html_handling import get_response, create_session, \
+    MAX_CONNECTIONS_PER_HOST, ReadBodyFn
 from real_estate_scraper.logging_mgmt import create_logger
-from real_estate_scraper.parsing import get_retrieval_statistics
-from real_estate_scraper.save import write_to_sqlite, to_csv, create_folder, \
-    generate_filename, generate_table_name
-from real_estate_scraper.utils import func_timer, get_timestamp, split_list
+from real_estate_scraper.normalization import normalize_dataframe, config_items
+from real_estate_scraper.parsers import Node
+from real_estate_scraper.pipeline import CrawlPipeline, ShallowPage
+from real_estate_scraper.scheduling import CityScheduler
+from real_estate_scraper.streaming import StreamingReader
+from real_estate_scraper.retrying import RetryScheduler, RetryPolicy
+from real_estate_scraper.throttling import FixedThrottle, AdaptiveThrottle
+from real_estate_scraper.save import to_csv, create_folder, generate_filename, \
+    FILE_EXTENSIONS, SEARCH_CITY_COLUMN, ParquetSink, SQLiteSink, BackgroundWriter, \
+    parquet_schema
+from real_estate_scraper.utils import func_timer, get_timestamp
 
 TIMER_ACTIVE = True
+# pipeline workers per throttle slot, so that the workers waiting for the retry
+# of a flaky URL leave enough of them to keep the throttle busy
+PIPELINE_WORKERS_PER_SLOT = 4
 
 
 class Scraper:
@@ -33,17 +48,85 @@ class Scraper:
         active requests allowed. Defaults to 5.
         requests_per_sec (int, optional): The maximum number of requests
         allowed per second. Defaults to 5.
+        adaptive_throttling (bool, optional): If True, max_active_requests and
+        requests_per_sec are only the initial values of an AdaptiveThrottle,
+        which raises them while the website answers promptly and cuts them when
+        it pushes back. Defaults to False.
+        retry_policies (dict, optional): Retry policy of each error class, see
+        `retrying.default_retry_policies`. Requests waiting for a retry do not
+        hold any throttle slot. Defaults to None (default policies).
+        queue_size (int, optional): Maximum number of listings buffered between
+        the stages of the crawl pipeline. Defaults to 100.
+        pipeline_workers (int, optional): Number of shallow and of deep workers of
+        the crawl pipeline. A worker is busy until its request succeeds or gives
+        up, backoff included, while the throttle bounds the requests actually
+        sent, so there are more workers than throttle slots. Defaults to None
+        (PIPELINE_WORKERS_PER_SLOT times the throttle concurrency).
         logger (logging.Logger, optional): A logger object. If not provided,
         a default logger will be created.
+        max_connections_per_host (int, optional): The maximum number of pooled
+        connections kept open towards a single host, raised to the maximum
+        concurrency of the throttle if lower. Defaults to MAX_CONNECTIONS_PER_HOST.
+        cache (ResponseCache, optional): An on-disk HTTP cache. If given, pages
+        are served from it when fresh and revalidated with conditional requests
+        when stale. Defaults to None.
+        listing_state (ListingStateStore, optional): If given, deep crawls are
+        incremental: the deep page of a listing is requested only if the listing
+        is new or its shallow items changed since it was last scraped deep,
+        otherwise its deep items are carried forward. The listings found by
+        shallow crawls are recorded in it too. Defaults to None.
+        stop_after_known_pages (int, optional): If given, the pagination of a
+        city stops after this many consecutive results pages containing only
+        listings already in listing_state, as with results sorted by date the
+        following pages contain only older listings. The pages of a city are
+        then requested a few at a time, see `incremental.KnownPagesStop`.
+        Defaults to None.
+        parse_workers (int, optional): Number of workers parsing the pages and
+        retrieving their items outside the event loop. If 0, pages are parsed on
+        the event loop. Defaults to 0.
+        parse_executor (str, optional): "process" or "thread", the kind of pool
+        of the parse workers. Defaults to "process".
+        normalize (bool, optional): If True, the columns of the dataframes are
+        converted to the types of their items, e.g. Price to float64, see
+        `normalization.normalize_dataframe`. Defaults to False.
+        stream_deep (bool, optional): If True, deep pages are parsed while they
+        are received and their connection is closed as soon as all the deep items
+        are found, or after the `stream_until` element of the website settings,
+        see `streaming.StreamingExtraction`. Requires declarative selectors for
+        all the deep items. Streamed pages are parsed on the event loop and are
+        not cached. Defaults to False.
+        blob_store (BlobStore, optional): If given, the texts of the "blob" items,
+        like descriptions, are stored in it once, and the files and databases
+        written by `download_to_file` and `download_to_db` only hold their
+        hashes, see `blob_store.BlobStore.load`. Defaults to None.
+
+    The scraper owns a single pooled HTTP session, created on the first request
+    and reused for its whole life. Call `close` (or use the scraper as a context
+    manager) to release it:
+
+        >>> with Scraper(config) as scraper:
+        ...     df = scraper.download_to_dataframe("Delft")
 
     Attributes:
         config (ScraperConfig): Object containing the necessary configurations for
         scraping the website.
         max_active_requests (int): Maximum number of active requests allowed.
-        semaphore (Semaphore): Used to limit the number of active requests.
-        limiter (AsyncLimiter): Used to limit the number of requests per second.
+        throttle (Union[FixedThrottle, AdaptiveThrottle]): Used to limit the
+        number of active requests and of requests per second.
+        retry_scheduler (RetryScheduler): Reschedules failed requests.
         parse_only (SoupStrainer): Used to parse only certain parts of the HTML.
         logger (logging.Logger): A logger object for logging messages.
+        max_connections_per_host (int): Maximum number of pooled connections per
+        host.
+        cache (Optional[ResponseCache]): The HTTP cache, if any.
+        listing_state (Optional[ListingStateStore]): The last known state of the
+        listings, for incremental crawls.
+        stop_after_known_pages (Optional[int]): Consecutive results pages with
+        only known listings after which the pagination of a city stops.
+        extraction (ExtractionExecutor): Parses the pages and retrieves their items.
+        normalize (bool): Whether the columns of the dataframes are typed.
+        streaming (Optional[StreamingReader]): Reads the deep pages, if streamed.
+        blob_store (Optional[BlobStore]): Stores the texts of the "blob" items.
     """
 
     def __init__(
@@ -52,31 +135,136 @@ class Scraper:
             max_active_requests: int = 5,
             requests_per_sec: int = 5,
             logger: Optional[logging.Logger] = None,
+            adaptive_throttling: bool = False,
+            retry_policies: Optional[dict[str, Optional[RetryPolicy]]] = None,
+            queue_size: int = 100,
+            pipeline_workers: Optional[int] = None,
+            max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+            cache: Optional[ResponseCache] = None,
+            listing_state: Optional[ListingStateStore] = None,
+            stop_after_known_pages: Optional[int] = None,
+            parse_workers: int = 0,
+            parse_executor: str = "process",
+            normalize: bool = False,
+            stream_deep: bool = False,
+            blob_store: Optional[BlobStore] = None,
     ):
 
         self.logger = logger
         self.config = config
         self.max_active_requests = max_active_requests
-        self.semaphore = Semaphore(value=max_active_requests)
-        self.limiter = AsyncLimiter(1, round(1 / requests_per_sec, 3))
+        self.cache = cache
+        self.queue_size = queue_size
+        self.pipeline_workers = pipeline_workers
+        self.normalize = normalize
+        self.blob_store = blob_store
+        if stop_after_known_pages is not None and listing_state is None:
+            raise ValueError("stop_after_known_pages requires a listing_state")
+        self.listing_state = listing_state
+        self.stop_after_known_pages = stop_after_known_pages
+        if adaptive_throttling:
+            self.throttle = AdaptiveThrottle(initial_rate=requests_per_sec,
+                                             initial_concurrency=max_active_requests)
+        else:
+            self.throttle = FixedThrottle(max_active_requests=max_active_requests,
+                                          requests_per_sec=requests_per_sec)
+        # enough connections for the highest concurrency the throttle can reach
+        self.max_connections_per_host = max(max_connections_per_host,
+                                            self.throttle.max_concurrency)
         parse_only = config.website_settings.parse_only
         self.parse_only = SoupStrainer(parse_only) if parse_only else None
 
         if logger is None:
             logger = create_logger(self.config.website_settings.name)
         self.logger = logger
+        self.retry_scheduler = RetryScheduler(policies=retry_policies, logger=logger)
+        self.extraction = ExtractionExecutor(ExtractionPlan.compile(config),
+                                             workers=parse_workers,
+                                             kind=parse_executor)
+        self.streaming = None
+        if stream_deep:
+            if self.extraction.plan.json_house_deep is not None:
+                raise ValueError("stream_deep cannot be used with a JSON extraction "
+                                 "of the deep items")
+            self.streaming = StreamingReader(
+                self.extraction.plan.house_items_deep,
+                until=config.website_settings.stream_until)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional[ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def close(self):
+        """Close the pooled session and the event loop used by the synchronous
+        API."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.run_until_complete(self.aclose())
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+        self._loop = None
+
+    async def aclose(self):
+        """Close the pooled session and the parse workers."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+        self.extraction.close()
+
+    def _run(self, coro):
+        """Run a coroutine on the scraper's own event loop.
+
+        The loop is kept alive between calls so that the pooled session, whose
+        connections are bound to the loop that created them, survives across the
+        batches of a run.
+        """
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    async def _get_session(self) -> ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is not None and self._session_loop is not loop:
+            # connections cannot be shared across event loops
+            self.logger.warning("Pooled session is bound to another event loop, "
+                                "a new one will be created")
+            self._session = None
+
+        if self._session is None or self._session.closed:
+            self._session = create_session(
+                header=self.config.website_settings.header,
+                max_connections_per_host=self.max_connections_per_host
+            )
+            self._session_loop = loop
+        return self._session
 
     @func_timer(active=TIMER_ACTIVE)
     def download_to_dataframe(self,
-                              city: Optional[str] = None,
+                              city: Union[None, str, list[str]] = None,
                               pages: Union[None, int, list[int]] = None,
                               deep=False,
                               shallow_batch_size: int = 5) -> pd.DataFrame:
         """Scrapes the website for the given city.
 
         Args:
-            city (Optional[str]): The name of the city to scrape.
-            pages (Optional[int, list[int]): The number of the pages to scrape.
+            city (Optional[str, list[str]]): The name of the city to scrape. If a
+                    list of cities, their pages are discovered concurrently and
+                    crawled interleaved (see `scheduling.CityScheduler`).
+            pages (Optional[int, list[int]): The number of the pages to scrape
+                    (for each city).
                     If None, scrape all pages.
                     If an integer, scrape that page. For example, page 2.
                     If a list of integers, scrape all the pages with those numbers.
@@ -102,65 +290,115 @@ class Scraper:
 
         """
 
-        dataframes = []
-        for df in self._dataframe_generator(city, pages, deep, shallow_batch_size):
-            dataframes.append(df)
+        if pa is None:
+            dataframes = list(self._dataframe_generator(city, pages, deep,
+                                                        shallow_batch_size))
+            if dataframes:
+                return pd.concat(dataframes)
+            return None
 
-        if dataframes:
-            return pd.concat(dataframes)
+        # the batches are kept as Arrow tables, concatenated without copies and
+        # converted to pandas once
+        tables = [records.to_arrow() for records in
+                  self._record_batches_generator(city, pages, deep, shallow_batch_size)]
+        if not tables:
+            return None
+        table = concat_tables(tables)
+        tables.clear()
+        return self._normalize(arrow_to_dataframe(table))
 
     @func_timer(active=TIMER_ACTIVE)
     def download_to_file(
             self,
-            city: Optional[str] = None,
+            city: Union[None, str, list[str]] = None,
             pages: Union[None, int, list[int]] = None,
             deep=False,
             shallow_batch_size: int = 5,
-            filepath: Optional[str] = None
+            filepath: Optional[str] = None,
+            frontier_path: Optional[str] = None,
+            file_format: str = "csv",
     ):
         """
         Downloads listings to file.
         Args:
-            city (str, optional): City to download houses from. Defaults to None.
+            city (str, list[str], optional): City, or list of cities, to download
+                houses from. Defaults to None.
             pages (int, optional): Number of the shallow pages to scrape.
                 Defaults to None.
             deep (bool, optional): Whether to scrape deep. Defaults to False.
             shallow_batch_size (int, optional): Number of shallow pages to scrape in a
             batch. The listings will be downloaded in batches of shallow_batch_size.
             filepath (str, optional): Path to the file to write. Defaults to None.
+            frontier_path (str, optional): Path of a SQLite file where the crawl
+            frontier is persisted. If the file exists, the interrupted crawl it
+            records is resumed. Listings whose deep page fails are delivered by
+            the resumed crawl. Defaults to None.
+            file_format (str, optional): "csv", or "parquet" to append the batches
+            to a partitioned Parquet dataset, see `save.ParquetSink`. With
+            "parquet", filepath is the folder of the dataset. Defaults to "csv".
         """
 
+        extension = f".{file_format}"
+        if extension not in FILE_EXTENSIONS:
+            raise ValueError(f"Format {file_format} is not supported"
+                             f" (supported extensions: {FILE_EXTENSIONS})")
+
         if filepath is None:
             path, msg = create_folder()
             if msg:
                 self.logger.info(msg)
 
-            filename = generate_filename(pages, city, deep, extension='.csv')
+            filename = generate_filename(pages, city, deep, extension=extension)
             filepath = path / filename
 
-        for df in self._dataframe_generator(city, pages, deep, shallow_batch_size):
-            to_csv(df, filepath=filepath)
+        if file_format == "parquet":
+            write = ParquetSink(filepath, self.config, normalized=self.normalize,
+                                logger=self.logger).write
+        else:
+            write = partial(to_csv, filepath=filepath)
+
+        self._write_batches(write, city, pages, deep, shallow_batch_size,
+                            frontier_path=frontier_path)
 
     @func_timer(active=TIMER_ACTIVE)
     def download_to_db(
             self,
-            city: Optional[str] = None,
+            city: Union[None, str, list[str]] = None,
             pages: Union[None, int, list[int]] = None,
             deep=False,
             shallow_batch_size: int = 5,
             db_path: Optional[str] = None,
             table_name: Optional[str] = None,
+            frontier_path: Optional[str] = None,
+            key: str = "href",
+            history_items: Optional[list[str]] = None,
     ):
         """
         Downloads listings to a SQLite database.
+
+        The listings are upserted in one table, see `save.SQLiteSink`: scraping the
+        same listings again, e.g. every day, updates their rows.
+
         Args:
-            city (str, optional): City to download houses from. Defaults to None.
+            city (str, list[str], optional): City, or list of cities, to download
+                houses from. Defaults to None.
             pages (int, optional): Number of shallow pages to scrape. Defaults to None.
             deep (bool, optional): Whether to scrape deep. Defaults to False.
             shallow_batch_size (int, optional): Number of shallow pages to scrape in a
             batch. The listings will be downloaded in batches of shallow_batch_size.
             db_path (str, optional): Path to the database to write. Defaults to None.
-            table_name (str, optional): Name of the table to write. Defaults to None.
+            table_name (str, optional): Name of the table to write. Defaults to
+            "raw.listings".
+            frontier_path (str, optional): Path of a SQLite file where the crawl
+            frontier is persisted. If the file exists, the interrupted crawl it
+            records is resumed. Listings whose deep page fails are delivered by
+            the resumed crawl. Defaults to None.
+            key (str, optional): The column identifying a listing. Defaults to
+            "href".
+            history_items (list[str], optional): Items whose changes are logged
+            with their validity intervals, e.g. ["Price", "Status",
+            "Acceptance"], see `save.SQLiteSink`. An item no longer found on a
+            listing is logged as removed. Defaults to None.
         """
 
         if db_path is None:
@@ -170,128 +408,418 @@ class Scraper:
             db_path = (path / f"{self.config.website_settings.name}.db").as_posix()
 
         if table_name is None:
-            table_name = generate_table_name(pages, city, deep, schema='raw')
-
-        for df in self._dataframe_generator(city, pages, deep, shallow_batch_size):
-            write_to_sqlite(df, database_name=db_path, table_name=table_name)
+            table_name = "raw.listings"
+
+        with SQLiteSink(db_path, table_name, key=key, history_items=history_items,
+                        shallow_items=self.house_items_shallow_names,
+                        logger=self.logger) as sink:
+            self._write_batches(sink.write, city, pages, deep, shallow_batch_size,
+                                frontier_path=frontier_path)
+
+    def _write_batches(self,
+                       write: Callable[[pd.DataFrame], None],
+                       city: Union[None, str, list[str]] = None,
+                       pages: Union[None, int, list[int]] = None,
+                       deep=False,
+                       shallow_batch_size: int = 5,
+                       frontier_path: Optional[str] = None):
+        """Write the batches with a `save.BackgroundWriter`, while the next batches
+        are scraped.
+
+        The conversion of a batch to a dataframe happens in the writer thread too.
+        The listings of a batch are marked as done in the frontier only once the
+        batch is written, so that a crash loses no listing.
+        """
+        blob_items = [item.name for item in config_items(self.config)
+                      if item.type == "blob"]
+
+        def write_records(records: RecordColumns):
+            df = self._records_to_dataframe(records)
+            if self.blob_store is not None:
+                df = self.blob_store.store(df, blob_items)
+            write(df)
+
+        with self._open_frontier(frontier_path) as frontier, \
+                BackgroundWriter(write_records, logger=self.logger) as writer:
+            for records in self._record_batches_generator(city, pages, deep,
+                                                          shallow_batch_size,
+                                                          frontier=frontier):
+                writer.put(records, on_written=partial(self._mark_columns_done,
+                                                       frontier, records))
+
+    @contextmanager
+    def _open_frontier(self, frontier_path: Optional[str] = None) \
+            -> Iterator[Optional[CrawlFrontier]]:
+        if frontier_path is None:
+            yield None
+            return
+
+        frontier = CrawlFrontier(frontier_path)
+        self.logger.info(f"Crawl frontier {frontier_path}: {frontier.stats}")
+        try:
+            yield frontier
+        finally:
+            self.logger.info(f"Crawl frontier {frontier_path}: {frontier.stats}")
+            frontier.close()
 
     def _dataframe_generator(self,
-                             city: Optional[str] = None,
-                             pages: Optional[int] = None,
+                             city: Union[None, str, list[str]] = None,
+                             pages: Union[None, int, list[int]] = None,
                              deep=False,
-                             shallow_batch_size: int = 5) -> pd.DataFrame:
-
+                             shallow_batch_size: int = 5,
+                             frontier: Optional[CrawlFrontier] = None) \
+            -> Iterator[pd.DataFrame]:
+        """Drive the asynchronous crawl from synchronous code, a dataframe per
+        batch."""
+        for records in self._record_batches_generator(city, pages, deep,
+                                                      shallow_batch_size,
+                                                      frontier=frontier):
+            yield self._records_to_dataframe(records)
+
+    def _record_batches_generator(self,
+                                  city: Union[None, str, list[str]] = None,
+                                  pages: Union[None, int, list[int]] = None,
+                                  deep=False,
+                                  shallow_batch_size: int = 5,
+                                  frontier: Optional[CrawlFrontier] = None) \
+            -> Iterator[RecordColumns]:
+        """Drive the asynchronous crawl from synchronous code.
+
+        The crawl runs on the scraper's own event loop, which is resumed every time
+        a batch is requested, so the pipeline state is preserved between batches.
+        """
+        batches = self._record_batches(city, pages, deep, shallow_batch_size,
+                                       frontier=frontier)
         try:
-            chunks = asyncio.run(self._get_pages_batches(city, pages, shallow_batch_size))
-        except ClientResponseError as e:
-            return None
+            while True:
+                try:
+                    records = self._run(batches.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield records
+        finally:
+            self._run(batches.aclose())
+
+    async def iter_houses(self,
+                          city: Union[None, str, list[str]] = None,
+                          pages: Union[None, int, list[int]] = None,
+                          deep=False,
+                          batch_size: Optional[int] = None,
+                          frontier: Optional[CrawlFrontier] = None) \
+            -> AsyncIterator[Union[House, list[House]]]:
+        """Scrapes the website for the given city, yielding the listings as soon as
+        they are scraped.
+
+        This is the asynchronous counterpart of `download_to_dataframe`, meant to be
+        used from a running event loop. Breaking out of the loop, or cancelling the
+        task iterating over it, cancels all the requests still in flight.
+
+        Args:
+            city (Optional[str, list[str]]): The name of the city, or the list of
+                    cities, to scrape.
+            pages (Optional[int, list[int]): The number of the pages to scrape
+                    (for each city). If None, scrape all pages. Defaults to None.
+            deep (bool, optional): If True, scrape each listing's webpage.
+                    Defaults to False.
+            batch_size (int, optional): If given, yield lists of up to batch_size
+                    listings instead of single listings. Defaults to None.
+            frontier (CrawlFrontier, optional): If given, the crawl is resumed from
+                    the frontier and recorded into it. A listing is marked as done
+                    once the loop body processing it has completed. Listings
+                    whose deep page fails are yielded by the resumed crawl.
+                    Defaults to None.
 
+        Example:
+            >>> async with Scraper(config) as scraper:
+            ...     async for house in scraper.iter_houses("Delft", pages=1):
+            ...         print(house["Price"])
+            € 375, 000 k.k.
+        """
+        pipeline = self._create_pipeline(deep=deep, frontier=frontier)
+        records = self._iter_records(pipeline, city, pages, frontier=frontier)
+        if batch_size is None:
+            async for record in records:
+                yield record
+                self._mark_done(frontier, [record])
+            return
+
+        batch = []
+        async for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                self._mark_done(frontier, batch)
+                batch = []
+        if batch:
+            yield batch
+            self._mark_done(frontier, batch)
+
+    @staticmethod
+    def _mark_done(frontier: Optional[CrawlFrontier], records: list[House]):
+        if frontier is not None:
+            frontier.mark_done(records)
+
+    async def _iter_records(self,
+                            pipeline: CrawlPipeline,
+                            city: Union[None, str, list[str]] = None,
+                            pages: Union[None, int, list[int]] = None,
+                            frontier: Optional[CrawlFrontier] = None) \
+            -> AsyncIterator[House]:
+        if isinstance(city, list):
+            shallow_pages = CityScheduler(partial(self._get_pages, frontier=frontier),
+                                          cities=city,
+                                          pages=pages,
+                                          concurrency=self.throttle.max_concurrency,
+                                          logger=self.logger)
+        else:
+            pages = await self._get_pages(city, pages, frontier=frontier)
+            shallow_pages = (ShallowPage(city=city, page=page) for page in pages)
+        async for record in pipeline.run(shallow_pages):
+            yield record
+
+    async def _record_batches(self,
+                              city: Union[None, str, list[str]] = None,
+                              pages: Union[None, int, list[int]] = None,
+                              deep=False,
+                              shallow_batch_size: int = 5,
+                              frontier: Optional[CrawlFrontier] = None) \
+            -> AsyncIterator[RecordColumns]:
         item_list = self.house_items_shallow_names
         if deep:
             item_list += self.house_items_deep_names
 
-        for chunk in tqdm(chunks, total=len(chunks)):
-            self.semaphore = Semaphore(value=self.max_active_requests)
-            df = asyncio.run(self._scrape_city_async(city=city, pages=chunk, deep=deep))
-
-            if df is None:
-                self.logger.warning("No items retrieved")
-                break
-
-            success_rate, max_items, min_items = get_retrieval_statistics(df,
-                                                                          item_list)
-            self.logger.info(f"Batch mean items-retrieval success rate:"
-                             f" {success_rate}%\n"
-                             f"Max items retrieved: {max_items}/{len(item_list)}\n"
-                             f"Min items retrieved: {min_items}/{len(item_list)}")
-            yield df
-
-    async def _get_pages_batches(self,
-                                 city: Optional[str] = None,
-                                 pages: Union[None, int, list[int]] = None,
-                                 batch_size: Optional[int] = None) -> list:
+        pipeline = self._create_pipeline(deep=deep, frontier=frontier)
+        records = self._new_record_columns(item_list)
+        next_batch_at = shallow_batch_size
+
+        with tqdm(total=0) as progress:
+            try:
+                async for record in self._iter_records(pipeline, city, pages,
+                                                       frontier=frontier):
+                    records.append(record)
+                    self._update_progress(progress, pipeline)
+                    if pipeline.pages_done >= next_batch_at:
+                        next_batch_at = pipeline.pages_done + shallow_batch_size
+                        self._log_batch_stats(records, item_list)
+                        yield records
+                        records = self._new_record_columns(item_list)
+            except ClientResponseError as e:
+                self.logger.warning(f"Could not get the number of pages because of {e}")
+                return
+            self._update_progress(progress, pipeline)
+
+        if records:
+            self._log_batch_stats(records, item_list)
+            yield records
+        elif not pipeline.records_done and frontier is None:
+            self.logger.warning("No items retrieved")
+
+    @staticmethod
+    def _update_progress(progress: tqdm, pipeline: CrawlPipeline):
+        if progress.total != pipeline.pages_queued:
+            progress.total = pipeline.pages_queued
+            progress.refresh()
+        progress.update(pipeline.pages_done - progress.n)
+
+    def _new_record_columns(self, item_list: list[str]) -> RecordColumns:
+        # repetitive text, dictionary encoded whether the dataframes are normalized
+        dictionary_columns = [item.name for item in config_items(self.config)
+                              if item.type == "category"]
+        dictionary_columns += ["url_shallow", "TimeStampShallow", SEARCH_CITY_COLUMN]
+        # the raw values are text until normalized, in every batch
+        schema = parquet_schema(self.config, normalized=False) if pa is not None else None
+        return RecordColumns(columns=item_list,
+                             dictionary_columns=dictionary_columns,
+                             schema=schema)
+
+    @staticmethod
+    def _mark_columns_done(frontier: Optional[CrawlFrontier], records: RecordColumns):
+        if frontier is not None:
+            hrefs = records.column("href")
+            frontier.mark_hrefs_done(hrefs)
+            # the listings without href are identified by their items
+            frontier.mark_done(records.record(index)
+                               for index, href in enumerate(hrefs) if not href)
+
+    def _records_to_dataframe(self, records: RecordColumns) -> pd.DataFrame:
+        return self._normalize(records.to_dataframe())
+
+    def _normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.normalize:
+            return normalize_dataframe(df, self.config)
+        return df
+
+    def _log_batch_stats(self, records: RecordColumns, item_list: list[str]):
+        success_rate, max_items, min_items = records.retrieval_statistics(item_list)
+        self.logger.info(f"Batch mean items-retrieval success rate:"
+                         f" {success_rate}%\n"
+                         f"Max items retrieved: {max_items}/{len(item_list)}\n"
+                         f"Min items retrieved: {min_items}/{len(item_list)}")
+        if self.cache is not None:
+            self.logger.info(self.cache.stats_message())
+        if self.listing_state is not None:
+            self.logger.info(self.listing_state.stats_message())
+        if self.streaming is not None:
+            self.logger.info(self.streaming.stats_message())
+        if self.blob_store is not None:
+            self.logger.info(self.blob_store.stats_message())
+        self.logger.info(f"Throttling: {self.throttle_stats}, "
+                         f"retries: {self.retry_scheduler.stats}")
+
+    def _create_pipeline(self,
+                         deep=False,
+                         frontier: Optional[CrawlFrontier] = None) -> CrawlPipeline:
+        known_pages_stop = None
+        if self.stop_after_known_pages is not None:
+            known_pages_stop = KnownPagesStop(self.listing_state.known_hrefs(),
+                                              self.stop_after_known_pages)
+        scrape_shallow = partial(self._scrape_page_shallow,
+                                 frontier=frontier,
+                                 known_pages_stop=known_pages_stop)
+        scrape_deep = partial(self._scrape_house_deep, frontier=frontier)
+        return CrawlPipeline(scrape_shallow=scrape_shallow,
+                             scrape_deep=scrape_deep if deep else None,
+                             workers=self._pipeline_workers(),
+                             queue_size=self.queue_size,
+                             logger=self.logger)
+
+    def _pipeline_workers(self) -> int:
+        if self.pipeline_workers is not None:
+            return self.pipeline_workers
+        return PIPELINE_WORKERS_PER_SLOT * self.throttle.max_concurrency
+
+    async def _get_pages(self,
+                         city: Optional[str] = None,
+                         pages: Union[None, int, list[int]] = None,
+                         frontier: Optional[CrawlFrontier] = None) -> list[int]:
         if isinstance(pages, int):
             pages = [pages]
 
         if pages is None:
-            max_number_of_pages, _ = await self._get_num_pages_and_listings(city)
+            max_number_of_pages = frontier.get_num_pages(city) if frontier else None
+            if max_number_of_pages is None:
+                max_number_of_pages, _ = await self._get_num_pages_and_listings(city)
+            if frontier is not None:
+                frontier.set_num_pages(city, max_number_of_pages)
             pages = range(1, max_number_of_pages + 1)
 
-        if batch_size:
-            return split_list(pages, chunksize=batch_size)
+        return list(pages)
+
+    async def _scrape_page_shallow(self,
+                                   shallow_page: ShallowPage,
+                                   frontier: Optional[CrawlFrontier] = None,
+                                   known_pages_stop: Optional[KnownPagesStop] = None) \
+            -> list[House]:
+        if known_pages_stop is None:
+            return await self._scrape_results_page(shallow_page, frontier)
+
+        async with known_pages_stop.in_flight(shallow_page):
+            if known_pages_stop.is_exhausted(shallow_page):
+                return []
+            return await self._scrape_results_page(shallow_page, frontier,
+                                                   known_pages_stop)
+
+    async def _scrape_results_page(self,
+                                   shallow_page: ShallowPage,
+                                   frontier: Optional[CrawlFrontier] = None,
+                                   known_pages_stop: Optional[KnownPagesStop] = None) \
+            -> list[House]:
+        if frontier is not None:
+            status, _ = frontier.page_status(shallow_page)
+            if status == DONE:
+                return frontier.pending_listings(shallow_page)
+            if frontier.page_given_up(shallow_page):
+                return []
+
+        url = self._get_city_url(city=shallow_page.city, page=shallow_page.page)
+        try:
+            houses = await self._scrape_url_shallow(url)
+        except Exception as e:
+            if frontier is not None:
+                frontier.page_failed(shallow_page)
+            raise e
+
+        timestamp = get_timestamp()
+        for house in houses:
+            house["TimeStampShallow"] = timestamp
+            house[SEARCH_CITY_COLUMN] = shallow_page.city
+
+        if self.listing_state is not None:
+            self.listing_state.record_seen(houses)
+        if known_pages_stop is not None and known_pages_stop.record(shallow_page, houses):
+            self.logger.info(f"Only known listings on {self.stop_after_known_pages} "
+                             f"consecutive pages of {shallow_page.city}, skipping "
+                             f"its next pages")
+
+        if frontier is not None:
+            houses = frontier.add_page_listings(shallow_page, houses)
+        return houses
 
-        return pages
+    async def _scrape_house_deep(self,
+                                 house: House,
+                                 frontier: Optional[CrawlFrontier] = None) \
+            -> Optional[House]:
+        if self.listing_state is not None:
+            house_deep = self.listing_state.carry_forward(house)
+            if house_deep is not None:
+                return {**house, **house_deep}
+        if not house.get("href"):
+            return house
 
-    async def _get_shallow_urls(self,
-                                city: Optional[str] = None,
-                                pages: Union[None, int, list[int]] = None):
-        pages = await self._get_pages_batches(city=city, pages=pages)
-        return [self._get_city_url(city=city, page=page) for page in pages]
+        try:
+            house_deep = await self._scrape_url_deep(house["href"])
+        except Exception as e:
+            if frontier is not None and not frontier.listing_failed(house):
+                # delivered on resume instead, not twice
+                self.logger.warning(f"Could not scrape deep {house['href']} because "
+                                    f"of {e}, retrying it when the crawl is resumed")
+                return None
+            raise e
+        house_deep["TimeStampDeep"] = get_timestamp()
+
+        if self.listing_state is not None:
+            self.listing_state.update(house, house_deep)
+        return {**house, **house_deep}
 
     async def _scrape_url_shallow(self, url) -> list[House]:
-        soup = await self._get_soup(url)
-        listings = self.config.search_results_items["listings"].retrieve(soup)
-        houses = [self.config.house_items_shallow.retrieve_all(listing) for listing in
-                  listings]
+        body = await self._get_page(url)
+        houses = await self.extraction.listings(body)
         for house in houses:
             house["url_shallow"] = url
         return houses
 
     async def _scrape_url_deep(self, url) -> House:
-        soup = await self._get_soup(url)
-        house = self.config.house_items_deep.retrieve_all(soup)
+        if self.streaming is not None:
+            house = await self._get_page(url, read_body=self.streaming)
+        else:
+            body = await self._get_page(url)
+            house = await self.extraction.house_deep(body)
         house["href"] = url
         return house
 
-    async def _scrape_city_async(
-            self,
-            city: Optional[str] = None,
-            pages: Union[None, int, list[int]] = None,
-            deep=False
-    ) -> Optional[pd.DataFrame]:
-
-        urls_shallow = await self._get_shallow_urls(city, pages)
-
-        houses = await asyncio.gather(*(self._scrape_url_shallow(url) for url in
-                                        urls_shallow)
-                                      )
-
-        shallow_houses_list = list(chain(*houses))
-
-        if not shallow_houses_list:
-            return None
-
-        df_shallow = pd.DataFrame(shallow_houses_list)
-        df_shallow["TimeStampShallow"] = get_timestamp()
-
-        if not deep:
-            return df_shallow
-
-        urls_deep = df_shallow.href.values
-        houses = await asyncio.gather(*(self._scrape_url_deep(url) for url in urls_deep))
-        df_deep = pd.DataFrame(houses)
-        df_deep["TimeStampDeep"] = get_timestamp()
-        return df_shallow.merge(df_deep, on="href")
-
-    async def _get_city_soup(self, city: str, page: int) -> tuple[str, BeautifulSoup]:
+    async def _get_city_soup(self, city: str, page: int) -> tuple[str, Node]:
         url = self._get_city_url(city, page)
         soup = await self._get_soup(url=url)
         return url, soup
 
-    async def _get_soup(self, url: str) -> BeautifulSoup:
-
-        @add_limiter(self.limiter)
-        @add_semaphore(self.semaphore)
-        async def limited_soup(*args, **kwargs):
-            return await get_soup(*args, **kwargs)
+    async def _get_soup(self, url: str) -> Node:
+        body = await self._get_page(url)
+        if body:
+            return self.extraction.plan.parse(body)
 
-        soup = await limited_soup(url,
+    async def _get_page(self, url: str,
+                        read_body: Optional[ReadBodyFn] = None) -> Union[bytes, House]:
+        body = await get_response(url,
                                   header=self.config.website_settings.header,
                                   logger=self.logger,
-                                  parse_only=self.parse_only)
-        if soup:
+                                  session=await self._get_session(),
+                                  cache=self.cache,
+                                  throttle=self.throttle,
+                                  retry_scheduler=self.retry_scheduler,
+                                  read_body=read_body)
+        if body:
             self.logger.info(f"Done requesting {url}")
-            return soup
+            return body
 
     def _get_city_url(self, city: Optional[str] = None, page: int = 1) -> str:
         if city is None:
@@ -309,6 +837,11 @@ class Scraper:
         )
         return num_pages, num_listings
 
+    @property
+    def throttle_stats(self) -> dict:
+        """Current request rate and concurrency granted by the throttle."""
+        return self.throttle.stats
+
     @property
     def num_house_items_shallow(self) -> int:
         return len(self.config.house_items_shallow)
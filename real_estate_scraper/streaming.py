@@ -0,0 +1,236 @@
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional, Callable
+
+import aiohttp
+import cssselect
+import lxml.etree
+from lxml.cssselect import LxmlHTMLTranslator
+
+from real_estate_scraper.configuration import House, RetrieveItemFn
+from real_estate_scraper.extraction import ExtractionPlan
+from real_estate_scraper.matchers import Matcher, find_dd_after_dt
+from real_estate_scraper.parsers import LxmlNode, Node
+
+CHUNK_SIZE = 16 * 1024
+
+
+class StreamingExtraction:
+    """Retrieves the items of a page from its body as it is being received.
+
+    The chunks of the body are fed to an incremental lxml parser. An item is found
+    once the element it selects is complete, as no element later in the page can
+    change which element a matcher selects (except for selectors looking ahead,
+    like :last-child). The matcher of an item is run on the part of the page parsed
+    so far only when an element it could select has just been completed, so every
+    element of the page is tested once against every pending matcher, and the page
+    is not searched again after every chunk. Once all the items are found, or once
+    the `until` element is complete, the rest of the body is not needed.
+
+    Items selecting the last elements of the page (negative index), all of them, or
+    that are missing from the page can only be settled by the end of the page or by
+    the `until` element.
+
+    Args:
+        items (dict): The `Matcher` of each item.
+        until (str, optional): CSS selector of an element after which the page has
+        no items. Defaults to None.
+        encoding (str, optional): The encoding of the body. Defaults to "utf-8".
+    """
+
+    def __init__(self, items: dict[str, Matcher], until: Optional[str] = None,
+                 encoding: str = "utf-8"):
+        self.items = items
+        self.until = until
+        self.pending = {name: matcher for name, matcher in items.items()
+                        if matcher.index >= 0 and not matcher.all}
+        self._can_stop_early = bool(items) and len(self.pending) == len(items)
+        self._subject_tags = {name: _subject_tags(matcher)
+                              for name, matcher in self.pending.items()}
+        self._until_test = _css_test(until) if until else None
+        self._until_tag = _single_tag(_css_subject_tags(until)) if until else None
+        self.bytes_read = 0
+        self.done = False
+        self._parser = lxml.etree.HTMLPullParser(events=("end",), encoding=encoding)
+        self._completed = set()
+        self._root = None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Parse a chunk of the body.
+
+        Returns:
+            bool: True once the rest of the body is not needed.
+        """
+        self.bytes_read += len(chunk)
+        self._parser.feed(chunk)
+        completed = []
+        for _, element in self._parser.read_events():
+            self._completed.add(element)
+            completed.append(element)
+        if not completed:
+            return False
+        if self._root is None:
+            self._root = completed[0].getroottree().getroot()
+
+        by_tag = defaultdict(list)
+        for element in completed:
+            by_tag[element.tag].append(element)
+        if self._until_test and any(map(self._until_test, by_tag[self._until_tag])
+                                    if self._until_tag else
+                                    map(self._until_test, completed)):
+            self.done = True
+            return True
+
+        dt_labels = "\n".join(label for dd in by_tag["dd"] for label in _dt_labels(dd))
+        root = LxmlNode(self._root)
+        for name, matcher in list(self.pending.items()):
+            if self._may_complete(matcher, self._subject_tags[name], completed, by_tag,
+                                  dt_labels) \
+                    and self._is_complete(self._locate(root, matcher)):
+                del self.pending[name]
+        self.done = self._can_stop_early and not self.pending
+        return self.done
+
+    @staticmethod
+    def _may_complete(matcher: Matcher,
+                      tags: Optional[set[str]],
+                      completed: list,
+                      by_tag: dict[str, list],
+                      dt_labels: str) -> bool:
+        """Whether the elements just completed can complete what the matcher
+        selects. A wrong True only costs a search of the page, a wrong False
+        delays the item to the end of the page."""
+        if matcher.dt:
+            return matcher.dt.lower() in dt_labels
+        if matcher.css:
+            candidates = completed if tags is None else \
+                [element for tag in tags for element in by_tag[tag]]
+            return any(map(_css_test(matcher.css), candidates))
+        # any element can change what an XPath expression selects
+        return bool(matcher.xpath)
+
+    def result(self) -> House:
+        """The items retrieved from the part of the page received."""
+        try:
+            self._root = self._parser.close()
+        except lxml.etree.XMLSyntaxError:
+            # nothing was parsed, e.g. an empty body
+            self._root = lxml.etree.Element("html")
+        self._completed.clear()
+        return ExtractionPlan.retrieve_all(self.items, LxmlNode(self._root))
+
+    def _is_complete(self, node: Optional[Node]) -> bool:
+        return node is not None and node.native in self._completed
+
+    @staticmethod
+    def _locate(root: Node, matcher: Matcher) -> Optional[Node]:
+        if matcher.dt:
+            return find_dd_after_dt(root, matcher.dt)
+        if matcher.css:
+            elements = root.select(matcher.css)
+        elif matcher.xpath:
+            # text and attribute values cannot be told complete
+            elements = [element for element in root.xpath(matcher.xpath)
+                        if isinstance(element, Node)]
+        else:
+            return None
+        return elements[matcher.index] if len(elements) > matcher.index else None
+
+
+class StreamingReader:
+    """Reads response bodies with a `StreamingExtraction`, closing the connection as
+    soon as the items are found.
+
+    The reader is given to `html_handling.get_response` in place of reading the
+    whole body, and keeps the statistics of the pages it read.
+
+    Args:
+        items (dict): The retrieve function of each item, all of them `Matcher`s.
+        until (str, optional): See `StreamingExtraction`. Defaults to None.
+        chunk_size (int, optional): Size of the chunks fed to the parser. Defaults
+        to CHUNK_SIZE.
+    """
+
+    def __init__(self, items: dict[str, RetrieveItemFn], until: Optional[str] = None,
+                 chunk_size: int = CHUNK_SIZE):
+        not_matchers = [name for name, retrieve in items.items()
+                        if not isinstance(retrieve, Matcher)]
+        if not_matchers:
+            raise ValueError(f"Streaming requires declarative selectors, but "
+                             f"{not_matchers} are not retrieved by a Matcher")
+        self.items = items
+        self.until = until
+        self.chunk_size = chunk_size
+        self.pages = 0
+        self.stopped_early = 0
+        self.bytes_read = 0
+
+    async def __call__(self, response: aiohttp.ClientResponse) -> House:
+        extraction = StreamingExtraction(self.items, until=self.until,
+                                         encoding=response.charset or "utf-8")
+        async for chunk in response.content.iter_chunked(self.chunk_size):
+            if extraction.feed(chunk):
+                if not response.content.at_eof():
+                    # do not download the rest of the body
+                    response.close()
+                    self.stopped_early += 1
+                break
+
+        self.pages += 1
+        self.bytes_read += extraction.bytes_read
+        return extraction.result()
+
+    def stats_message(self) -> str:
+        return (f"Streaming: {self.stopped_early}/{self.pages} pages closed early, "
+                f"{self.bytes_read / 1024:.0f} KiB read")
+
+
+ElementTest = Callable[[lxml.etree._Element], bool]
+
+
+@lru_cache(maxsize=None)
+def _css_test(css: str) -> ElementTest:
+    """Whether an element matches a CSS selector, looking only at its ancestors."""
+    xpath = lxml.etree.XPath(LxmlHTMLTranslator().css_to_xpath(css, prefix="self::"))
+    return lambda element: bool(xpath(element))
+
+
+def _css_subject_tags(css: str) -> Optional[set[str]]:
+    """The tags of the elements a CSS selector can select, None for any tag."""
+    tags = set()
+    try:
+        for selector in cssselect.parse(css):
+            tree = selector.parsed_tree
+            while not isinstance(tree, cssselect.parser.Element):
+                tree = tree.subselector \
+                    if isinstance(tree, cssselect.parser.CombinedSelector) \
+                    else tree.selector
+            if tree.element is None:
+                return None
+            tags.add(tree.element.lower())
+    except AttributeError:
+        return None
+    return tags
+
+
+def _single_tag(tags: Optional[set[str]]) -> Optional[str]:
+    return next(iter(tags)) if tags is not None and len(tags) == 1 else None
+
+
+def _subject_tags(matcher: Matcher) -> Optional[set[str]]:
+    if matcher.dt:
+        return {"dd"}
+    if matcher.css:
+        return _css_subject_tags(matcher.css)
+    return None
+
+
+def _dt_labels(dd: lxml.etree._Element) -> list[str]:
+    # the dt elements between the previous dd and this one, as in DtDdIndex
+    labels = []
+    for sibling in dd.itersiblings(preceding=True):
+        if sibling.tag == "dd":
+            break
+        if sibling.tag == "dt":
+            labels.append(LxmlNode(sibling).text(strip=False).lower())
+    return labels
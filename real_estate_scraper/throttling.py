@@ -0,0 +1,258 @@
+import asyncio
+import time
+from asyncio import Semaphore
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Optional, AsyncIterator, Protocol, runtime_checkable, \
+    AsyncContextManager
+from urllib.parse import urlparse
+
+from aiolimiter import AsyncLimiter
+
+# responses signalling that the host is overloaded
+BACKOFF_STATUSES = (429, 503)
+
+
+def get_host(url: str) -> str:
+    return urlparse(url).netloc
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header, given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+@runtime_checkable
+class Throttle(Protocol):
+    """Controls when and how many requests can be sent to a host."""
+
+    def slot(self, url: str) -> AsyncContextManager[None]:
+        """Async context manager held for the duration of a request."""
+
+    def record(self,
+               url: str,
+               status: Optional[int],
+               latency: float,
+               retry_after: Optional[str] = None):
+        """Record the outcome of a request. A None status signals a timeout."""
+
+    @property
+    def stats(self) -> dict:
+        pass
+
+    @property
+    def max_concurrency(self) -> int:
+        """Upper bound of the number of active requests."""
+
+
+class FixedThrottle:
+    """A throttle with a fixed request rate and a fixed number of active requests.
+
+    The semaphore and the rate limiter are bound to the event loop using them, so
+    they are created anew when the throttle is used from another loop, e.g. by
+    the asynchronous API after the synchronous one.
+
+    Args:
+        max_active_requests (int): The maximum number of active requests.
+        requests_per_sec (float): The maximum number of requests per second.
+    """
+
+    def __init__(self, max_active_requests: int, requests_per_sec: float):
+        self.max_active_requests = max_active_requests
+        self.requests_per_sec = requests_per_sec
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._create_primitives()
+
+    def _create_primitives(self):
+        self.semaphore = Semaphore(value=self.max_active_requests)
+        self.limiter = AsyncLimiter(1, round(1 / self.requests_per_sec, 3))
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._loop is not None:
+                self._create_primitives()
+            self._loop = loop
+        async with self.limiter:
+            async with self.semaphore:
+                yield
+
+    def record(self,
+               url: str,
+               status: Optional[int],
+               latency: float,
+               retry_after: Optional[str] = None):
+        pass
+
+    @property
+    def stats(self) -> dict:
+        return {"rate": self.requests_per_sec,
+                "concurrency": self.max_active_requests}
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.max_active_requests
+
+
+@dataclass
+class HostState:
+    """Rate and concurrency currently granted to a host."""
+
+    rate: float
+    concurrency: float
+    active: int = 0
+    next_send_at: float = 0.0
+    blocked_until: float = 0.0
+    last_decrease_at: float = 0.0
+    latency: Optional[float] = None
+    condition: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+
+class AdaptiveThrottle:
+    """A throttle adapting the request rate and concurrency of each host (AIMD).
+
+    While a host answers promptly, its rate and concurrency grow additively; when
+    it pushes back with a 429/503 response or a timeout, they are cut
+    multiplicatively, at most once per `cooldown` seconds so that the requests
+    already in flight do not compound the cut. A Retry-After header pauses all
+    requests to the host until the given time. Responses slower than
+    `latency_factor` times the moving average latency shrink the rate gently. The
+    rate and concurrency of the hosts are kept when the throttle is used from
+    another event loop, while their asyncio conditions are created anew.
+
+    Args:
+        initial_rate (float): Requests per second granted to a new host.
+        initial_concurrency (int): Active requests granted to a new host.
+        min_rate (float, optional): Lower bound of the rate. Defaults to 0.2.
+        max_rate (float, optional): Upper bound of the rate. Defaults to 50.
+        min_concurrency (int, optional): Lower bound of the concurrency.
+        Defaults to 1.
+        max_concurrency (int, optional): Upper bound of the concurrency.
+        Defaults to 50.
+        rate_increase (float, optional): Additive increase of the rate, in
+        requests per second, for each second of healthy responses. Defaults to 0.5.
+        decrease_factor (float, optional): Multiplicative decrease applied on
+        pushback. Defaults to 0.5.
+        latency_factor (float, optional): Ratio to the average latency above which
+        a response is considered slow. Defaults to 3.
+        cooldown (float, optional): Minimum seconds between two decreases.
+        Defaults to 2.
+    """
+
+    def __init__(self,
+                 initial_rate: float,
+                 initial_concurrency: int,
+                 min_rate: float = 0.2,
+                 max_rate: float = 50.0,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 50,
+                 rate_increase: float = 0.5,
+                 decrease_factor: float = 0.5,
+                 latency_factor: float = 3.0,
+                 cooldown: float = 2.0):
+        self.initial_rate = initial_rate
+        self.initial_concurrency = initial_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate_increase = rate_increase
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self._hosts: dict[str, HostState] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _state(self, url: str) -> HostState:
+        host = get_host(url)
+        if host not in self._hosts:
+            self._hosts[host] = HostState(rate=self.initial_rate,
+                                          concurrency=self.initial_concurrency)
+        return self._hosts[host]
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop:
+            # the requests of the previous loop are over
+            for state in self._hosts.values():
+                state.condition = asyncio.Condition()
+                state.active = 0
+        self._loop = loop
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        self._bind_loop()
+        state = self._state(url)
+        async with state.condition:
+            await state.condition.wait_for(
+                lambda: state.active < int(state.concurrency)
+            )
+            state.active += 1
+
+        try:
+            now = time.monotonic()
+            send_at = max(now, state.next_send_at, state.blocked_until)
+            state.next_send_at = send_at + 1 / state.rate
+            if send_at > now:
+                await asyncio.sleep(send_at - now)
+            yield
+        finally:
+            async with state.condition:
+                state.active -= 1
+                state.condition.notify_all()
+
+    def record(self,
+               url: str,
+               status: Optional[int],
+               latency: float,
+               retry_after: Optional[str] = None):
+        state = self._state(url)
+        now = time.monotonic()
+
+        retry_after_seconds = parse_retry_after(retry_after)
+        if retry_after_seconds:
+            state.blocked_until = max(state.blocked_until, now + retry_after_seconds)
+
+        if status is None or status in BACKOFF_STATUSES:
+            self._decrease(state, now, self.decrease_factor)
+            return
+
+        if status >= 400:
+            return
+
+        if state.latency is not None and latency > self.latency_factor * state.latency:
+            self._decrease(state, now, (1 + self.decrease_factor) / 2)
+        else:
+            # additive increase: + rate_increase per second of healthy responses
+            state.rate = min(state.rate + self.rate_increase / state.rate,
+                             self.max_rate)
+            state.concurrency = min(state.concurrency + 1 / state.concurrency,
+                                    self.max_concurrency)
+        state.latency = latency if state.latency is None else \
+            0.9 * state.latency + 0.1 * latency
+
+    def _decrease(self, state: HostState, now: float, factor: float):
+        if now - state.last_decrease_at < self.cooldown:
+            return
+        state.last_decrease_at = now
+        state.rate = max(state.rate * factor, self.min_rate)
+        state.concurrency = max(state.concurrency * factor, self.min_concurrency)
+
+    @property
+    def stats(self) -> dict:
+        return {host: {"rate": round(state.rate, 2),
+                       "concurrency": int(state.concurrency),
+                       "active": state.active}
+                for host, state in self._hosts.items()}
@@ -5,7 +5,7 @@ import pandas as pd
 
 from real_estate_scraper.database import load_data
 from real_estate_scraper.geolocalization import GoogleGeolocator
-from real_estate_scraper.save import write_to_sqlite
+from real_estate_scraper.save import SQLiteSink
 from tqdm import tqdm
 
 from real_estate_scraper.utils import split_list
@@ -27,14 +27,16 @@ geolocator = GoogleGeolocator(api_key=API_KEY)
 
 table_name_coordinates = f"{table_name}_coordinates"
 
-for chunk in tqdm(chunks, total=len(chunks)):
-    coordinates = geolocator.retrieve_coordinates_from_queries(chunk)
+# the coordinates are upserted by query, so running the script again adds no duplicate
+with SQLiteSink(database_name, table_name_coordinates, key="query") as sink:
+    for chunk in tqdm(chunks, total=len(chunks)):
+        coordinates = geolocator.retrieve_coordinates_from_queries(chunk)
 
-    df_coordinates = pd.DataFrame(coordinates).dropna()
+        df_coordinates = pd.DataFrame(coordinates).dropna()
 
-    df_final = df_coordinates.assign(
-        Address=df_coordinates.apply(lambda x: x['query'].split(", ")[0], axis=1),
-        PostCode=df_coordinates.apply(lambda x: x['query'].split(", ")[1], axis=1)
-    )[['Address', 'PostCode', 'latitude', 'longitude']]
+        df_final = df_coordinates.assign(
+            Address=df_coordinates.apply(lambda x: x['query'].split(", ")[0], axis=1),
+            PostCode=df_coordinates.apply(lambda x: x['query'].split(", ")[1], axis=1)
+        )[['query', 'Address', 'PostCode', 'latitude', 'longitude']]
 
-    write_to_sqlite(df_final, table_name_coordinates, database_name=database_name)
+        sink.write(df_final)
@@ -0,0 +1,87 @@
+"""Per-page time of the dt/dd items of deep pages: one tree scan per item (the
+previous approach) against the single-pass DtDdIndex.
+
+Usage:
+    python scripts/benchmark_dt_dd_index.py funda saved_page_1.html saved_page_2.html
+    python scripts/benchmark_dt_dd_index.py immobiliare saved_page.html
+
+Without saved pages, a synthetic page with as many dt/dd pairs as deep items is used.
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from bs4 import BeautifulSoup
+
+from real_estate_scraper.html_inspection import find_dd_after_dt
+from real_estate_scraper.parsers import parse_html
+
+REPEAT = 20
+
+
+def scan_per_item(soup: BeautifulSoup, text_in_website: str):
+    dt = soup.find(
+        lambda tag: tag.name == "dt" and text_in_website.lower() in tag.text.lower()
+    )
+    if dt:
+        return list(dt.find_next("dd").stripped_strings)
+    return None
+
+
+def index_lookup(soup, text_in_website: str):
+    dd = find_dd_after_dt(soup, text_in_website)
+    if dd:
+        return dd.strings()
+    return None
+
+
+def get_config(site: str):
+    if site == "funda":
+        from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+        return funda_config
+    from real_estate_scraper.countries.italy.immobiliare import immobiliare_config
+    return immobiliare_config
+
+
+def synthetic_page(texts: list[str]) -> bytes:
+    filler = "<div><p>Lorem ipsum <span>dolor</span> sit amet</p></div>" * 200
+    dl = "".join(f"<dt>{text.capitalize()}</dt><dd><span>value {i}</span></dd>"
+                 for i, text in enumerate(texts))
+    return f"<html><body>{filler}<dl>{dl}</dl>{filler}</body></html>".encode()
+
+
+def time_per_page(func, repeat: int = REPEAT) -> float:
+    t0 = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - t0) / repeat * 1000
+
+
+def main(site: str, paths: list[str]):
+    config = get_config(site)
+    texts = [item.text_in_website for item in config.house_items_deep
+             if item.text_in_website]
+    pages = [Path(path).read_bytes() for path in paths] or [synthetic_page(texts)]
+
+    print(f"{site}: {len(texts)} dt/dd items, {len(pages)} page(s), ms per page")
+    for i, page in enumerate(pages, start=1):
+        soup = BeautifulSoup(page, "lxml")
+        scan = time_per_page(lambda: [scan_per_item(soup, text) for text in texts])
+
+        results = {}
+        for parser in ("beautifulsoup", "lxml"):
+            # a new document per run, as the index is memoized on it
+            documents = iter([parse_html(page, parser=parser) for _ in range(REPEAT)])
+            results[parser] = time_per_page(
+                lambda: (lambda document: [index_lookup(document, text)
+                                           for text in texts])(next(documents))
+            )
+
+        print(f"page {i}: scan per item {scan:.2f}, "
+              f"index on beautifulsoup {results['beautifulsoup']:.2f} "
+              f"({scan / results['beautifulsoup']:.0f}x), "
+              f"index on lxml {results['lxml']:.2f} ({scan / results['lxml']:.0f}x)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "funda", sys.argv[2:])
@@ -7,6 +7,6 @@ from real_estate_scraper.countries.netherlands.funda_scraper import \
 module_path = Path(__file__)
 module_name = module_path.stem
 logger = create_logger(module_name)
-scraper = get_funda_scraper(logger=logger)
 
-df = scraper.download_to_dataframe(city=None, pages=1)
+with get_funda_scraper(logger=logger) as scraper:
+    df = scraper.download_to_dataframe(city=None, pages=1)
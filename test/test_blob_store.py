@@ -0,0 +1,34 @@
+import pandas as pd
+
+from real_estate_scraper.blob_store import BlobStore, text_hash
+
+DESCRIPTION = "A spacious family house with a sunny back garden. " * 40
+
+
+def test_store_and_load(tmp_path):
+    df = pd.DataFrame({"href": ["/huis-1/", "/huis-2/", "/huis-3/"],
+                       "Description": [DESCRIPTION, None, DESCRIPTION + "!"]})
+
+    with BlobStore(tmp_path / "blobs.db") as store:
+        stored = store.store(df, ["Description", "Missing"])
+        assert stored.Description.tolist() == [text_hash(DESCRIPTION), None,
+                                                text_hash(DESCRIPTION + "!")]
+        assert df.Description.tolist()[0] == DESCRIPTION
+        assert (store.blobs_written, store.blobs_reused) == (2, 0)
+        assert store.bytes_written < len(DESCRIPTION) / 10
+
+    with BlobStore(tmp_path / "blobs.db") as store:
+        # unchanged texts are stored once
+        store.store(df, ["Description"])
+        assert (store.blobs_written, store.blobs_reused) == (0, 2)
+
+        loaded = store.load(stored, ["Description"])
+        assert loaded.Description.tolist() == [DESCRIPTION, None, DESCRIPTION + "!"]
+        assert loaded.href.tolist() == df.href.tolist()
+        assert store.get(text_hash(DESCRIPTION)) == DESCRIPTION
+        assert store.get(text_hash("unknown")) is None
+
+        # inline texts, e.g. of rows written without the store, are left as is
+        mixed = pd.DataFrame({"Description": ["inline", stored.Description[0]]})
+        assert store.load(mixed, ["Description"]).Description.tolist() == \
+               ["inline", DESCRIPTION]
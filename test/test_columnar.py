@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+
+from real_estate_scraper.columnar import RecordColumns, concat_tables, \
+    arrow_to_dataframe, pa
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.parsing import get_retrieval_statistics
+from real_estate_scraper.scraper import Scraper
+
+RECORDS = [
+    {"Price": "€ 450,000", "City": "Delft", "href": "/huis-1/"},
+    {"Price": None, "City": "Delft", "href": "/huis-2/", "Garden": "Back garden"},
+    {"City": "Leiden", "href": "/huis-3/"},
+]
+
+
+def test_record_columns():
+    records = RecordColumns(columns=["Price", "City", "Rooms"])
+    records.extend(RECORDS)
+
+    assert len(records) == 3
+    assert list(records.columns) == ["Price", "City", "Rooms", "href", "Garden"]
+    assert records.column("Garden") == [None, "Back garden", None]
+    assert records.column("Rooms") == [None, None, None]
+    assert records.column("Missing") == [None, None, None]
+
+    items_list = ["Price", "City", "Rooms", "Garden"]
+    df = pd.DataFrame(RECORDS).reindex(columns=items_list)
+    assert records.retrieval_statistics(items_list) == \
+           get_retrieval_statistics(df, items_list)
+
+
+def test_record_columns_to_dataframe():
+    records = RecordColumns(columns=["Price", "City"], dictionary_columns=["City"])
+    records.extend(RECORDS)
+    df = records.to_dataframe()
+
+    assert df.City.dtype == "category"
+    assert df.City.tolist() == ["Delft", "Delft", "Leiden"]
+    assert df.href.tolist() == ["/huis-1/", "/huis-2/", "/huis-3/"]
+    assert df.Price.isna().tolist() == [False, True, True]
+
+
+@pytest.mark.skipif(pa is None, reason="requires pyarrow")
+def test_arrow_batches():
+    first = RecordColumns(dictionary_columns=["City"])
+    first.extend(RECORDS)
+    second = RecordColumns(dictionary_columns=["City"])
+    second.extend([{"Price": "€ 1", "City": "Gouda", "Garden": None, "href": "/4/"},
+                   {"Price": 12, "City": "Delft", "Garden": None, "href": "/5/"}])
+
+    tables = [first.to_arrow(), second.to_arrow()]
+    assert pa.types.is_dictionary(tables[0].schema.field("City").type)
+    assert pa.types.is_null(tables[1].schema.field("Garden").type)
+    # numbers mixed with text are kept as text
+    assert tables[1].column("Price").to_pylist() == ["€ 1", "12"]
+
+    table = concat_tables(tables)
+    assert table.num_rows == 5
+    assert table.column("City").num_chunks == 2
+
+    df = arrow_to_dataframe(table)
+    assert df.City.dtype == "category"
+    assert df.City.tolist() == ["Delft", "Delft", "Leiden", "Gouda", "Delft"]
+    assert df.Garden.tolist()[1] == "Back garden"
+    assert df.Garden.isna().sum() == 4
+
+
+@pytest.mark.skipif(pa is None, reason="requires pyarrow")
+def test_arrow_batches_with_schema():
+    schema = pa.schema([("Latitude", pa.string()), ("City", pa.string())])
+    first = RecordColumns(schema=schema)
+    first.extend([{"Latitude": 52.01, "City": "Delft", "Rooms": 3}])
+    second = RecordColumns(schema=schema)
+    second.extend([{"Latitude": "n/a", "City": None, "Rooms": "3 rooms"}])
+
+    # without the schema, Latitude would be double then string
+    table = concat_tables([first.to_arrow(), second.to_arrow()])
+    assert table.schema.field("Latitude").type == pa.string()
+    assert table.column("Latitude").to_pylist() == ["52.01", "n/a"]
+    assert table.column("Rooms").to_pylist() == ["3", "3 rooms"]
+
+
+def test_scraper_batches_categories():
+    record = {"href": "/huis-1/", "url_shallow": "https://www.funda.nl/1",
+              "TimeStampShallow": "2024-01-01", "SearchCity": "Delft",
+              "EnergyLabel": "A"}
+    for normalize in (False, True):
+        records = Scraper(funda_config, normalize=normalize)._new_record_columns([])
+        records.append(record)
+        df = records.to_dataframe()
+        categories = {column for column in df.columns
+                      if df[column].dtype == "category"}
+        # the repetitive columns are encoded whether the dataframe is normalized
+        assert categories == {"url_shallow", "TimeStampShallow", "SearchCity",
+                              "EnergyLabel"}
+        assert df.href.dtype != "category"
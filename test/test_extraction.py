@@ -0,0 +1,138 @@
+import asyncio
+import dataclasses
+import json
+import pickle
+
+import pytest
+
+from real_estate_scraper.countries.italy.immobiliare import immobiliare_config
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.extraction import ExtractionExecutor, ExtractionPlan, \
+    Extractor, extract_listings, extract_house_deep, select_one, script_json, find_once
+from real_estate_scraper.parsers import parse_html
+from test.test_parsers import FUNDA_SEARCH, FUNDA_DETAIL, IMMOBILIARE_SEARCH, \
+    IMMOBILIARE_DETAIL, NEXT_DATA
+
+FUNDA_PLAN = ExtractionPlan.compile(funda_config)
+IMMOBILIARE_PLAN = ExtractionPlan.compile(immobiliare_config)
+
+SEARCH_NEXT_DATA = {"props": {"pageProps": {"dehydratedState": {"queries": [
+    {"state": {"data": {"count": 1234, "maxPages": 80, "results": [
+        {"realEstate": {"id": 1, "title": "Trilocale via Roma",
+                        "price": {"value": 250000, "formattedValue": "€ 250.000"},
+                        "properties": [{"surface": "90 m²", "rooms": "3",
+                                        "bathrooms": "1",
+                                        "floor": {"abbreviation": "2"}}]},
+         "seo": {"url": "https://www.immobiliare.it/annunci/1/"}}]}}}]}}}}
+
+
+def test_extractor():
+    extractor = Extractor.of(select_one, css="h2")
+    soup = parse_html(b"<html><body><h2> Street <b>1</b></h2></body></html>")
+
+    assert extractor.function == "real_estate_scraper.extraction:select_one"
+    assert extractor(soup) == "Street1"
+    assert pickle.loads(pickle.dumps(extractor)) == extractor
+    with pytest.raises(ValueError):
+        Extractor.of(lambda soup: soup.select_one("h2"))
+
+
+def test_script_json_decoded_once(monkeypatch):
+    soup = parse_html(b'<html><body><script type="application/json">{"a": 1}</script>'
+                      b'<script type="application/json"> </script>'
+                      b'<p class="x">text</p></body></html>', parser="lxml")
+    decoded = []
+    monkeypatch.setattr("real_estate_scraper.extraction.json_loads",
+                        lambda text: decoded.append(text) or {"a": 1})
+
+    test_cases = [
+        ({"index": 0}, {"a": 1}),
+        ({"index": 0}, {"a": 1}),
+        ({"index": -1}, None),
+    ]
+    for kwargs, expected in test_cases:
+        assert script_json(soup, 'script[type="application/json"]', **kwargs) == expected
+    assert decoded == ['{"a": 1}']
+    assert find_once(soup, "p.x") is find_once(soup, "p.x")
+
+
+def test_extraction_plan_picklable():
+    for config in (funda_config, immobiliare_config):
+        plan = ExtractionPlan.compile(config)
+        assert plan.picklable
+        assert pickle.loads(pickle.dumps(plan)) == plan
+
+    config_plan = ExtractionPlan(house_items_deep={"Address": lambda soup: None})
+    assert not config_plan.picklable
+    with pytest.raises(TypeError):
+        ExtractionExecutor(config_plan, workers=2, kind="process")
+    ExtractionExecutor(config_plan, workers=2, kind="thread").close()
+
+
+@pytest.mark.parametrize("workers, kind", [(0, "process"), (2, "thread"), (2, "process")])
+def test_extraction_executor(workers, kind):
+    search, detail = FUNDA_SEARCH.encode(), FUNDA_DETAIL.encode()
+    executor = ExtractionExecutor(FUNDA_PLAN, workers=workers, kind=kind)
+
+    async def run():
+        return await asyncio.gather(executor.listings(search),
+                                    executor.house_deep(detail),
+                                    executor.house_deep(detail))
+
+    try:
+        listings, house, same_house = asyncio.run(run())
+    finally:
+        executor.close()
+
+    assert listings == extract_listings(search, FUNDA_PLAN)
+    assert [listing["HouseId"] for listing in listings] == ["42", "43"]
+    assert house == same_house == extract_house_deep(detail, FUNDA_PLAN)
+    assert house["Latitude"] == 52.01
+
+
+def test_extraction_executor_kind():
+    with pytest.raises(ValueError):
+        ExtractionExecutor(FUNDA_PLAN, workers=2, kind="cluster")
+
+
+def test_json_first_extraction(monkeypatch):
+    search = IMMOBILIARE_SEARCH.replace(
+        "</body>", '<script type="application/json" id="__NEXT_DATA__">'
+                   f'{json.dumps(SEARCH_NEXT_DATA)}</script></body>').encode()
+    html_plan = dataclasses.replace(IMMOBILIARE_PLAN, json_listings=None,
+                                    json_house_deep=None)
+
+    assert extract_listings(search, IMMOBILIARE_PLAN) == \
+           extract_listings(search, html_plan)
+    assert extract_house_deep(IMMOBILIARE_DETAIL.encode(), IMMOBILIARE_PLAN) == \
+           extract_house_deep(IMMOBILIARE_DETAIL.encode(), html_plan)
+
+    def parse(self, body):
+        raise AssertionError("The page was parsed")
+
+    with monkeypatch.context() as m:
+        m.setattr(ExtractionPlan, "parse", parse)
+        listings = extract_listings(search, IMMOBILIARE_PLAN)
+        house = extract_house_deep(IMMOBILIARE_DETAIL.encode(), IMMOBILIARE_PLAN)
+    assert listings[0]["Price"] == "€ 250.000"
+    assert listings[0]["href"] == "https://www.immobiliare.it/annunci/1/"
+    assert house["City"] == "Milano"
+    assert house["Locali"] == "3"
+    assert house["AltreCaratteristiche"] == "Cantina,Balcone"
+    assert house["Riscaldamento"] == "Autonomo, a radiatori"
+    assert house["Contratto"] is None
+
+    # Without the features the location is read from the JSON, the rest from the HTML
+    detail = json.dumps(NEXT_DATA).replace('"mainData"', '"otherData"')
+    page = IMMOBILIARE_DETAIL.replace(json.dumps(NEXT_DATA), detail).encode()
+    assert extract_house_deep(page, IMMOBILIARE_PLAN) == \
+           extract_house_deep(page, html_plan)
+
+    # Without __NEXT_DATA__ the items are retrieved from the HTML
+    test_cases = [
+        (IMMOBILIARE_SEARCH, extract_listings),
+        (IMMOBILIARE_DETAIL.replace("__NEXT_DATA__", "other"), extract_house_deep),
+    ]
+    for page, extract in test_cases:
+        assert extract(page.encode(), IMMOBILIARE_PLAN) == \
+               extract(page.encode(), html_plan)
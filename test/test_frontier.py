@@ -0,0 +1,100 @@
+import asyncio
+import logging
+
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.frontier import CrawlFrontier, DONE, FAILED, PENDING
+from real_estate_scraper.pipeline import ShallowPage
+from real_estate_scraper.scraper import Scraper
+
+PAGE = ShallowPage(city="delft", page=1)
+HOUSES = [{"href": "a", "Price": "1"}, {"href": "b", "Price": "2"},
+          {"href": None, "Price": "3"}]
+
+
+def test_num_pages(tmp_path):
+    frontier = CrawlFrontier(tmp_path / "frontier.db")
+    assert frontier.get_num_pages("delft") is None
+    frontier.set_num_pages("delft", 12)
+    frontier.set_num_pages(None, 3)
+    assert frontier.get_num_pages("delft") == 12
+    assert frontier.get_num_pages(None) == 3
+
+
+def test_resume_pending_listings(tmp_path):
+    path = tmp_path / "frontier.db"
+    frontier = CrawlFrontier(path)
+    assert frontier.page_status(PAGE) == (PENDING, 0)
+    assert frontier.add_page_listings(PAGE, HOUSES) == HOUSES
+    frontier.mark_done(HOUSES[:1])
+    frontier.close()
+
+    resumed = CrawlFrontier(path)
+    assert resumed.page_status(PAGE) == (DONE, 0)
+    # the listing without href is kept too, identified by its items
+    assert resumed.pending_listings(PAGE) == HOUSES[1:]
+    assert resumed.add_page_listings(PAGE, HOUSES) == HOUSES[1:]
+    assert resumed.stats == {"shallow_pages": {DONE: 1},
+                             "listings": {DONE: 1, PENDING: 2}}
+    resumed.mark_done([{"Price": "3"}])
+    assert resumed.pending_listings(PAGE) == [HOUSES[1]]
+
+
+def test_failures_and_retries(tmp_path):
+    frontier = CrawlFrontier(tmp_path / "frontier.db", max_retries=2)
+    frontier.page_failed(PAGE)
+    assert frontier.page_status(PAGE) == (FAILED, 1)
+    assert not frontier.page_given_up(PAGE)
+    frontier.page_failed(PAGE)
+    assert frontier.page_given_up(PAGE)
+
+    frontier.add_page_listings(PAGE, HOUSES[:2])
+    assert not frontier.listing_failed(HOUSES[0])
+    frontier.mark_done(HOUSES[:2])
+    assert frontier.pending_listings(PAGE) == [HOUSES[0]]
+    assert frontier.listing_failed(HOUSES[0])
+    assert frontier.pending_listings(PAGE) == []
+    assert frontier.add_page_listings(PAGE, HOUSES[:2]) == []
+
+
+def test_retried_listing_done(tmp_path):
+    frontier = CrawlFrontier(tmp_path / "frontier.db")
+    frontier.add_page_listings(PAGE, HOUSES[:2])
+    frontier.listing_failed(HOUSES[0])
+    frontier.mark_done(HOUSES[:2])
+
+    # retried on resume, and delivered this time
+    assert frontier.pending_listings(PAGE) == [HOUSES[0]]
+    frontier.mark_done(HOUSES[:1])
+    assert frontier.stats["listings"] == {DONE: 2}
+
+
+def test_resumed_crawl_delivers_every_listing_once(tmp_path):
+    failures = {"b": 1}
+
+    async def scrape_url_shallow(url):
+        return [{"href": "a"}, {"href": "b"}, {"Price": "3"}]
+
+    async def scrape_url_deep(url):
+        if failures.get(url):
+            failures[url] -= 1
+            raise ValueError("not a listing page")
+        return {"Status": "Available"}
+
+    async def crawl():
+        scraper = Scraper(funda_config, logger=logging.getLogger("test"))
+        scraper._scrape_url_shallow = scrape_url_shallow
+        scraper._scrape_url_deep = scrape_url_deep
+        frontier = CrawlFrontier(tmp_path / "frontier.db")
+        try:
+            return [house async for house in scraper.iter_houses(
+                "delft", pages=[1], deep=True, frontier=frontier)]
+        finally:
+            frontier.close()
+
+    # the failed listing is not delivered shallow only, but on resume
+    first = asyncio.run(crawl())
+    assert sorted(house.get("href") or "" for house in first) == ["", "a"]
+    second = asyncio.run(crawl())
+    assert [(house["href"], house["Status"]) for house in second] == \
+           [("b", "Available")]
+    assert asyncio.run(crawl()) == []
@@ -0,0 +1,53 @@
+import asyncio
+from functools import partial
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from geopy import GoogleV3
+
+from real_estate_scraper import geolocalization
+from real_estate_scraper.geolocalization import GoogleGeolocator, SharedSessionAdapter
+from real_estate_scraper.html_handling import create_session
+
+
+def test_shared_session_adapter():
+    async def run():
+        async with create_session() as session:
+            adapter = SharedSessionAdapter(proxies=None, ssl_context=None,
+                                           session=session)
+            async with adapter:
+                assert adapter.session is session
+            return session.closed
+
+    # the session belongs to its owner, not to the geocoder
+    assert asyncio.run(run()) is False
+
+
+def test_geolocator_reuses_pooled_session(monkeypatch):
+    client_ports = set()
+
+    async def geocode(request):
+        client_ports.add(request.transport.get_extra_info("peername")[1])
+        location = {"lat": 52.01, "lng": 4.36}
+        return web.json_response({"status": "OK", "results": [
+            {"geometry": {"location": location},
+             "formatted_address": request.query["address"]}]})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/maps/api/geocode/json", geocode)
+        async with TestServer(app) as server, create_session() as session:
+            monkeypatch.setattr(geolocalization, "GoogleV3",
+                                partial(GoogleV3, domain=f"{server.host}:{server.port}",
+                                        scheme="http"))
+            geolocator = GoogleGeolocator("key", max_active_requests=1,
+                                          requests_per_sec=1000, session=session)
+            results = await geolocator.retrieve_coordinates_async(["Delft", "Leiden",
+                                                                   "Gouda"])
+            return results, session.closed
+
+    results, closed = asyncio.run(run())
+    assert [result["latitude"] for result in results] == [52.01] * 3
+    # one keep-alive connection of the pooled session for all the queries
+    assert len(client_ports) == 1
+    assert not closed
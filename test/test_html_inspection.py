@@ -0,0 +1,53 @@
+import pytest
+
+from real_estate_scraper.html_inspection import find_dd_after_dt, \
+    get_dd_text_from_dt_name, extract_all_dd_text
+from real_estate_scraper.matchers import DtDdIndex
+from real_estate_scraper.parsers import parse_html, PARSERS, LexborHTMLParser
+
+BACKENDS = [parser for parser in PARSERS
+            if parser != "selectolax" or LexborHTMLParser is not None]
+
+PAGE = b"""<html><body>
+<dl><dt>Asking price per m\xc2\xb2</dt><dd>3,750</dd>
+<dt>Asking price</dt><dd><span>450,000</span> <span>k.k.</span></dd>
+<dt>Kind of <b>House</b></dt><dt>Type</dt><dd>Villa</dd></dl>
+<div><dt>Energy label</dt><p><dd>A</dd></p></div>
+<dl><dt>Garden</dt></dl>
+</body></html>"""
+
+
+@pytest.mark.parametrize("parser", BACKENDS)
+def test_find_dd_after_dt(parser):
+    soup = parse_html(PAGE, parser=parser)
+    test_cases = [
+        ("asking price", "3,750"),
+        ("Asking price per m", "3,750"),
+        ("kind of house", "Villa"),
+        ("type", "Villa"),
+        ("ENERGY LABEL", "A"),
+        ("garden", None),
+        ("volume", None),
+    ]
+    for text_in_website, expected in test_cases:
+        dd = find_dd_after_dt(soup, text_in_website)
+        assert (dd.text() if dd else None) == expected
+
+
+def test_dt_dd_index_built_once():
+    soup = parse_html(PAGE, parser="lxml")
+    builds = []
+
+    def build(node):
+        builds.append(node)
+        return DtDdIndex(node)
+
+    for _ in range(3):
+        soup.memo(DtDdIndex, build)
+    assert len(builds) == 1
+
+    find_dd_after_dt(soup, "asking price")
+    assert soup.memo(DtDdIndex, build) is soup.memo(DtDdIndex, DtDdIndex)
+    assert get_dd_text_from_dt_name(soup, "asking price per") == "3,750"
+    assert extract_all_dd_text(soup, ["asking price", "garden"]) == {
+        "asking price": "3,750", "garden": None}
@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from real_estate_scraper.html_handling import fetch
+from real_estate_scraper.http_cache import ResponseCache
+
+
+def test_cache_key():
+    test_cases = [
+        ({"accept-language": "en"}, {"Accept-Language": "en"}, True),
+        ({"accept-language": "en"}, {"accept-language": "nl"}, False),
+        ({"user-agent": "a"}, {"user-agent": "b"}, True),
+    ]
+    for header_1, header_2, same in test_cases:
+        key_1 = ResponseCache.key("https://www.funda.nl", header=header_1)
+        key_2 = ResponseCache.key("https://www.funda.nl", header=header_2)
+        assert (key_1 == key_2) == same, f"For {header_1} and {header_2}, expected " \
+                                         f"same key: {same}"
+
+
+def test_store_and_read(tmp_path):
+    cache = ResponseCache(tmp_path, ttl=60)
+    key = cache.key("https://www.funda.nl/1")
+    assert cache.lookup(key) is None
+
+    cache.store(key, "https://www.funda.nl/1", b"<html></html>", etag='"v1"')
+    entry = cache.lookup(key)
+    assert entry.is_fresh(cache.ttl)
+    assert entry.conditional_headers == {"If-None-Match": '"v1"'}
+    assert cache.read(entry) == b"<html></html>"
+    assert cache.stats == {"hits": 1, "revalidated": 0, "misses": 1}
+    cache.close()
+
+    reopened = ResponseCache(tmp_path, ttl=0)
+    entry = reopened.lookup(key)
+    assert not entry.is_fresh(reopened.ttl)
+    assert reopened.size == len(b"<html></html>")
+    # the access times of the reads are written by batches
+    accessed_at = reopened._conn.execute("SELECT accessed_at FROM entries").fetchone()
+    reopened.read(entry)
+    assert reopened._conn.execute("SELECT accessed_at FROM entries").fetchone() == \
+           accessed_at
+    reopened.close()
+    reopened = ResponseCache(tmp_path)
+    assert reopened._conn.execute("SELECT accessed_at FROM entries").fetchone() > \
+           accessed_at
+
+    # the body of an entry deleted after its lookup is a miss
+    entry = reopened.lookup(key)
+    reopened._body_path(key).unlink()
+    assert reopened.read(entry) is None
+    assert reopened.lookup(key) is None
+    assert reopened.size == 0
+
+
+def test_default_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = ResponseCache()
+    assert cache.folder == tmp_path / "http_cache"
+    assert cache._conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    cache.close()
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path, max_size=25)
+    keys = [cache.key(f"https://www.funda.nl/{i}") for i in range(3)]
+
+    cache.store(keys[0], "url_0", b"0" * 10)
+    time.sleep(0.01)
+    cache.store(keys[1], "url_1", b"1" * 10)
+    time.sleep(0.01)
+    cache.read(cache.lookup(keys[0]))
+    cache.store(keys[2], "url_2", b"2" * 10)
+
+    assert cache.lookup(keys[0]) is not None
+    assert cache.lookup(keys[1]) is None
+    assert cache.lookup(keys[2]) is not None
+    assert cache.size == 20
+
+
+def test_max_age_eviction(tmp_path):
+    cache = ResponseCache(tmp_path, max_age=0)
+    key = cache.key("https://www.funda.nl/1")
+    cache.store(key, "url", b"body")
+    cache.evict()
+    assert cache.lookup(key) is None
+    assert cache.size == 0
+
+
+def test_eviction_only_when_needed(tmp_path):
+    cache = ResponseCache(tmp_path, max_size=25)
+    evictions = 0
+    evict = cache.evict
+
+    def counting_evict():
+        nonlocal evictions
+        evictions += 1
+        evict()
+
+    cache.evict = counting_evict
+    for i in range(3):
+        cache.store(cache.key(f"https://www.funda.nl/{i}"), f"url_{i}", b"0" * 10)
+    # the expired entries on the first store, the size limit on the last one
+    assert evictions == 2
+    assert cache.size == 20
+
+
+def test_conditional_revalidation(tmp_path):
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+    conditional_headers = []
+
+    async def listing(request):
+        conditional_headers.append((request.headers.get("If-None-Match"),
+                                    request.headers.get("If-Modified-Since")))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"',
+                                                     "Last-Modified": last_modified})
+        return web.Response(body=b"<html>listing</html>", headers={"ETag": '"v1"'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/huis-1/", listing)
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            url = str(server.make_url("/huis-1/"))
+            return [await fetch(session, url, cache=cache) for _ in range(3)]
+
+    cache = ResponseCache(tmp_path, ttl=0)
+    assert asyncio.run(run()) == [b"<html>listing</html>"] * 3
+    # the validators of the 304 response are sent on the next revalidation
+    assert conditional_headers == [(None, None), ('"v1"', None),
+                                   ('"v1"', last_modified)]
+    assert cache.stats == {"hits": 2, "revalidated": 2, "misses": 1}
+
+
+def test_revalidated_body_deleted(tmp_path):
+    requests_headers = []
+
+    async def listing(request):
+        requests_headers.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.Response(body=b"<html>listing</html>", headers={"ETag": '"v1"'})
+
+    cache = ResponseCache(tmp_path, ttl=0)
+    lookup = cache.lookup
+
+    def lookup_then_delete(key):
+        # the body is evicted, e.g. by another process, during the request
+        entry = lookup(key)
+        cache._body_path(key).unlink(missing_ok=True)
+        return entry
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/huis-1/", listing)
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            url = str(server.make_url("/huis-1/"))
+            first = await fetch(session, url, cache=cache)
+            cache.lookup = lookup_then_delete
+            return first, await fetch(session, url, cache=cache)
+
+    assert asyncio.run(run()) == (b"<html>listing</html>",) * 2
+    # downloaded again without the validators of the deleted body
+    assert requests_headers == [None, '"v1"', None]
+    assert cache.stats == {"hits": 0, "revalidated": 0, "misses": 2}
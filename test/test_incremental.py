@@ -0,0 +1,138 @@
+import asyncio
+import logging
+
+from real_estate_scraper import html_handling
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.incremental import ListingStateStore, KnownPagesStop, fingerprint
+from real_estate_scraper.pipeline import ShallowPage
+from real_estate_scraper.scraper import Scraper
+from test.test_scraper import FakeWebsite, create_scraper
+
+
+def test_fingerprint_ignores_timestamps():
+    house = {"href": "/a", "Price": 100, "TimeStampShallow": "2023-01-01"}
+    same_house = {**house, "TimeStampShallow": "2023-02-01"}
+    cheaper_house = {**house, "Price": 90}
+
+    assert fingerprint(house) == fingerprint(same_house)
+    assert fingerprint(house) != fingerprint(cheaper_house)
+    assert fingerprint(house, ["href"]) == fingerprint(cheaper_house, ["href"])
+
+    moved_house = {**house, "url_shallow": "/koop/delft/p2", "SearchCity": "delft"}
+    assert fingerprint({**house, "url_shallow": "/koop/delft/p1"}) == \
+           fingerprint(moved_house)
+
+
+def test_moved_listing_not_scraped_deep(tmp_path):
+    store = ListingStateStore(tmp_path / "state.db")
+    scraper = Scraper(funda_config, logger=logging.getLogger("test"),
+                      listing_state=store)
+    deep_requests = []
+
+    async def scrape_url_deep(url):
+        deep_requests.append(url)
+        return {"Description": "Nice"}
+
+    scraper._scrape_url_deep = scrape_url_deep
+    house = {"href": "/a", "Price": "€ 100", "url_shallow": "/koop/delft/p1",
+             "SearchCity": "delft", "TimeStampShallow": "2023-01-01"}
+    moved_house = {**house, "url_shallow": "/koop/delft/p2",
+                   "TimeStampShallow": "2023-01-02"}
+
+    assert asyncio.run(scraper._scrape_house_deep(house))["Description"] == "Nice"
+    assert asyncio.run(scraper._scrape_house_deep(moved_house))["Description"] == \
+           "Nice"
+    assert deep_requests == ["/a"]
+    store.close()
+
+
+def test_carry_forward(tmp_path):
+    store = ListingStateStore(tmp_path / "state.db", fingerprint_items=["href", "Price"])
+    house = {"href": "/a", "Price": 100, "Address": "Street 1"}
+    house_deep = {"Description": "Nice", "TimeStampDeep": "2023-01-01"}
+
+    assert store.carry_forward(house) is None
+    store.update(house, house_deep)
+
+    test_cases = [
+        (house, house_deep),
+        ({**house, "Address": "Street 1a"}, house_deep),
+        ({**house, "Price": 90}, None),
+        ({**house, "href": "/b"}, None),
+    ]
+    for listing, expected in test_cases:
+        assert store.carry_forward(listing) == expected
+
+    assert (store.unchanged, store.changed) == (2, 3)
+    store.close()
+
+    reopened = ListingStateStore(tmp_path / "state.db", fingerprint_items=["href", "Price"])
+    assert reopened.carry_forward(house) == house_deep
+    reopened.close()
+
+
+def test_record_seen(tmp_path):
+    store = ListingStateStore(tmp_path / "state.db")
+    house = {"href": "/a", "Price": 100}
+    store.record_seen([house, {"href": None}])
+
+    assert store.known_hrefs() == {"/a"}
+    # seen on a results page only, the listing has no deep items to carry forward
+    assert store.carry_forward(house) is None
+    store.update(house, {"Description": "Nice"})
+    store.record_seen([house])
+    assert store.carry_forward(house) == {"Description": "Nice"}
+    store.close()
+
+
+def test_known_pages_stop():
+    seen = {"/a", "/b", "/c"}
+    known = [{"href": "/a"}, {"href": "/b"}]
+    new = [{"href": "/a"}, {"href": "/new"}]
+
+    test_cases = [
+        # consecutive_pages, recorded pages, expected first skipped page
+        (1, [(1, new), (2, known)], 3),
+        (2, [(1, known), (2, new), (3, known)], None),
+        (2, [(3, known), (1, new), (2, known)], 4),
+        (2, [(5, known), (4, known), (2, known), (3, known)], 4),
+        (1, [(1, [])], None),
+    ]
+    for consecutive_pages, recorded, expected in test_cases:
+        stop = KnownPagesStop(seen, consecutive_pages=consecutive_pages)
+        for page, houses in recorded:
+            stop.record(ShallowPage("delft", page), houses)
+
+        skipped = [page for page in range(1, 8)
+                   if stop.is_exhausted(ShallowPage("delft", page))]
+        assert skipped == ([] if expected is None else list(range(expected, 8)))
+        assert not stop.is_exhausted(ShallowPage("leiden", 7))
+
+
+def test_known_pages_stop_reports_once():
+    stop = KnownPagesStop({"/a"})
+    page_houses = [{"href": "/a"}]
+
+    assert stop.record(ShallowPage("delft", 2), page_houses)
+    assert not stop.record(ShallowPage("delft", 1), page_houses)
+    assert stop.is_exhausted(ShallowPage("delft", 2))
+    assert stop.pages_skipped == 1
+
+
+def test_shallow_incremental_run_stops_early(tmp_path, monkeypatch):
+    website = FakeWebsite()
+    monkeypatch.setattr(html_handling, "fetch", website.fetch)
+    store = ListingStateStore(tmp_path / "state.db")
+    pages = list(range(1, 21))
+
+    with create_scraper(website, listing_state=store) as scraper:
+        assert len(scraper.download_to_dataframe("delft", pages=pages)) == 60
+    assert website.started == len(pages)
+
+    website.started = 0
+    with create_scraper(website, listing_state=store,
+                        stop_after_known_pages=1) as scraper:
+        scraper.download_to_dataframe("delft", pages=pages)
+    # the first page is known: only the pages already in flight were requested
+    assert website.started <= KnownPagesStop.PAGES_IN_FLIGHT
+    store.close()
@@ -0,0 +1,96 @@
+import pickle
+
+import pytest
+
+from real_estate_scraper.configuration import Item, ScraperConfig, WebsiteConfig, \
+    SearchResultsHouseItems, HouseHouseItemsShallow
+from real_estate_scraper.matchers import Matcher
+from real_estate_scraper.parsers import parse_html
+from test.test_parsers import BACKENDS
+
+PAGE = b"""<html><body>
+<div class="card"><a class="title" href="/house-1/"> Via Roma <b>1</b></a>
+<span class="price">1.234.500 EUR</span></div>
+<div class="card"><a class="title" href="/house-2/">Via Po</a></div>
+<div class="pages"><a>1</a> <a>2</a> <a>1,066</a></div>
+<dl><dt>Stato</dt><dd><span>Ottimo</span><span>Ristrutturato</span></dd></dl>
+<script type="application/json">{"items": [{"lat": 45.4}, {"lat": 45.5}]}</script>
+</body></html>"""
+
+
+@pytest.mark.parametrize("parser", BACKENDS)
+def test_matcher(parser):
+    soup = parse_html(PAGE, parser=parser)
+
+    test_cases = [
+        ({"css": "a.title"}, "Via Roma1"),
+        ({"css": "a.title", "separator": " "}, "Via Roma 1"),
+        ({"css": "a.title", "index": -1}, "Via Po"),
+        ({"css": "a.title", "attr": "href", "post": [["prefix", "https://a.it"]]},
+         "https://a.it/house-1/"),
+        ({"css": "span.price", "post": [["number", ",", "."], "int"]}, 1234500),
+        ({"css": "span.price", "post": [["regex", r"(\d+)\.\d+"]]}, "1"),
+        ({"css": "div.pages", "separator": " ", "post": ["max_int"]}, 1066),
+        ({"css": "div.missing", "default": 1}, 1),
+        ({"dt": "stato", "text": "first"}, "Ottimo"),
+        ({"dt": "stato", "separator": ","}, "Ottimo,Ristrutturato"),
+        ({"dt": "bagni"}, None),
+        ({"css": 'script[type="application/json"]', "json_path": "items.-1.lat"}, 45.5),
+        ({"css": 'script[type="application/json"]', "json_path": "items.5.lat"}, None),
+    ]
+    for selector, expected in test_cases:
+        assert Matcher.compile(selector)(soup) == expected
+
+    cards = Matcher.compile({"css": "div.card", "all": True})(soup)
+    assert [Matcher.compile({"css": "a"})(card) for card in cards] == \
+           ["Via Roma1", "Via Po"]
+
+
+def test_matcher_xpath():
+    soup = parse_html(PAGE, parser="lxml")
+
+    test_cases = [
+        ({"xpath": "//a[@class='title']"}, "Via Roma1"),
+        ({"xpath": "//a[@class='title']/@href", "index": 1}, "/house-2/"),
+        ({"xpath": "count(//div[@class='card'])", "post": ["float", "int"]}, 2),
+    ]
+    for selector, expected in test_cases:
+        assert Matcher.compile(selector)(soup) == expected
+    with pytest.raises(NotImplementedError):
+        Matcher.compile({"xpath": "//a"})(parse_html(PAGE, parser="beautifulsoup"))
+
+
+def test_matcher_validation():
+    test_cases = [
+        {"css": "a", "xpath": "//a"},
+        {"json_path": "a.b"},
+        {"css": "a", "text": "last"},
+        {"css": "a", "post": ["upper"]},
+        {"css": "a", "attribute": "href"},
+    ]
+    for selector in test_cases:
+        with pytest.raises(TypeError):
+            Matcher.compile(selector)
+
+
+def test_item_selector():
+    item = Item(name="Status", text_in_website="Stato",
+                selector={"dt": True, "text": "first"})
+    matcher = pickle.loads(pickle.dumps(item.retrieve))
+
+    assert matcher == Matcher(dt="Stato", text="first")
+    assert matcher(parse_html(PAGE, parser="lxml")) == "Ottimo"
+
+    items = {"type": "text", "selector": {"xpath": "//a"}}
+    with pytest.raises(TypeError):
+        ScraperConfig(
+            website_settings=WebsiteConfig(name="a", main_url="https://a.it",
+                                           city_search_url_template="{city}{page}",
+                                           default_city="", parser="beautifulsoup"),
+            search_results_items=SearchResultsHouseItems(number_of_pages=items,
+                                                         number_of_listings=items,
+                                                         listings=items),
+            house_items_shallow=HouseHouseItemsShallow(Address=items,
+                                                       LivingArea=items,
+                                                       Price=items, href=items),
+            house_items_deep=None)
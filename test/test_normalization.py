@@ -0,0 +1,88 @@
+import pandas as pd
+
+from real_estate_scraper.countries.italy.immobiliare import immobiliare_config
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.normalization import numeric_series, integer_series, \
+    category_series, rooms_and_bedrooms, dutch_postcode_and_city, normalize_dataframe, \
+    split_columns
+from real_estate_scraper.parsing import extract_numeric_value, \
+    extract_rooms_and_bedrooms, extract_dutch_postcode_and_city
+
+
+def test_numeric_series():
+    strings = ["300000 k.k.", "300.000,23", "100 m2", "120.2 m2", "€ 450,000 k.k.",
+               "m2m 30000 k.k.", "m2m a30000 k.k.", "", None]
+    test_cases = [
+        {"decimal_delimiter": ".", "thousands_delimiter": ","},
+        {"decimal_delimiter": ",", "thousands_delimiter": "."},
+        {"decimal_delimiter": ".", "thousands_delimiter": "'"},
+    ]
+    for delimiters in test_cases:
+        result = numeric_series(pd.Series(strings), **delimiters)
+        expected = [extract_numeric_value(string, **delimiters) for string in strings]
+        pd.testing.assert_series_equal(result, pd.Series(expected, dtype="float64"))
+
+    assert numeric_series(pd.Series([52.01, None, -4.5])).tolist()[2] == -4.5
+    assert numeric_series(pd.Series([52.01, "4.36"])).tolist() == [52.01, 4.36]
+
+
+def test_typed_series():
+    integers = integer_series(pd.Series(["5 rooms", "2.5", None, "12"]))
+    assert integers.dtype == "Int64"
+    assert integers.isna().tolist() == [False, True, True, False]
+    assert (integers[0], integers[3]) == (5, 12)
+
+    categories = category_series(pd.Series([" A ", "B", "A", "", None]))
+    assert categories.dtype == "category"
+    assert sorted(categories.cat.categories) == ["A", "B"]
+    assert categories.isna().tolist() == [False, False, False, True, True]
+
+
+def test_vectorized_parsers():
+    strings = ["4 rooms (3 bedrooms)", "6 rooms", "1 room (1 bedroom)", "3", None]
+    rooms = rooms_and_bedrooms(pd.Series(strings))
+    for string, (room, bedroom) in zip(strings, rooms.itertuples(index=False)):
+        expected = extract_rooms_and_bedrooms(string)
+        assert [None if pd.isna(value) else value for value in (room, bedroom)] == \
+               list(expected)
+
+    strings = ["3191 XC Hoogvliet Rotterdam", "1234 Rotterdam", "Rotterdam"]
+    postcodes = dutch_postcode_and_city(pd.Series(strings))
+    for string, row in zip(strings, postcodes.itertuples(index=False)):
+        expected = extract_dutch_postcode_and_city(string) or (None, None, None)
+        assert tuple(None if pd.isna(value) else value for value in row) == expected
+
+
+def test_normalize_dataframe():
+    funda = pd.DataFrame({"Price": ["€ 450,000 k.k.", None], "Rooms": ["5", None],
+                          "HouseId": ["42", "43"], "Address": ["Markt 1", None],
+                          "EnergyLabel": ["A", "A"], "Latitude": [52.01, None],
+                          "TimeStampShallow": ["2023-01-01", "2023-01-01"]})
+    df = normalize_dataframe(funda, funda_config)
+
+    assert df.dtypes.astype(str).to_dict() == {
+        "Price": "float64", "Rooms": "Int64", "HouseId": "Int64",
+        "Address": str(funda.Address.dtype), "EnergyLabel": "category",
+        "Latitude": "float64", "TimeStampShallow": str(funda.TimeStampShallow.dtype)}
+    assert df.Price.tolist()[0] == 450000.0
+    assert df.Price.isna().tolist() == [False, True]
+
+    funda = pd.DataFrame({"RoomsDeep": ["4 rooms (3 bedrooms)", "6 rooms", None],
+                          "PostCode": ["2611 AB Delft", "1234 Rotterdam", None]},
+                         index=[3, 4, 5])
+    df = normalize_dataframe(funda, funda_config)
+    assert df.Bedrooms.dtype == "Int64"
+    assert df.Bedrooms.isna().tolist() == [False, True, True]
+    assert df.Bedrooms[3] == 3
+    assert df.City.dtype == "category"
+    postcodes = df[["PostCodeDigits", "PostCodeLetters", "City"]].astype(object)
+    assert postcodes.where(postcodes.notna(), None).values.tolist() == [
+        ["2611", "AB", "Delft"], ["1234", None, "Rotterdam"], [None, None, None]]
+    # the items are kept
+    pd.testing.assert_series_equal(df.PostCode, funda.PostCode)
+
+    immobiliare = pd.DataFrame({"Price": ["€ 1.250.000", "€ 99.500,50"]})
+    assert normalize_dataframe(immobiliare, immobiliare_config).Price.tolist() == \
+           [1250000.0, 99500.5]
+    # immobiliare has no postcode, its City item is not split from one
+    assert split_columns(immobiliare_config) == {}
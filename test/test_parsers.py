@@ -0,0 +1,262 @@
+import json
+import re
+from functools import partial
+
+import pytest
+from bs4 import BeautifulSoup
+from bs4.element import SoupStrainer
+
+from real_estate_scraper.countries.italy.immobiliare import immobiliare_config
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.parsers import parse_html, PARSERS, LexborHTMLParser
+from real_estate_scraper.parsing import str_from_tag
+
+BACKENDS = [parser for parser in PARSERS
+            if parser != "selectolax" or LexborHTMLParser is not None]
+
+PARSE_ONLY = SoupStrainer(funda_config.website_settings.parse_only)
+
+FUNDA_SEARCH = """<html><head><title>Koop</title></head><body>
+<script type="application/ld+json">{}</script>
+<script type="application/ld+json">{}</script>
+<script type="application/ld+json">{"results_total": 1234}</script>
+<div class="search-result-content-inner">
+  <a data-object-url-tracking="resultlist" data-search-result-item-anchor="42"
+     href="/koop/delft/huis-42/"><h2> Oude Delft <span>12</span> </h2>
+  <h4>2611 AB Delft</h4></a>
+  <span title="Living area">120 m²</span><span title="Plot size">200 m²</span>
+  <span class="search-result-price">€ 450,000 k.k.</span>
+  <ul class="search-result-kenmerken"><li>120 m²</li><li>5 rooms</li></ul>
+</div>
+<div class="search-result-content-inner">
+  <a data-object-url-tracking="resultlist" data-search-result-item-anchor="43"
+     href="/koop/delft/appartement-43/"><h2>Markt 1<!-- A --></h2></a>
+  <span class="search-result-price">€ 250,000 v.o.n.</span>
+  <ul class="search-result-kenmerken"><li>60 m²</li></ul>
+</div>
+<div class="pagination-pages"><a>1</a> <a>2</a> <span>…</span> <a>1,066</a></div>
+</body></html>"""
+
+FUNDA_DETAIL = """<html><body>
+<span class="object-header__subtitle">2611 AB Delft <small>Centrum</small></span>
+<div class="object-description-body"> A <b>lovely</b> house.<br/>Near the canal. </div>
+<dl>
+  <dt>Asking price</dt><dd><span>€ 450,000 kosten koper</span> <span>extra</span></dd>
+  <dt>Asking price per m²</dt><dd>€ 3,750</dd>
+  <dt>Kind of <b>house</b></dt><dd>Villa, detached</dd>
+  <dt>Year of construction</dt><dd>1990</dd>
+  <dt>Living area</dt><dd>
+     120 m²
+  </dd>
+  <dt>Energy label</dt><dd><span class="label">A</span> <script>var x = 1;</script></dd>
+  <dt>Garden</dt>
+</dl>
+<script type="application/json">{"other": true}</script>
+<script type="application/json">{"lat": 52.01, "lng": 4.36}</script>
+</body></html>"""
+
+IMMOBILIARE_SEARCH = """<html><body>
+<div class="in-searchList__title">1.234 case in vendita</div>
+<div class="nd-mediaObject__content in-card__content in-realEstateListCard__content">
+  <a class="in-card__title" href="https://www.immobiliare.it/annunci/1/">Trilocale via Roma</a>
+  <ul>
+    <li class="nd-list__item in-feat__item in-feat__item--main in-realEstateListCard__features--main">€ 250.000</li>
+    <li aria-label="locali">3</li><li aria-label="superficie">90 m²</li>
+    <li aria-label="bagno">1</li><li aria-label="piano">2</li>
+  </ul>
+</div>
+<div data-cy="pagination-list"><div>1</div><div>2</div><div>...</div><div>80</div></div>
+</body></html>"""
+
+NEXT_DATA = {"props": {"pageProps": {"detailData": {"realEstate": {"properties": [
+    {"location": {"latitude": 45.46, "longitude": 9.19, "city": "Milano",
+                  "province": "Milano", "region": "Lombardia", "macrozone": "Centro",
+                  "microzone": None, "address": "via Roma", "streetNumber": "1"},
+     "mainData": [
+         {"title": "Caratteristiche", "rows": [
+             {"label": "Stato", "value": "Ottimo / Ristrutturato"},
+             {"label": "Piano", "value": "2° piano, con ascensore"},
+             {"label": "Locali", "value": 3},
+             {"label": "Altre caratteristiche", "value": ["Cantina", "Balcone"]}]},
+         {"title": "Efficienza energetica", "rows": [
+             {"label": "Riscaldamento", "value": "Autonomo, a radiatori"}]}]}]}}}}}
+
+IMMOBILIARE_DETAIL = f"""<html><body><dl>
+<dt>Stato</dt><dd>Ottimo / Ristrutturato</dd>
+<dt>Piano</dt><dd>2° piano, con ascensore</dd>
+<dt>Locali</dt><dd>3</dd>
+<dt>Altre caratteristiche</dt><dd><span>Cantina</span><span>Balcone</span></dd>
+</dl><dl>
+<dt>Riscaldamento</dt><dd>Autonomo, a radiatori</dd>
+</dl>
+<script id="__NEXT_DATA__" type="application/json">{json.dumps(NEXT_DATA)}</script>
+</body></html>"""
+
+
+# The BeautifulSoup extractors the configurations used before the parser backends,
+# kept as the reference of the parity tests
+
+
+def legacy_attribute_deep(soup, text_in_website, join=False):
+    dt = soup.find(
+        lambda tag: tag.name == "dt" and text_in_website.lower() in tag.text.lower()
+    )
+    if dt:
+        strings = list(dt.find_next("dd").stripped_strings)
+        return ','.join(strings) if join else strings[0]
+    return None
+
+
+def legacy_max_num_pages(tag):
+    numbers = [int(number) for child in tag.contents
+               for number in re.findall(r"\d+", child.text.replace(",", ""))]
+    return max(numbers)
+
+
+def legacy_funda_location(soup):
+    text = str_from_tag(soup.find_all("script", attrs={"type": "application/json"})[-1])
+    location = json.loads(text)
+    return location["lat"], location["lng"]
+
+
+LEGACY_FUNDA_SHALLOW = {
+    "Address": lambda soup: soup.find("h2"),
+    "PostCode": lambda soup: soup.find("h4"),
+    "LivingArea": lambda soup: soup.find(attrs={"title": "Living area"}),
+    "PlotSize": lambda soup: soup.find(attrs={"title": "Plot size"}),
+    "Price": lambda soup: soup.find("span", class_="search-result-price"),
+    "Rooms": lambda soup: soup.find("ul", class_="search-result-kenmerken")
+    .find_all("li")[1],
+    "href": lambda soup: "https://www.funda.nl" + soup.find(
+        "a", attrs={"data-object-url-tracking": "resultlist"}).get("href"),
+    "HouseId": lambda soup: soup.find(
+        "a", attrs={"data-object-url-tracking": "resultlist"}
+    ).get("data-search-result-item-anchor"),
+}
+
+LEGACY_IMMOBILIARE_SHALLOW = {
+    "Address": lambda soup: soup.find("a", attrs={"class": "in-card__title"}),
+    "LivingArea": lambda soup: soup.find("li", attrs={"aria-label": "superficie"}),
+    "Price": lambda soup: soup.find("li",
+                                    class_="nd-list__item in-feat__item "
+                                           "in-feat__item--main "
+                                           "in-realEstateListCard__features--main"),
+    "Rooms": lambda soup: soup.find("li", attrs={"aria-label": "locali"}),
+    "Floor": lambda soup: soup.find("li", attrs={"aria-label": "piano"}),
+    "Bathrooms": lambda soup: soup.find("li", attrs={"aria-label": "bagno"}),
+    "NumberOfApartments": lambda soup: soup.find("li",
+                                                 attrs={"aria-label": "tipologie"}),
+    "href": lambda soup: soup.find("a", attrs={"class": "in-card__title"}).get("href"),
+}
+
+
+def legacy_retrieve(func_map, soup):
+    house = {}
+    for name, func in func_map.items():
+        try:
+            house[name] = str_from_tag(func(soup))
+        except Exception:
+            house[name] = None
+    return house
+
+
+def legacy_funda_deep(soup):
+    house = {}
+    for item in funda_config.house_items_deep:
+        func = partial(legacy_attribute_deep, text_in_website=item.text_in_website)
+        house[item.name] = legacy_retrieve({item.name: func}, soup)[item.name]
+    house["Neighbourhood"] = str_from_tag(
+        soup.find("span", class_="object-header__subtitle"))
+    house["Description"] = str_from_tag(
+        soup.find("div", class_="object-description-body"))
+    house["Latitude"], house["Longitude"] = legacy_funda_location(soup)
+    return house
+
+
+def legacy_immobiliare_deep(soup):
+    text = soup.find("script", attrs={"type": "application/json",
+                                      "id": "__NEXT_DATA__"}).text
+    location = json.loads(text)["props"]["pageProps"]["detailData"]["realEstate"][
+        "properties"][0]["location"]
+    keys = {"Latitude": "latitude", "Longitude": "longitude", "City": "city",
+            "Province": "province", "Region": "region", "Microzone": "microzone",
+            "Macrozone": "macrozone", "StreetNumber": "streetNumber",
+            "AddressDeep": "address"}
+    house = {}
+    for item in immobiliare_config.house_items_deep:
+        if item.name in keys:
+            house[item.name] = location.get(keys[item.name])
+        else:
+            house[item.name] = legacy_attribute_deep(soup, item.text_in_website,
+                                                     join=True)
+    return house
+
+
+@pytest.mark.parametrize("parser", BACKENDS)
+def test_node_api(parser):
+    html = "<html><body><div class='a b'><h2> Street <span>1</span> </h2>" \
+           "<!-- comment --><script>var x;</script> tail &amp; more" \
+           "<div class='a'>in</div></div><dl><dt>A</dt><dd> x <br/> y</dd></dl>" \
+           "</body></html>"
+    root = parse_html(html.encode(), parser=parser)
+    div = root.select_one("div.a")
+
+    assert div.name == "div"
+    assert div.attr("class") == "a b"
+    assert div.attr("missing") is None
+    assert div.strings() == ["Street", "1", "tail & more", "in"]
+    assert div.text() == "Street1tail & morein"
+    assert div.text(separator=" ") == "Street 1 tail & more in"
+    assert [node.text() for node in div.select("div")] == ["in"]
+    assert root.select_one("script").text() == "var x;"
+    assert [node.name for node in root.select("dt, dd")] == ["dt", "dd"]
+    assert root.select_one("dd").strings() == ["x", "y"]
+    assert root.select_one("table") is None
+
+
+@pytest.mark.parametrize("parser", BACKENDS)
+def test_funda_parity(parser):
+    legacy_search = BeautifulSoup(FUNDA_SEARCH, "lxml", parse_only=PARSE_ONLY)
+    search = parse_html(FUNDA_SEARCH.encode(), parser=parser, parse_only=PARSE_ONLY)
+
+    items = funda_config.search_results_items
+    assert items.number_of_pages.retrieve(search) == legacy_max_num_pages(
+        legacy_search.find("div", class_="pagination-pages")) == 1066
+    assert items.number_of_listings.retrieve(search) == 1234
+
+    legacy_listings = legacy_search.find_all("div", class_="search-result-content-inner")
+    listings = items.listings.retrieve(search)
+    assert len(listings) == len(legacy_listings) == 2
+    for listing, legacy_listing in zip(listings, legacy_listings):
+        expected = legacy_retrieve(LEGACY_FUNDA_SHALLOW, legacy_listing)
+        assert funda_config.house_items_shallow.retrieve_all(listing) == expected
+
+    legacy_detail = BeautifulSoup(FUNDA_DETAIL, "lxml", parse_only=PARSE_ONLY)
+    detail = parse_html(FUNDA_DETAIL.encode(), parser=parser, parse_only=PARSE_ONLY)
+    house = funda_config.house_items_deep.retrieve_all(detail)
+    assert house == legacy_funda_deep(legacy_detail)
+    assert house["PriceDeep"] == "€ 450,000 kosten koper"
+    assert house["PricePerSquareMeter"] == "€ 3,750"
+    assert house["Latitude"] == 52.01
+
+
+@pytest.mark.parametrize("parser", BACKENDS)
+def test_immobiliare_parity(parser):
+    legacy_search = BeautifulSoup(IMMOBILIARE_SEARCH, "lxml")
+    search = parse_html(IMMOBILIARE_SEARCH.encode(), parser=parser)
+
+    items = immobiliare_config.search_results_items
+    assert items.number_of_pages.retrieve(search) == legacy_max_num_pages(
+        legacy_search.find("div", attrs={"data-cy": "pagination-list"})) == 80
+    assert items.number_of_listings.retrieve(search) == 1234
+
+    listings = items.listings.retrieve(search)
+    assert len(listings) == 1
+    expected = legacy_retrieve(LEGACY_IMMOBILIARE_SHALLOW, legacy_search)
+    assert immobiliare_config.house_items_shallow.retrieve_all(listings[0]) == expected
+
+    legacy_detail = BeautifulSoup(IMMOBILIARE_DETAIL, "lxml")
+    detail = parse_html(IMMOBILIARE_DETAIL.encode(), parser=parser)
+    house = immobiliare_config.house_items_deep.retrieve_all(detail)
+    assert house == legacy_immobiliare_deep(legacy_detail)
+    assert house["AltreCaratteristiche"] == "Cantina,Balcone"
@@ -0,0 +1,127 @@
+import asyncio
+
+from aiohttp import ClientConnectionError
+
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.pipeline import CrawlPipeline, ShallowPage
+from real_estate_scraper.retrying import RetryScheduler, RetryPolicy
+from real_estate_scraper.scraper import Scraper
+
+PAGES = [ShallowPage(city="delft", page=page) for page in range(1, 6)]
+
+
+async def scrape_shallow(page: ShallowPage) -> list[dict]:
+    await asyncio.sleep(0.001 * page.page)
+    if page.page == 3:
+        return []
+    if page.page == 4:
+        raise ValueError("not a results page")
+    return [{"href": f"{page.page}-{i}"} for i in range(3)]
+
+
+async def scrape_deep(house: dict) -> dict:
+    if house["href"] == "5-1":
+        raise ValueError("not a listing page")
+    return {**house, "Status": "Available"}
+
+
+def collect(pipeline: CrawlPipeline, pages) -> list[dict]:
+    async def run():
+        return [record async for record in pipeline.run(pages)]
+
+    return asyncio.run(run())
+
+
+def test_shallow_pipeline():
+    pipeline = CrawlPipeline(scrape_shallow, workers=2)
+    records = collect(pipeline, PAGES)
+    assert sorted(record["href"] for record in records) == \
+           ["1-0", "1-1", "1-2", "2-0", "2-1", "2-2", "5-0", "5-1", "5-2"]
+    assert pipeline.pages_done == 5
+    assert pipeline.failed_pages == 1
+
+
+def test_duplicate_pages():
+    async def slow_deep(house):
+        await asyncio.sleep(0.01)
+        return house
+
+    pages = [PAGES[0], PAGES[0], PAGES[1]]
+    pipeline = CrawlPipeline(scrape_shallow, slow_deep, workers=4)
+    assert len(collect(pipeline, pages)) == 9
+    assert pipeline.pages_done == 3
+
+
+def test_more_workers_than_queue_size():
+    pipeline = CrawlPipeline(scrape_shallow, workers=8, queue_size=2)
+    assert len(collect(pipeline, PAGES)) == 9
+    pipeline = CrawlPipeline(scrape_shallow, scrape_deep, workers=8, queue_size=2)
+    assert len(collect(pipeline, PAGES)) == 9
+
+
+def test_deep_pipeline():
+    pipeline = CrawlPipeline(scrape_shallow, scrape_deep, workers=3, queue_size=1)
+    records = collect(pipeline, PAGES)
+    assert len(records) == 9
+    assert [record for record in records if "Status" not in record] == \
+           [{"href": "5-1"}]
+    assert pipeline.failed_listings == 1
+    assert pipeline.pages_done == 5
+
+
+def test_async_iterable_pages():
+    async def pages():
+        for page in PAGES[:2]:
+            yield page
+
+    pipeline = CrawlPipeline(scrape_shallow, scrape_deep)
+    assert len(collect(pipeline, pages())) == 6
+
+
+def test_early_exit_cancels_workers():
+    started = 0
+
+    async def slow_deep(house):
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        return house
+
+    async def run():
+        pipeline = CrawlPipeline(scrape_shallow, slow_deep, workers=2, queue_size=2)
+        async for _ in pipeline.run(PAGES):
+            break
+        await asyncio.sleep(0.05)
+        return started
+
+    assert asyncio.run(run()) < 9
+
+
+def test_backoff_does_not_stall_healthy_listings():
+    scheduler = RetryScheduler(policies={"connection": RetryPolicy(
+        max_retries=1, base_delay=0.2, max_delay=0.2)}, logger=None)
+    scheduler._log = lambda msg: None
+    throttle = asyncio.Semaphore(1)
+    attempts = {}
+    finished = []
+
+    async def deep(house):
+        async def attempt():
+            async with throttle:
+                attempts[house["href"]] = attempts.get(house["href"], 0) + 1
+                if house["href"].endswith("-0") and attempts[house["href"]] == 1:
+                    raise ClientConnectionError("reset")
+                return house
+
+        record = await scheduler.run(house["href"], attempt)
+        finished.append(record["href"])
+        return record
+
+    # with as many workers as flaky listings, the healthy ones would wait
+    pipeline = CrawlPipeline(scrape_shallow, deep, workers=4)
+    assert len(collect(pipeline, PAGES[:2])) == 6
+    assert set(finished[:4]) == {"1-1", "1-2", "2-1", "2-2"}
+
+    scraper = Scraper(funda_config, max_active_requests=3)
+    assert scraper._create_pipeline(deep=True).workers == 12
+    assert Scraper(funda_config, pipeline_workers=5)._create_pipeline().workers == 5
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientResponseError, ClientConnectionError
+from multidict import CIMultiDict
+
+from real_estate_scraper.retrying import RetryPolicy, RetryScheduler, classify_error, \
+    default_retry_policies
+
+
+def response_error(status: int, headers: dict = None) -> ClientResponseError:
+    return ClientResponseError(request_info=None, history=(), status=status,
+                               headers=CIMultiDict(headers or {}))
+
+
+def test_classify_error():
+    test_cases = [
+        (response_error(404), "not_found"),
+        (response_error(410), "not_found"),
+        (response_error(403), "client_error"),
+        (response_error(429), "throttled"),
+        (response_error(408), "server_error"),
+        (response_error(503), "server_error"),
+        (asyncio.TimeoutError(), "timeout"),
+        (ClientConnectionError(), "connection"),
+        (ValueError(), "other"),
+    ]
+    for error, expected in test_cases:
+        result = classify_error(error)
+        assert result == expected, f"For {error!r}, expected {expected} but got " \
+                                   f"{result}"
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=10)
+    for retry, upper_bound in [(1, 1), (2, 2), (3, 4), (5, 10), (10, 10)]:
+        for _ in range(20):
+            assert 0 <= policy.delay(retry) <= upper_bound
+    assert policy.delay(1, retry_after=30) == 30
+
+
+def fast_scheduler() -> RetryScheduler:
+    policies = default_retry_policies()
+    policies["server_error"] = RetryPolicy(max_retries=2, base_delay=0.01)
+    policies["throttled"] = RetryPolicy(max_retries=2, base_delay=0.01)
+    return RetryScheduler(policies=policies)
+
+
+def test_retry_until_success():
+    scheduler = fast_scheduler()
+    errors = [response_error(503), response_error(429, {"Retry-After": "0"})]
+
+    async def attempt():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert asyncio.run(scheduler.run("url", attempt)) == "ok"
+    assert scheduler.stats == {"retries": 2, "failures": 0, "waiting": 0}
+
+
+def test_give_up():
+    test_cases = [(response_error(404), 1), (response_error(500), 3)]
+    for error, expected_attempts in test_cases:
+        scheduler = fast_scheduler()
+        attempts = 0
+
+        async def attempt():
+            nonlocal attempts
+            attempts += 1
+            raise error
+
+        with pytest.raises(ClientResponseError):
+            asyncio.run(scheduler.run("url", attempt))
+        assert attempts == expected_attempts
+        assert scheduler.failures == 1
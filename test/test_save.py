@@ -0,0 +1,200 @@
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.normalization import normalize_dataframe
+from real_estate_scraper.save import ParquetSink, SQLiteSink, BackgroundWriter, \
+    generate_filename, pa
+
+BATCHES = [
+    pd.DataFrame({"Price": ["€ 450,000 k.k.", None], "EnergyLabel": ["A", None],
+                  "href": ["/huis-1/", "/huis-2/"],
+                  "TimeStampShallow": ["2023-01-01T10:00:00+01:00",
+                                       "2023-01-02T10:00:00+01:00"],
+                  "SearchCity": ["delft", "delft"]}),
+    pd.DataFrame({"Price": [None], "EnergyLabel": [None], "Rooms": ["4"],
+                  "RoomsDeep": ["4 rooms (2 bedrooms)"], "PostCode": ["2611 AB Delft"],
+                  "href": ["/huis-3/"], "Unknown": ["x"],
+                  "TimeStampShallow": ["2023-01-01T11:00:00+01:00"],
+                  "SearchCity": [None]}),
+]
+
+
+@pytest.mark.skipif(pa is None, reason="requires pyarrow")
+def test_parquet_sink(tmp_path):
+    import pyarrow.dataset as ds
+
+    sink = ParquetSink(tmp_path / "listings.parquet", funda_config)
+    for df in BATCHES:
+        sink.write(normalize_dataframe(df, funda_config))
+    sink.write(pd.DataFrame())
+
+    files = sorted(path.relative_to(sink.root).parent.as_posix()
+                   for path in sink.root.rglob("*.parquet"))
+    assert files == ["site=funda/date=2023-01-01/city=all",
+                     "site=funda/date=2023-01-01/city=delft",
+                     "site=funda/date=2023-01-02/city=delft"]
+    assert (sink.batches_written, sink.rows_written) == (2, 3)
+
+    dataset = ds.dataset(sink.root, format="parquet", partitioning="hive")
+    assert dataset.schema.field("Price").type == pa.float64()
+    assert dataset.schema.field("Rooms").type == pa.int64()
+    assert dataset.schema.field("Bedrooms").type == pa.int64()
+    assert dataset.schema.field("City").type == pa.dictionary(pa.int32(), pa.string())
+    assert "Unknown" not in dataset.schema.names
+    for fragment in dataset.get_fragments():
+        assert fragment.physical_schema.remove_metadata() == sink.schema
+        assert fragment.metadata.num_row_groups == 1
+        assert fragment.metadata.row_group(0).column(0).compression == "ZSTD"
+
+    table = dataset.to_table(columns=["href", "Price", "Rooms"],
+                             filter=ds.field("city") == "delft")
+    assert sorted(table.column("href").to_pylist()) == ["/huis-1/", "/huis-2/"]
+    assert table.column("Price").to_pylist().count(450000.0) == 1
+    table = dataset.to_table(columns=["Bedrooms", "PostCodeDigits"],
+                             filter=ds.field("city") == "all")
+    assert table.to_pylist() == [{"Bedrooms": 2, "PostCodeDigits": "2611"}]
+
+
+def test_parquet_filename():
+    assert generate_filename(city="delft", extension=".parquet").endswith(".parquet")
+    with pytest.raises(ValueError):
+        generate_filename(extension=".json")
+
+
+def test_sqlite_sink(tmp_path):
+    path = tmp_path / "funda.db"
+    with SQLiteSink(path, "raw.listings") as sink:
+        sink.write(pd.DataFrame({"href": ["/huis-1/", "/huis-2/", None],
+                                 "Price": [450000.0, 300000.0, 1.0],
+                                 "SearchCity": ["delft", "delft", "delft"]}))
+        # a re-crawl, with a new deep item and a deep page that failed
+        sink.write(pd.DataFrame({"href": ["/huis-1/", "/huis-3/"],
+                                 "Price": [440000.0, None],
+                                 "Rooms": pd.Series([None, 4], dtype="Int64"),
+                                 "TimeStampShallow": ["2023-01-02", "2023-01-02"]}))
+        assert sink.rows_written == 4
+
+    with SQLiteSink(path, "raw.listings") as sink:
+        sink.write(pd.DataFrame({"href": ["/huis-2/"], "Rooms": [3]}))
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute('SELECT href, Price, Rooms, SearchCity '
+                            'FROM "raw.listings" ORDER BY href').fetchall()
+        indexes = {row[1] for row in conn.execute('PRAGMA index_list("raw.listings")')}
+        column_types = {row[1]: row[2] for row in
+                        conn.execute('PRAGMA table_info("raw.listings")')}
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+    assert rows == [("/huis-1/", 440000.0, None, "delft"),
+                    ("/huis-2/", 300000.0, 3, "delft"),
+                    ("/huis-3/", None, 4, None)]
+    assert {"raw.listings_SearchCity", "raw.listings_TimeStampShallow"} <= indexes
+    assert (column_types["Price"], column_types["Rooms"]) == ("REAL", "INTEGER")
+    assert journal_mode == "wal"
+
+    with SQLiteSink(path, "raw.listings") as sink, pytest.raises(ValueError):
+        sink.write(pd.DataFrame({"HouseId": [1]}))
+
+
+def test_background_writer():
+    release = threading.Event()
+    written, done = [], []
+
+    def slow_write(batch):
+        release.wait()
+        written.append(batch)
+
+    writer = BackgroundWriter(slow_write, max_queued=2)
+    for batch in range(3):
+        # returns while the previous batches are still being written
+        writer.put(batch, on_written=lambda batch=batch: done.append(batch))
+    assert written == []
+    release.set()
+    writer.close()
+    assert written == done == [0, 1, 2]
+    assert writer.batches_written == 3
+
+    def failing_write(batch):
+        if batch == 1:
+            raise OSError("disk full")
+        written.append(batch)
+
+    written.clear()
+    with pytest.raises(OSError):
+        with BackgroundWriter(failing_write) as writer:
+            for batch in range(3):
+                writer.put(batch)
+    assert written == [0]
+
+
+def crawl(day: str, prices: list, statuses: list) -> pd.DataFrame:
+    return pd.DataFrame({"href": ["/huis-1/", "/huis-2/"][:len(prices)],
+                         "Price": prices, "Status": statuses,
+                         "TimeStampShallow": f"{day}T10:00:00+01:00"})
+
+
+def test_sqlite_history(tmp_path):
+    path = tmp_path / "funda.db"
+    with SQLiteSink(path, key="href", history_items=["Price", "Status"]) as sink:
+        sink.write(crawl("2023-01-01", [450000.0, 300000.0], ["Available", None]))
+        sink.write(crawl("2023-01-02", [450000.0, 300000.0], ["Available", None]))
+        sink.write(crawl("2023-01-03", [440000.0, None], ["Under offer", "Sold"]))
+        sink.write(crawl("2023-01-04", [440000.0], ["Sold"]))
+        # 4 first values, then Price and Status of huis-1 and Status of huis-2
+        assert sink.changes_logged == 7
+
+    with SQLiteSink(path, history_items=["Price", "Status"]) as sink:
+        assert sink.as_of("2022-12-31").empty
+        state = sink.as_of("2023-01-02", columns=["TimeStampShallow"])
+        assert state.href.tolist() == ["/huis-1/", "/huis-2/"]
+        assert state.Price.tolist() == [450000.0, 300000.0]
+        assert state.Status.tolist()[0] == "Available"
+        assert state.Status.isna().tolist() == [False, True]
+        # the current state
+        assert state.TimeStampShallow.tolist() == ["2023-01-04T10:00:00+01:00",
+                                                   "2023-01-03T10:00:00+01:00"]
+        state = sink.as_of("2023-01-05")
+        assert state.Price.tolist() == [440000.0, 300000.0]
+        assert state.Status.tolist() == ["Sold", "Sold"]
+
+    with sqlite3.connect(path) as conn:
+        intervals = conn.execute('SELECT valid_from, valid_to FROM listings_history '
+                                 'WHERE href = "/huis-1/" AND item = "Status" '
+                                 'ORDER BY valid_from').fetchall()
+    assert intervals == [("2023-01-01T10:00:00+01:00", "2023-01-03T10:00:00+01:00"),
+                         ("2023-01-03T10:00:00+01:00", "2023-01-04T10:00:00+01:00"),
+                         ("2023-01-04T10:00:00+01:00", None)]
+
+
+
+def test_sqlite_history_removals(tmp_path):
+    path = tmp_path / "funda.db"
+    with SQLiteSink(path, history_items=["Price", "Status"],
+                    shallow_items=["Price"]) as sink:
+        sink.write(crawl("2023-01-01", [450000.0, 300000.0], ["Available"] * 2)
+                   .assign(TimeStampDeep="2023-01-01T10:05:00+01:00"))
+        # huis-2 is seen without price, its deep page is not scraped
+        sink.write(crawl("2023-01-02", [450000.0, None], [None, None]))
+        # the deep page of huis-1 has no status anymore
+        sink.write(crawl("2023-01-03", [450000.0, None], [None, None])
+                   .assign(TimeStampDeep=["2023-01-03T10:05:00+01:00", None]))
+        assert sink.changes_logged == 4 + 2
+
+        state = sink.as_of("2023-01-02T12:00")
+        assert state.Price.isna().tolist() == [False, True]
+        assert state.Status.tolist() == ["Available", "Available"]
+        state = sink.as_of("2023-01-04")
+        assert state.Status.isna().tolist() == [True, False]
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute('SELECT value, valid_from, valid_to FROM listings_history '
+                            'WHERE href = "/huis-2/" AND item = "Price" '
+                            'ORDER BY valid_from').fetchall()
+    assert rows == [
+        (300000.0, "2023-01-01T10:00:00+01:00", "2023-01-02T10:00:00+01:00"),
+        (None, "2023-01-02T10:00:00+01:00", None),
+    ]
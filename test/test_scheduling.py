@@ -0,0 +1,56 @@
+import asyncio
+
+from real_estate_scraper.scheduling import CityScheduler
+
+CITY_PAGES = {"delft": 3, "rotterdam": 1, "leiden": 2, "unknown": None}
+
+
+async def get_pages(city, pages):
+    await asyncio.sleep(0.001 * len(city))
+    if CITY_PAGES[city] is None:
+        raise ValueError("city not found")
+    return list(range(1, CITY_PAGES[city] + 1))
+
+
+def collect(scheduler: CityScheduler) -> list[tuple[str, int]]:
+    async def run():
+        return [(page.city, page.page) async for page in scheduler]
+
+    return asyncio.run(run())
+
+
+def test_all_pages_scheduled():
+    scheduler = CityScheduler(get_pages, cities=list(CITY_PAGES), concurrency=2)
+    pages = collect(scheduler)
+    assert sorted(pages) == [("delft", 1), ("delft", 2), ("delft", 3),
+                             ("leiden", 1), ("leiden", 2), ("rotterdam", 1)]
+    assert scheduler.cities_discovered == 3
+    assert scheduler.cities_failed == 1
+
+
+def test_cities_interleaved():
+    async def immediate_get_pages(city, pages):
+        return list(range(1, CITY_PAGES[city] + 1))
+
+    scheduler = CityScheduler(immediate_get_pages, cities=["delft", "leiden"],
+                              concurrency=2)
+    assert collect(scheduler) == [("delft", 1), ("leiden", 1), ("delft", 2),
+                                  ("leiden", 2), ("delft", 3)]
+
+
+def test_discovery_concurrency():
+    active = 0
+    max_active = 0
+
+    async def counting_get_pages(city, pages):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return [1]
+
+    scheduler = CityScheduler(counting_get_pages, cities=[str(i) for i in range(10)],
+                              concurrency=3)
+    assert len(collect(scheduler)) == 10
+    assert max_active == 3
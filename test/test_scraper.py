@@ -0,0 +1,160 @@
+import asyncio
+import logging
+
+import pytest
+
+from real_estate_scraper import html_handling
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.frontier import CrawlFrontier, DONE, PENDING
+from real_estate_scraper.scraper import Scraper
+
+PAGES = [1, 2, 3]
+LISTINGS_PER_PAGE = 3
+
+
+class FakeWebsite:
+    """Answers the requests of the scraper, counting those in flight."""
+
+    def __init__(self, delay: float = 0.005):
+        self.delay = delay
+        self.started = 0
+        self.in_flight = 0
+        self.sessions = set()
+
+    async def fetch(self, session, url_str, **kwargs) -> bytes:
+        self.sessions.add(session)
+        self.started += 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return url_str.encode()
+
+    @staticmethod
+    async def listings(body: bytes) -> list[dict]:
+        return [{"href": f"{body.decode()}/huis-{i}/"}
+                for i in range(LISTINGS_PER_PAGE)]
+
+    @staticmethod
+    async def house_deep(body: bytes) -> dict:
+        return {"Status": "Available"}
+
+
+@pytest.fixture
+def website(monkeypatch) -> FakeWebsite:
+    website = FakeWebsite()
+    monkeypatch.setattr(html_handling, "fetch", website.fetch)
+    return website
+
+
+def create_scraper(website: FakeWebsite, **kwargs) -> Scraper:
+    scraper = Scraper(funda_config, logger=logging.getLogger("test"),
+                      requests_per_sec=1000, **kwargs)
+    scraper.extraction.listings = website.listings
+    scraper.extraction.house_deep = website.house_deep
+    return scraper
+
+
+def test_iter_houses(website):
+    async def run(**kwargs):
+        async with create_scraper(website) as scraper:
+            return [item async for item in scraper.iter_houses("delft", pages=PAGES,
+                                                               **kwargs)]
+
+    houses = asyncio.run(run(deep=True))
+    assert len(houses) == len(PAGES) * LISTINGS_PER_PAGE
+    assert all(house["Status"] == "Available" for house in houses)
+
+    batches = asyncio.run(run(batch_size=4))
+    assert [len(batch) for batch in batches] == [4, 4, 1]
+    assert all(isinstance(house, dict) for batch in batches for house in batch)
+
+
+def test_iter_houses_break_cancels_requests(website):
+    website.delay = 0.05
+
+    async def run():
+        async with create_scraper(website, max_active_requests=2) as scraper:
+            async for _ in scraper.iter_houses("delft", pages=PAGES, deep=True):
+                break
+            # the generator is closed by the event loop right after the break
+            await asyncio.sleep(0.01)
+            in_flight, started = website.in_flight, website.started
+            await asyncio.sleep(0.2)
+            return in_flight, started
+
+    in_flight, started = asyncio.run(run())
+    assert in_flight == 0
+    assert website.started == started < len(PAGES) * (1 + LISTINGS_PER_PAGE)
+
+
+def test_iter_houses_marks_frontier_after_loop_body(website, tmp_path):
+    frontier = CrawlFrontier(tmp_path / "frontier.db")
+
+    def status(href: str) -> str:
+        rows = frontier._fetch("SELECT status FROM listings WHERE href = ?", (href,))
+        return rows[0][0]
+
+    async def run():
+        current, previous, hrefs = [], [], []
+        async with create_scraper(website) as scraper:
+            async for house in scraper.iter_houses("delft", pages=PAGES,
+                                                   frontier=frontier):
+                current.append(status(house["href"]))
+                if hrefs:
+                    previous.append(status(hrefs[-1]))
+                hrefs.append(house["href"])
+        return current, previous
+
+    current, previous = asyncio.run(run())
+    # pending while the body runs, done once the next listing is asked for
+    assert current == [PENDING] * len(PAGES) * LISTINGS_PER_PAGE
+    assert previous == [DONE] * (len(PAGES) * LISTINGS_PER_PAGE - 1)
+    assert frontier.stats["listings"] == {DONE: len(PAGES) * LISTINGS_PER_PAGE}
+    frontier.close()
+
+
+def test_async_api_after_sync_api(website):
+    for adaptive_throttling in (False, True):
+        with create_scraper(website, max_active_requests=1,
+                            adaptive_throttling=adaptive_throttling) as scraper:
+            # the throttle is first used on the loop of the synchronous API
+            assert len(scraper.download_to_dataframe("delft", pages=PAGES)) == 9
+
+            async def run():
+                return [house async for house in scraper.iter_houses("delft",
+                                                                     pages=PAGES)]
+
+            assert len(asyncio.run(run())) == 9
+
+
+def test_pooled_session_closed_with_scraper(website):
+    with create_scraper(website) as scraper:
+        scraper.download_to_dataframe("delft", pages=PAGES, deep=True)
+        scraper.download_to_dataframe("delft", pages=PAGES)
+    # one session for all the requests of both calls, closed with the scraper
+    (session,) = website.sessions
+    assert session.closed
+
+    async def run():
+        async with create_scraper(website) as scraper:
+            async for _ in scraper.iter_houses("delft", pages=PAGES, deep=True):
+                pass
+
+    asyncio.run(run())
+    assert len(website.sessions) == 2
+    assert all(session.closed for session in website.sessions)
+
+
+def test_duplicate_cities(website):
+    website.delay = 0
+
+    async def house_deep(body: bytes) -> dict:
+        await asyncio.sleep(0.01)
+        return {"Status": "Available"}
+
+    with create_scraper(website) as scraper:
+        scraper.extraction.house_deep = house_deep
+        df = scraper.download_to_dataframe(["delft", "delft"], pages=[1], deep=True)
+    assert len(df) == 2 * LISTINGS_PER_PAGE
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.extraction import ExtractionPlan, extract_house_deep, \
+    Extractor, select_one
+from real_estate_scraper.matchers import Matcher
+from real_estate_scraper.streaming import StreamingExtraction, StreamingReader
+from test.test_parsers import FUNDA_DETAIL
+
+PAGE = ("<html><body><h1>Villa</h1><dl><dt>Status</dt><dd>Available</dd>"
+        "<dt>Garden</dt><dd>Back garden</dd></dl><div class='end'></div>"
+        + "<p>filler</p>" * 2000 + "<h2>Late</h2></body></html>").encode()
+
+ITEMS = {"Title": Matcher(css="h1"),
+         "Status": Matcher(dt="Status"),
+         "Garden": Matcher(dt="Garden", text="first")}
+
+
+def chunks(body: bytes, size: int = 64):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def stream(items, body, until=None):
+    extraction = StreamingExtraction(items, until=until)
+    for chunk in chunks(body):
+        if extraction.feed(chunk):
+            break
+    return extraction
+
+
+def test_streaming_parity():
+    plan = ExtractionPlan.compile(funda_config)
+    extraction = stream(plan.house_items_deep, FUNDA_DETAIL.encode())
+
+    assert not extraction.done
+    assert extraction.bytes_read == len(FUNDA_DETAIL.encode())
+    assert extraction.result() == extract_house_deep(FUNDA_DETAIL.encode(), plan)
+
+
+def test_streaming_funda_stops_at_footer():
+    plan = ExtractionPlan.compile(funda_config)
+    until = funda_config.website_settings.stream_until
+    page = FUNDA_DETAIL.replace(
+        "</body>", "<footer>Funda</footer>" + "<p>filler</p>" * 2000
+                   + '<script type="application/json">{"lat": 0}</script></body>')
+    extraction = stream(plan.house_items_deep, page.encode(), until=until)
+
+    assert extraction.done
+    assert extraction.bytes_read < len(page) / 10
+    house = extraction.result()
+    assert house == extract_house_deep(FUNDA_DETAIL.encode(), plan)
+    assert house["Latitude"] == 52.01
+
+
+def test_streaming_reruns_matchers_on_completed_elements(monkeypatch):
+    calls = []
+    locate = StreamingExtraction._locate
+    monkeypatch.setattr(StreamingExtraction, "_locate",
+                        staticmethod(lambda root, matcher: calls.append(matcher)
+                                     or locate(root, matcher)))
+    items = {**ITEMS, "Late": Matcher(css="h2"), "Missing": Matcher(css="table")}
+    extraction = stream(items, PAGE)
+
+    assert len(chunks(PAGE)) > 400
+    # once for each of the h1, the two dd and the h2
+    assert len(calls) == 4
+    assert extraction.result()["Late"] == "Late"
+
+
+def test_streaming_empty_body():
+    extraction = StreamingExtraction(ITEMS)
+    assert not extraction.feed(b"")
+    assert extraction.result() == {"Title": None, "Status": None, "Garden": None}
+
+
+def test_streaming_stops_early():
+    test_cases = [
+        (ITEMS, None, True),
+        ({**ITEMS, "Late": Matcher(css="h2")}, None, False),
+        ({**ITEMS, "Missing": Matcher(css="table")}, None, False),
+        ({**ITEMS, "Missing": Matcher(css="table")}, "div.end", True),
+        ({**ITEMS, "Last": Matcher(css="p", index=-1)}, None, False),
+    ]
+    for items, until, stops_early in test_cases:
+        extraction = stream(items, PAGE, until=until)
+        assert (extraction.bytes_read < len(PAGE)) == stops_early
+        house = extraction.result()
+        assert (house["Title"], house["Status"], house["Garden"]) == \
+               ("Villa", "Available", "Back garden")
+
+
+class FakeContent:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.chunks_read = 0
+        self.bytes_read = 0
+
+    async def iter_chunked(self, size: int):
+        for chunk in chunks(self.body, size):
+            self.chunks_read += 1
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def at_eof(self) -> bool:
+        return self.bytes_read == len(self.body)
+
+
+class FakeResponse:
+    charset = "utf-8"
+
+    def __init__(self, body: bytes):
+        self.content = FakeContent(body)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_streaming_reader():
+    reader = StreamingReader(ITEMS, chunk_size=256)
+    response = FakeResponse(PAGE)
+
+    house = asyncio.run(reader(response))
+
+    assert house == {"Title": "Villa", "Status": "Available", "Garden": "Back garden"}
+    assert response.closed
+    assert response.content.chunks_read < len(PAGE) / 256
+    assert (reader.pages, reader.stopped_early) == (1, 1)
+    assert reader.bytes_read < len(PAGE)
+
+    late_reader = StreamingReader({"Late": Matcher(css="h2")})
+    response = FakeResponse(PAGE)
+    assert asyncio.run(late_reader(response)) == {"Late": "Late"}
+    assert not response.closed
+    assert (late_reader.pages, late_reader.stopped_early) == (1, 0)
+
+    with pytest.raises(ValueError):
+        StreamingReader({"Title": Extractor.of(select_one, css="h1")})
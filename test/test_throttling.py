@@ -0,0 +1,107 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+from real_estate_scraper.countries.netherlands.funda_scraper import funda_config
+from real_estate_scraper.scraper import Scraper
+from real_estate_scraper.throttling import AdaptiveThrottle, FixedThrottle, \
+    parse_retry_after
+
+URL = "https://www.funda.nl/en/koop/delft/p1"
+
+
+def test_parse_retry_after():
+    test_cases = [
+        ("120", 120.0),
+        ("0", 0.0),
+        ("-3", 0.0),
+        ("", None),
+        (None, None),
+        ("not a date", None),
+    ]
+    for value, expected in test_cases:
+        result = parse_retry_after(value)
+        assert result == expected, f"For {value!r}, expected {expected} but got " \
+                                   f"{result}"
+
+    http_date = formatdate(time.time() + 60, usegmt=True)
+    assert 55 < parse_retry_after(http_date) <= 60
+
+
+def test_additive_increase():
+    throttle = AdaptiveThrottle(initial_rate=2, initial_concurrency=2, max_rate=3,
+                                max_concurrency=4)
+    for _ in range(100):
+        throttle.record(URL, 200, latency=0.1)
+    stats = throttle.stats["www.funda.nl"]
+    assert stats["rate"] == 3
+    assert stats["concurrency"] == 4
+
+
+def test_multiplicative_decrease_with_cooldown():
+    throttle = AdaptiveThrottle(initial_rate=8, initial_concurrency=8, cooldown=60)
+    throttle.record(URL, 429, latency=0.1)
+    throttle.record(URL, 503, latency=0.1)
+    throttle.record(URL, None, latency=10)
+    stats = throttle.stats["www.funda.nl"]
+    assert stats["rate"] == 4
+    assert stats["concurrency"] == 4
+
+
+def test_client_errors_do_not_change_rate():
+    throttle = AdaptiveThrottle(initial_rate=8, initial_concurrency=8)
+    throttle.record(URL, 404, latency=0.1)
+    assert throttle.stats["www.funda.nl"]["rate"] == 8
+
+
+def test_retry_after_blocks_host():
+    throttle = AdaptiveThrottle(initial_rate=100, initial_concurrency=1)
+    throttle.record(URL, 429, latency=0.1, retry_after="0.2")
+
+    async def request():
+        t0 = time.monotonic()
+        async with throttle.slot(URL):
+            return time.monotonic() - t0
+
+    assert asyncio.run(request()) >= 0.15
+
+
+def test_concurrency_limit():
+    throttle = AdaptiveThrottle(initial_rate=1000, initial_concurrency=2)
+    max_active = 0
+
+    async def request():
+        nonlocal max_active
+        async with throttle.slot(URL):
+            max_active = max(max_active, throttle.stats["www.funda.nl"]["active"])
+            await asyncio.sleep(0.01)
+
+    async def run_all():
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    asyncio.run(run_all())
+    assert max_active == 2
+
+
+def test_connections_per_host_follow_throttle_concurrency():
+    assert Scraper(funda_config).max_connections_per_host == 10
+    assert Scraper(funda_config, max_active_requests=20).max_connections_per_host == 20
+    scraper = Scraper(funda_config, adaptive_throttling=True)
+    assert scraper.max_connections_per_host == scraper.throttle.max_concurrency == 50
+
+
+def test_throttles_used_from_another_event_loop():
+    async def requests(throttle):
+        async def request():
+            async with throttle.slot(URL):
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(request() for _ in range(4)))
+
+    for throttle in (FixedThrottle(max_active_requests=1, requests_per_sec=500),
+                     AdaptiveThrottle(initial_rate=500, initial_concurrency=1)):
+        # like the loop of the synchronous API, still open afterwards
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(requests(throttle))
+        asyncio.run(requests(throttle))
+        loop.close()